@@ -0,0 +1,465 @@
+"""
+Purpose: To pack many neuron graphs (or any per neuron
+export like GNN dicts/limb records) into one append-only
+archive file with an offset index, instead of one .pbz2 per neuron
+
+Archive layout (<name>.nxar):
+    archive magic | entry | entry | ...
+    entry = entry magic | payload nbytes (uint64) | key nbytes (uint64)
+            | json key | padding | payload (aligned)
+
+payload formats:
+    "nxcol" : a columnar neuron graph container (see neuron_nx_columnar)
+    "pickle": a pickled python object
+(either can be compressed with any codec of neuron_nx_codecs)
+
+The index (<name>.nxar.index) has one json line per entry:
+    {"key":[segment_id,split_index,nucleus_id],"offset":...,"nbytes":...,"format":...}
+and is appended right after each entry is written. If it is missing or
+behind the archive (ex: crash in between) it is rebuilt by scanning the entries.
+A key appended twice resolves to the latest entry.
+
+Ex:
+import neuron_nx_archive as nxar
+with nxar.NeuronArchive("./proofread_graphs",mode="a") as ar:
+    ar.append(G)
+
+ar = nxar.NeuronArchive("./proofread_graphs")
+G = ar.get((864691134884771066,0,552078))
+G = ar.get((864691134884771066,0)) #<-- nucleus_id is optional
+for key,G in ar:
+    ...
+"""
+import json
+import mmap
+import pickle
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+
+import neuron_nx_codecs as nxcodec
+import neuron_nx_columnar as nxcol
+
+archive_magic = b"NXARCH\x00\x01"
+entry_magic = b"NXENTRY\x00"
+file_extension_default = ".nxar"
+index_extension = ".index"
+entry_alignment = 64
+
+key_names = ("segment_id","split_index","nucleus_id")
+
+
+def _aligned(n,alignment = entry_alignment):
+    return int(np.ceil(n/alignment)*alignment)
+
+def _key_value(v):
+    if v is None:
+        return None
+    if isinstance(v,np.generic):
+        v = v.item()
+    return v
+
+def normalize_key(key):
+    """
+    Purpose: To turn a key into a (segment_id,split_index,nucleus_id)
+    tuple of python values (nucleus_id can be None)
+    """
+    if isinstance(key,dict):
+        key = [key.get(k,None) for k in key_names]
+    key = tuple([_key_value(k) for k in key])
+    if len(key) < len(key_names):
+        key = key + tuple([None]*(len(key_names) - len(key)))
+    return key
+
+def key_from_obj(obj):
+    """
+    Purpose: To get the archive key of a graph
+    (from the graph attributes) or of a dict/list of dicts
+    that store the identifiers (ex: compressed_dict_from_G output)
+    """
+    if isinstance(obj,(nx.Graph,nxcol.ColumnarG)):
+        attrs = obj.graph
+    elif isinstance(obj,dict):
+        attrs = obj
+    elif isinstance(obj,(list,tuple)) and len(obj) > 0 and isinstance(obj[0],dict):
+        attrs = obj[0]
+    else:
+        raise Exception(f"Could not find the segment_id/split_index for object of type {type(obj)}")
+    if "segment_id" not in attrs:
+        raise Exception("No segment_id to use as archive key")
+    return normalize_key(attrs)
+
+def archive_filepath(filepath):
+    filepath = str(filepath)
+    if not filepath.endswith(file_extension_default):
+        filepath += file_extension_default
+    return filepath
+
+def is_archive(obj):
+    if isinstance(obj,NeuronArchive):
+        return True
+    if isinstance(obj,(str,Path)):
+        filepath = Path(archive_filepath(obj))
+        if not filepath.is_file():
+            return False
+        with open(filepath,"rb") as f:
+            return f.read(len(archive_magic)) == archive_magic
+    return False
+
+
+class NeuronArchive:
+    """
+    Purpose: Append-only archive of neuron objects with
+    O(1) random access by (segment_id,split_index,nucleus_id)
+    and sequential streaming
+
+    mode:
+    - "r": read only
+    - "a": read and append (archive is created if it does not exist)
+    """
+    def __init__(self,filepath,mode = "r",verbose = False):
+        if mode not in ("r","a"):
+            raise Exception(f"Unknown mode {mode}")
+        self.filepath = archive_filepath(filepath)
+        self.index_filepath = self.filepath + index_extension
+        self.mode = mode
+        self.verbose = verbose
+        self._mmap = None
+        self._mmap_size = 0
+        self._f = None
+        self._index_f = None
+
+        if not Path(self.filepath).exists():
+            if mode == "r":
+                raise Exception(f"Archive {self.filepath} does not exist")
+            with open(self.filepath,"wb") as f:
+                f.write(archive_magic + b"\x00"*(entry_alignment - len(archive_magic)))
+            open(self.index_filepath,"w").close()
+
+        with open(self.filepath,"rb") as f:
+            if f.read(len(archive_magic)) != archive_magic:
+                raise Exception(f"{self.filepath} is not a neuron archive")
+
+        self.entries = []
+        self.index = dict()
+        self.index_seg_split = dict()
+        self._load_index()
+
+        if mode == "a":
+            self._f = open(self.filepath,"r+b")
+            # drop any partially written entry at the end
+            self._f.truncate(self._end)
+            self._f.seek(0,2)
+            self._index_f = open(self.index_filepath,"a")
+
+    # ----- index -----
+    def _add_to_index(self,entry):
+        entry["key"] = normalize_key(entry["key"])
+        self.entries.append(entry)
+        self.index[entry["key"]] = entry
+        self.index_seg_split[entry["key"][:2]] = entry
+        self._end = max(self._end,_aligned(entry["offset"] + entry["nbytes"]))
+
+    def _load_index(self):
+        self._end = entry_alignment
+        file_size = Path(self.filepath).stat().st_size
+        if Path(self.index_filepath).exists():
+            with open(self.index_filepath,"r") as f:
+                for line in f:
+                    line = line.strip()
+                    if len(line) == 0:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if entry["offset"] + entry["nbytes"] > file_size:
+                        break
+                    self._add_to_index(entry)
+
+        # entries written after the last index line are recovered by scanning
+        n_recovered = 0
+        for entry in self._scan_entries(self._end):
+            self._add_to_index(entry)
+            n_recovered += 1
+            if self.mode == "a":
+                with open(self.index_filepath,"a") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+        if self.verbose:
+            print(f"Loaded {len(self.entries)} archive entries ({n_recovered} recovered by scanning)")
+
+    def _scan_entries(self,start):
+        file_size = Path(self.filepath).stat().st_size
+        with open(self.filepath,"rb") as f:
+            pos = start
+            while pos + 24 <= file_size:
+                f.seek(pos)
+                prefix = f.read(24)
+                if prefix[:8] != entry_magic:
+                    break
+                payload_nbytes,key_nbytes = np.frombuffer(prefix[8:24],dtype=np.uint64).tolist()
+                try:
+                    entry_header = json.loads(f.read(key_nbytes).decode("utf-8"))
+                except (UnicodeDecodeError,json.JSONDecodeError):
+                    break
+                offset = _aligned(pos + 24 + key_nbytes)
+                if offset + payload_nbytes > file_size:
+                    break
+                entry = dict(entry_header,offset=offset,nbytes=payload_nbytes)
+                yield entry
+                pos = _aligned(offset + payload_nbytes)
+
+    def keys(self):
+        return list(self.index.keys())
+
+    def __len__(self):
+        return len(self.index)
+
+    def _entry(self,key):
+        key = normalize_key(key)
+        if key in self.index:
+            return self.index[key]
+        if key[2] is None and key[:2] in self.index_seg_split:
+            return self.index_seg_split[key[:2]]
+        raise KeyError(key)
+
+    def __contains__(self,key):
+        try:
+            self._entry(key)
+            return True
+        except KeyError:
+            return False
+
+    # ----- writing -----
+    def append(
+        self,
+        obj,
+        key = None,
+        file_format = None,
+        exclude_attributes = None,
+        codec = None,
+        column_codecs = None,
+        ):
+        """
+        Purpose: To append a neuron graph (stored columnar)
+        or any other object (stored pickled) to the archive
+        
+        codec: compression codec of the payload (see neuron_nx_codecs),
+        for graphs column_codecs can set it per column
+
+        Ex:
+        ar.append(G)
+        ar.append(limb_dicts,file_format="pickle",codec="zstd")
+        """
+        if self.mode != "a":
+            raise Exception("Archive was not opened in append mode")
+
+        if key is None:
+            key = key_from_obj(obj)
+        key = normalize_key(key)
+
+        if file_format is None:
+            file_format = "nxcol" if isinstance(obj,nx.Graph) else "pickle"
+
+        entry_header = dict(key=list(key),format=file_format,codec="none" if codec is None else nxcodec.check_codec(codec))
+        key_bytes = json.dumps(entry_header).encode("utf-8")
+
+        f = self._f
+        start = self._end
+        f.seek(start)
+        offset = _aligned(start + 24 + len(key_bytes))
+
+        if file_format == "nxcol":
+            header,blocks = nxcol.encode_G(obj,exclude_attributes=exclude_attributes)
+            f.seek(offset)
+            payload_nbytes = nxcol.write_container(
+                f,header,blocks,
+                codec=codec,
+                column_codecs=column_codecs)
+        elif file_format == "pickle":
+            if codec is None:
+                payload = pickle.dumps(obj,protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                payload = nxcodec.dumps_pickle(obj,codec=codec)
+            f.seek(offset)
+            f.write(payload)
+            payload_nbytes = len(payload)
+        else:
+            raise Exception(f"Unknown file_format {file_format}")
+
+        f.seek(start)
+        f.write(entry_magic + np.array([payload_nbytes,len(key_bytes)],dtype=np.uint64).tobytes())
+        f.write(key_bytes)
+        f.write(b"\x00"*(offset - f.tell()))
+        f.seek(0,2)
+        f.flush()
+
+        entry = dict(entry_header,offset=offset,nbytes=payload_nbytes)
+        self._index_f.write(json.dumps(entry) + "\n")
+        self._index_f.flush()
+        self._add_to_index(entry)
+
+        if self.verbose:
+            print(f"Appended {key} ({file_format}, {payload_nbytes/1_000_000:.3f} MB)")
+
+        return key
+
+    def extend(self,objs,**kwargs):
+        return [self.append(k,**kwargs) for k in objs]
+
+    # ----- reading -----
+    def _buffer(self,end):
+        if self._mmap is None or end > self._mmap_size:
+            if self._f is not None:
+                self._f.flush()
+            with open(self.filepath,"rb") as f:
+                self._mmap = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            self._mmap_size = len(self._mmap)
+        return self._mmap
+
+    def open_G(self,key):
+        """
+        Purpose: To get a zero copy columnar view of
+        one graph entry (see nxcol.ColumnarG)
+        """
+        entry = self._entry(key)
+        if entry["format"] != "nxcol":
+            raise Exception(f"Entry {entry['key']} is stored as {entry['format']}")
+        buffer = self._buffer(entry["offset"] + entry["nbytes"])
+        return nxcol.ColumnarG(buffer,offset=entry["offset"],filepath=self.filepath)
+
+    def _read_entry(self,entry,**kwargs):
+        if entry["format"] == "nxcol":
+            buffer = self._buffer(entry["offset"] + entry["nbytes"])
+            G_col = nxcol.ColumnarG(buffer,offset=entry["offset"],filepath=self.filepath)
+            return G_col.to_G(**kwargs)
+        buffer = self._buffer(entry["offset"] + entry["nbytes"])
+        return nxcodec.loads_pickle(buffer[entry["offset"]:entry["offset"] + entry["nbytes"]])
+
+    def get(self,key,**kwargs):
+        """
+        Purpose: To read one entry
+        (kwargs are passed to ColumnarG.to_G for graph entries,
+        ex: lazy_attributes or exclude_attributes)
+        """
+        return self._read_entry(self._entry(key),**kwargs)
+
+    __getitem__ = get
+
+    def items(self,keys = None,**kwargs):
+        """
+        Purpose: To stream (key,obj) of the entries in the
+        order they are stored in the file (latest version of each key)
+        """
+        if keys is None:
+            entries = [e for e in self.entries if self.index[e["key"]] is e]
+        else:
+            entries = sorted([self._entry(k) for k in keys],key=lambda e: e["offset"])
+        for entry in entries:
+            yield entry["key"],self._read_entry(entry,**kwargs)
+
+    __iter__ = items
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if self._index_f is not None:
+            self._index_f.close()
+            self._index_f = None
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __repr__(self):
+        return f"NeuronArchive({self.filepath}, mode = {self.mode}, n_entries = {len(self)})"
+
+import functools
+import inspect
+def opens_archive(func):
+    """
+    Purpose: Decorator for functions with an archive argument:
+    an archive filepath is opened (mode = "a") for the call and closed
+    after it, NeuronArchive objects (and None) are passed as is
+
+    Ex:
+    @nxar.opens_archive
+    def export(G,archive = None):
+        archive.append(G)
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args,**kwargs):
+        bound = signature.bind(*args,**kwargs)
+        archive = bound.arguments.get("archive",None)
+        if archive is None or isinstance(archive,NeuronArchive):
+            return func(*args,**kwargs)
+        # only the archive opened here is closed here
+        with NeuronArchive(archive,mode="a") as ar:
+            bound.arguments["archive"] = ar
+            return func(*bound.args,**bound.kwargs)
+    return wrapper
+
+def archive_from_filepaths(
+    filepaths,
+    archive,
+    load_func = None,
+    skip_existing = True,
+    verbose = False,
+    ):
+    """
+    Purpose: To pack existing per neuron files
+    (ex: .pbz2 graphs) into an archive
+
+    Ex:
+    nxar.archive_from_filepaths(
+        list(Path("./graphs").glob("*.pbz2")),
+        "./proofread_graphs",
+    )
+    """
+    if load_func is None:
+        import neuron_nx_utils as nxu
+        load_func = nxu.load_G
+
+    if not isinstance(archive,NeuronArchive):
+        archive = NeuronArchive(archive,mode="a")
+
+    for f in filepaths:
+        obj = load_func(f)
+        key = key_from_obj(obj)
+        if skip_existing and key in archive.index:
+            if verbose:
+                print(f"Skipping {f} ({key} already in archive)")
+            continue
+        archive.append(obj,key=key)
+        if verbose:
+            print(f"Added {f} as {key}")
+
+    return archive
+
+def limb_df_from_archive(
+    archive,
+    keys = None,
+    ):
+    """
+    Purpose: To build the limb dataframe (one row per limb
+    with a graph_data column) from an archive whose entries are
+    each the list of limb dicts of one neuron
+    """
+    import pandas as pd
+    if not isinstance(archive,NeuronArchive):
+        archive = NeuronArchive(archive)
+    records = []
+    for _,limb_dicts in archive.items(keys=keys):
+        records += list(limb_dicts)
+    return pd.DataFrame.from_records(records)
+
+
+import neuron_nx_archive as nxar
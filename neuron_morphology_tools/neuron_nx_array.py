@@ -0,0 +1,778 @@
+"""
+Purpose: Compact array representation of a neuron
+tree (instead of the dict of dicts of a networkx DiGraph)
+for the traversal heavy helpers
+
+Structure (n = number of nodes, nodes are integer ids 0..n-1):
+    names          : node names ("S0","L0_12"...) -> name_to_idx dict
+    parent         : int array, parent id of every node (-1 for roots)
+    children_ptr   : CSR offsets (n + 1) into children_idx
+    children_idx   : child ids of every node (in networkx adjacency order)
+    preorder       : node ids in depth first order (children in order)
+    tin            : position of each node in the preorder (entry time)
+    subtree_size   : number of nodes in the subtree (including the node)
+    tout           : tin + subtree_size (exit time)
+    depth          : number of edges from the root
+    columns        : node attribute name -> numpy column
+                     (bool/int64/float64/str for scalars and strings,
+                     object arrays for anything else, see neuron_nx_columnar.value_kind)
+
+The subtree of node i is preorder[tin[i]:tin[i] + subtree_size[i]]
+and a is an ancestor of b when tin[a] <= tin[b] < tout[a]
+
+nxa.tree_index(G) gives the structure only version of a networkx
+graph (no attribute columns) for the upstream/downstream queries,
+cached on nxg.NeuronDiGraph graphs until they are changed
+
+The structure is fixed once built (a modified tree is rebuilt with
+from_G/subgraph), attribute columns can be changed with set_column
+(or one node at a time with G.nodes[n][attribute] = value, which writes
+into the column)
+
+G.nodes(), G.nodes[n][attribute], G[n] (children), G.graph and
+G.subgraph(nodes).copy() behave like the networkx graph so most
+nxu helpers run on it unchanged, and the traversal helpers
+(most_upstream_nodes, distance_from_node_to_soma, limb_graph ...)
+use the arrays directly
+
+Ex:
+import neuron_nx_array as nxa
+G_arr = nxa.from_G(G)
+G_arr.upstream_node("L0_12")
+G_arr.all_downstream_nodes("L0_0")
+nxu.most_upstream_node(G_arr)
+G_back = G_arr.to_G()
+"""
+from collections.abc import MutableMapping
+
+import numpy as np
+import networkx as nx
+
+import neuron_nx_columnar as nxcol
+
+soma_node_name_default = "S0"
+
+
+def _typed_column(values):
+    """
+    Purpose: To store a list of node values (absent allowed)
+    as a typed numpy column when possible, returns (column,present mask)
+    (absent rows of a typed column hold 0/"" and are masked out)
+    """
+    present = np.array([v is not nxcol.absent for v in values],dtype=bool)
+    filled = [v for v in values if v is not nxcol.absent]
+    kind = nxcol.value_kind(values)
+    mask = None if present.all() else present
+
+    if not any(v is None for v in filled):
+        if kind == "scalar":
+            dtype = None
+            if all(nxcol._is_bool(v) for v in filled):
+                dtype,fill = bool,False
+            elif all(nxcol._is_int(v) for v in filled):
+                dtype,fill = np.int64,0
+            elif all(nxcol._is_float(v) for v in filled):
+                dtype,fill = np.float64,np.nan
+            if dtype is not None:
+                try:
+                    return np.array([fill if v is nxcol.absent else v for v in values],dtype=dtype),mask
+                except OverflowError:
+                    pass
+        elif kind == "string":
+            return np.array(["" if v is nxcol.absent else v for v in values],dtype=str),mask
+
+    column = np.empty(len(values),dtype=object)
+    column[:] = values
+    return column,mask
+
+def _python_value(v):
+    if isinstance(v,np.generic):
+        return v.item()
+    return v
+
+def _typed_values(values):
+    """
+    Purpose: The values written to some nodes as a column typed
+    like _typed_column would type them (numpy columns are kept as is)
+    """
+    if isinstance(values,np.ndarray) and values.ndim == 1:
+        kind = values.dtype.kind
+        if kind == "b" or kind == "U":
+            return values
+        if kind == "i":
+            return values.astype(np.int64,copy=False)
+        if kind == "f":
+            return values.astype(np.float64,copy=False)
+    return _typed_column(list(values))[0]
+
+_absent_fill = dict(b=False,i=0,f=np.nan,U="")
+
+
+class _NodeAttrs(MutableMapping):
+    """
+    Purpose: The attributes of one node of a NeuronGraph
+    (G.nodes[n]), reads and writes go to the columns so
+    G.nodes[n][attribute] = value changes the graph
+    """
+    def __init__(self,G,i):
+        self._G = G
+        self._i = i
+
+    def __getitem__(self,attribute):
+        if not self._G.has_attribute(attribute,self._i):
+            raise KeyError(attribute)
+        return _python_value(self._G.columns[attribute][self._i])
+
+    def __setitem__(self,attribute,value):
+        self._G.set_value(attribute,self._i,value)
+
+    def __delitem__(self,attribute):
+        if not self._G.has_attribute(attribute,self._i):
+            raise KeyError(attribute)
+        self._G.delete_value(attribute,self._i)
+
+    def __iter__(self):
+        return iter([a for a in self._G.columns if self._G.has_attribute(a,self._i)])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        return self._G.node_values(self._i)
+
+
+class _NodeView:
+    """
+    Minimal stand in for networkx's G.nodes:
+    G.nodes() / G.nodes(data=True) / G.nodes[n] / n in G.nodes
+    """
+    def __init__(self,G):
+        self._G = G
+
+    def __call__(self,data = False):
+        if data:
+            return [(n,self._G.node_attr_dict(i)) for i,n in enumerate(self._G.names)]
+        return list(self._G.names)
+
+    def __getitem__(self,n):
+        return self._G.node_attr_dict(self._G.idx(n))
+
+    def __iter__(self):
+        return iter(self._G.names)
+
+    def __len__(self):
+        return len(self._G.names)
+
+    def __contains__(self,n):
+        return n in self._G.name_to_idx
+
+
+class NeuronGraph:
+    """
+    Purpose: Array backed neuron tree
+    (see the module docstring)
+    """
+    def __init__(
+        self,
+        names,
+        parent,
+        columns = None,
+        present = None,
+        graph = None,
+        edge_data = None,
+        children_order = None,
+        ):
+        """
+        names: node names
+        parent: parent id of every node (-1 for roots)
+        columns: attribute -> numpy column (length n)
+        present: attribute -> bool mask of the nodes that have the attribute
+        (only for columns that are not present on every node)
+        edge_data: object array with the (parent -> node) edge attributes per node
+        children_order: node ids in the order children are listed
+        (default = by node id)
+        """
+        self.names = np.array(names,dtype=object)
+        self.name_to_idx = {n:i for i,n in enumerate(self.names)}
+        if len(self.name_to_idx) != len(self.names):
+            raise Exception("Node names are not unique")
+        self.parent = np.asarray(parent,dtype=np.int64).reshape(-1)
+        self.columns = dict() if columns is None else dict(columns)
+        self.present = dict() if present is None else dict(present)
+        self.graph = dict() if graph is None else dict(graph)
+        self.edge_data = edge_data
+        self._cache = dict()
+
+        n = len(self.names)
+        if children_order is None:
+            children_order = np.arange(n)
+        children_order = np.asarray(children_order,dtype=np.int64)
+        has_parent = self.parent[children_order] >= 0
+        children_order = children_order[has_parent]
+        order = np.argsort(self.parent[children_order],kind="stable")
+        self.children_idx = children_order[order]
+        counts = np.bincount(self.parent[self.children_idx],minlength=n) if n > 0 else np.zeros(0,dtype=np.int64)
+        self.children_ptr = np.zeros(n+1,dtype=np.int64)
+        self.children_ptr[1:] = np.cumsum(counts)
+
+        self._build_order()
+
+    def _build_order(self):
+        """
+        Purpose: To compute the preorder, depth,
+        entry position and subtree size of every node in one pass
+        """
+        n = len(self.names)
+        preorder = np.empty(n,dtype=np.int64)
+        depth = np.zeros(n,dtype=np.int64)
+        ptr = self.children_ptr
+        children = self.children_idx
+        pos = 0
+        stack = list(np.where(self.parent < 0)[0][::-1])
+        while stack:
+            i = stack.pop()
+            preorder[pos] = i
+            pos += 1
+            kids = children[ptr[i]:ptr[i+1]]
+            if len(kids) > 0:
+                depth[kids] = depth[i] + 1
+                stack.extend(kids[::-1].tolist())
+        if pos != n:
+            raise Exception("Graph is not a tree (cycle or node with several parents)")
+
+        tin = np.empty(n,dtype=np.int64)
+        tin[preorder] = np.arange(n)
+
+        subtree_size = np.ones(n,dtype=np.int64)
+        if n > 0:
+            for d in range(depth.max(),0,-1):
+                nodes_d = np.where(depth == d)[0]
+                np.add.at(subtree_size,self.parent[nodes_d],subtree_size[nodes_d])
+
+        self.preorder = preorder
+        self.depth = depth
+        self.tin = tin
+        self.subtree_size = subtree_size
+        self.tout = tin + subtree_size
+
+    # ----- networkx like interface -----
+    @property
+    def nodes(self):
+        return _NodeView(self)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self,n):
+        return n in self.name_to_idx
+
+    def __getitem__(self,n):
+        # children of the node with their edge data (like G[n] of a DiGraph)
+        return {self.names[c]:self._edge_attr_dict(c) for c in self._children(self.idx(n))}
+
+    def __repr__(self):
+        return f"NeuronGraph(n_nodes = {len(self)}, n_roots = {int(np.sum(self.parent < 0))}, graph = {self.graph})"
+
+    def is_directed(self):
+        return True
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        return int(np.sum(self.parent >= 0))
+
+    def edges(self,data = False):
+        edges = []
+        for i in self.preorder:
+            for c in self._children(i):
+                if data:
+                    edges.append((self.names[i],self.names[c],self._edge_attr_dict(c)))
+                else:
+                    edges.append((self.names[i],self.names[c]))
+        return edges
+
+    def copy(self):
+        return self.subgraph(self.names)
+
+    def subgraph(self,nodes):
+        """
+        Purpose: To get a new NeuronGraph with only certain nodes
+        (nodes whose parent is removed become roots)
+        """
+        keep = np.zeros(len(self),dtype=bool)
+        keep[self.idxs(nodes)] = True
+        new_ids = np.cumsum(keep) - 1
+        old_ids = np.where(keep)[0]
+        parent = self.parent[old_ids]
+        parent = np.where((parent >= 0) & keep[np.maximum(parent,0)],new_ids[np.maximum(parent,0)],-1)
+
+        children_order = self.children_idx[keep[self.children_idx]]
+        return NeuronGraph(
+            names = self.names[old_ids],
+            parent = parent,
+            columns = {a:v[old_ids].copy() for a,v in self.columns.items()},
+            present = {a:v[old_ids].copy() for a,v in self.present.items()},
+            graph = self.graph,
+            edge_data = None if self.edge_data is None else self.edge_data[old_ids].copy(),
+            children_order = new_ids[children_order],
+        )
+
+    # ----- ids -----
+    def idx(self,n):
+        return self.name_to_idx[n]
+
+    def idxs(self,nodes):
+        return np.array([self.name_to_idx[n] for n in nodes],dtype=np.int64)
+
+    def _children(self,i):
+        return self.children_idx[self.children_ptr[i]:self.children_ptr[i+1]]
+
+    # ----- attributes -----
+    @property
+    def attribute_names(self):
+        return list(self.columns.keys())
+
+    def has_attribute(self,attribute,i):
+        if attribute not in self.columns:
+            return False
+        if attribute in self.present:
+            return bool(self.present[attribute][i])
+        return True
+
+    def node_values(self,i):
+        """
+        Purpose: The attributes of a node as a new dict
+        """
+        return {a:_python_value(v[i]) for a,v in self.columns.items()
+                if self.has_attribute(a,i)}
+
+    def node_attr_dict(self,i):
+        """
+        Purpose: The attributes of a node as a mapping
+        that writes through to the columns
+        """
+        return _NodeAttrs(self,i)
+
+    def _edge_attr_dict(self,i):
+        if self.edge_data is None or self.edge_data[i] is None:
+            return dict()
+        return self.edge_data[i]
+
+    def column(self,attribute,fill_value = np.nan):
+        """
+        Purpose: The values of an attribute for all nodes
+        (nodes without it get fill_value)
+        """
+        values = self.columns[attribute]
+        if attribute in self.present:
+            values = values.copy()
+            if values.dtype.kind in "biuf":
+                values = values.astype(np.result_type(values.dtype,np.array(fill_value).dtype))
+            values[~self.present[attribute]] = fill_value
+        return values
+
+    def set_column(self,attribute,values):
+        """
+        Purpose: To set an attribute for every node
+        (clears anything computed from the attributes)
+        """
+        column,present = _typed_column(list(values))
+        if len(column) != len(self):
+            raise Exception(f"Column {attribute} has {len(column)} values for {len(self)} nodes")
+        self.columns[attribute] = column
+        if present is None:
+            self.present.pop(attribute,None)
+        else:
+            self.present[attribute] = present
+        self._cache = dict()
+
+    def set_values(self,attribute,idxs,values):
+        """
+        Purpose: To set an attribute for some of the nodes
+        (written into the typed column when the values have its type,
+        otherwise the column is rebuilt)
+
+        Ex: G_arr.set_values("axon_label",G_arr.idxs(nodes),np.zeros(len(nodes),dtype=int))
+        """
+        idxs = np.asarray(idxs,dtype=np.int64)
+        new = _typed_values(values)
+        if len(new) != len(idxs):
+            raise Exception(f"{len(new)} values of {attribute} for {len(idxs)} nodes")
+
+        column = self.columns.get(attribute,None)
+        if column is None:
+            kind = new.dtype.kind
+            if kind == "O":
+                column = np.full(len(self),None,dtype=object)
+            else:
+                column = np.full(len(self),_absent_fill[kind],dtype=new.dtype)
+            self.columns[attribute] = column
+            self.present[attribute] = np.zeros(len(self),dtype=bool)
+        elif column.dtype.kind != new.dtype.kind and column.dtype.kind != "O":
+            full = [_python_value(v) if self.has_attribute(attribute,i) else nxcol.absent
+                    for i,v in enumerate(column)]
+            for i,v in zip(idxs.tolist(),new.tolist() if new.dtype.kind != "O" else new):
+                full[i] = v
+            self.set_column(attribute,full)
+            return
+
+        if column.dtype.kind == "U" and new.dtype.itemsize > column.dtype.itemsize:
+            column = self.columns[attribute] = column.astype(new.dtype)
+        if column.dtype.kind == "O":
+            for i,v in zip(idxs.tolist(),new):
+                column[i] = _python_value(v)
+        else:
+            column[idxs] = new
+
+        if attribute in self.present:
+            self.present[attribute][idxs] = True
+            if self.present[attribute].all():
+                del self.present[attribute]
+        self._cache = dict()
+
+    def set_value(self,attribute,i,value):
+        """
+        Purpose: To set an attribute of one node
+        """
+        self.set_values(attribute,[i],[value])
+
+    def delete_value(self,attribute,i):
+        """
+        Purpose: To remove an attribute from one node
+        (the column is dropped when no node has it)
+        """
+        present = self.present.get(attribute,None)
+        if present is None:
+            present = np.ones(len(self),dtype=bool)
+        present[i] = False
+        if not present.any():
+            del self.columns[attribute]
+            self.present.pop(attribute,None)
+        else:
+            self.present[attribute] = present
+            if self.columns[attribute].dtype.kind == "O":
+                self.columns[attribute][i] = None
+        self._cache = dict()
+
+    # ----- traversal -----
+    def upstream_node(self,n):
+        p = self.parent[self.idx(n)]
+        if p < 0:
+            return None
+        return self.names[p]
+
+    def downstream_nodes(self,n):
+        return list(self.names[self._children(self.idx(n))])
+
+    def all_downstream_idxs(self,i,include_self = False):
+        start = self.tin[i] + (0 if include_self else 1)
+        return self.preorder[start:self.tin[i] + self.subtree_size[i]]
+
+    def all_downstream_nodes(self,n,include_self = False):
+        return list(self.names[self.all_downstream_idxs(self.idx(n),include_self)])
+
+    def n_all_downstream_nodes(self,nodes = None):
+        """
+        Purpose: Number of nodes downstream of each
+        node (not including itself), scalar for one node
+        """
+        if nodes is None:
+            return self.subtree_size - 1
+        if isinstance(nodes,str):
+            return int(self.subtree_size[self.idx(nodes)] - 1)
+        return self.subtree_size[self.idxs(nodes)] - 1
+
+    def is_ancestor(self,a,b):
+        """
+        Purpose: If node a is upstream of node b (or is b)
+        """
+        a,b = self.idx(a),self.idx(b)
+        return bool(self.tin[a] <= self.tin[b] < self.tout[a])
+
+    def has_upstream_in_nodes(self,nodes,parent_only = False):
+        """
+        Purpose: For each of the nodes, if another one of
+        the nodes is upstream of it (or is its parent if parent_only)
+
+        Pseudocode (not parent_only):
+        1) Go through the nodes in preorder keeping a stack of
+           the nodes whose subtree has not been exited yet
+        2) Pop the nodes exited before the current node
+        3) The current node has an upstream node in the group
+           if the stack is not empty
+
+        Ex: G_arr.has_upstream_in_nodes(["L0_1","L0_4","L1_2"])
+        """
+        idx = self.idxs(nodes)
+        if parent_only:
+            return np.isin(self.parent[idx],idx)
+
+        has_upstream = np.zeros(len(idx),dtype=bool)
+        stack = []
+        for j in np.argsort(self.tin[idx],kind="stable"):
+            i = idx[j]
+            while stack and self.tout[stack[-1]] <= self.tin[i]:
+                stack.pop()
+            if stack and stack[-1] != i:
+                has_upstream[j] = True
+            stack.append(i)
+        return has_upstream
+
+    def path_to_root(self,n,include_self = True):
+        path = []
+        i = self.idx(n)
+        if not include_self:
+            i = self.parent[i]
+        while i >= 0:
+            path.append(self.names[i])
+            i = self.parent[i]
+        return path
+
+    def roots(self):
+        return list(self.names[self.parent < 0])
+
+    def upstream_distances(
+        self,
+        attribute = "skeletal_length",
+        destination_node = soma_node_name_default,
+        ):
+        """
+        Purpose: For every node the sum of the attribute over
+        its upstream nodes (not including itself or the destination node
+        and anything upstream of it), computed top down by depth in one pass
+
+        Ex: G_arr.upstream_distances()[G_arr.idx("L0_19")]
+        """
+        key = ("upstream_distances",attribute,destination_node)
+        if key in self._cache:
+            return self._cache[key]
+
+        values = self.column(attribute).astype(np.float64)
+        dist = np.zeros(len(self),dtype=np.float64)
+        stop = np.zeros(len(self),dtype=bool)
+        if destination_node in self.name_to_idx:
+            stop[self.idx(destination_node)] = True
+
+        if len(self) > 0:
+            for d in range(1,self.depth.max()+1):
+                nodes_d = np.where(self.depth == d)[0]
+                par = self.parent[nodes_d]
+                dist[nodes_d] = np.where(stop[par],0,dist[par] + values[par])
+        self._cache[key] = dist
+        return dist
+
+    # ----- conversion -----
+    def to_G(self):
+        """
+        Purpose: To build the networkx DiGraph
+        """
+        G = nx.DiGraph()
+        G.graph.update(self.graph)
+        G.add_nodes_from([(n,self.node_values(i)) for i,n in enumerate(self.names)])
+        G.add_edges_from(self.edges(data=True))
+        return G
+
+
+def from_G(G,node_attributes = True):
+    """
+    Purpose: To build the array representation
+    of a networkx neuron DiGraph (must be a tree/forest)
+
+    Pseudocode:
+    1) Number the nodes in the graph order
+    2) Fill the parent array from the predecessors
+    3) Keep the children in the networkx adjacency order
+    4) Turn every node attribute into a typed column
+       (skipped if node_attributes = False)
+    """
+    if isinstance(G,NeuronGraph):
+        return G
+    if not G.is_directed():
+        raise Exception("Array neuron graph needs a directed graph")
+
+    names = list(G.nodes())
+    name_to_idx = {n:i for i,n in enumerate(names)}
+    parent = np.full(len(names),-1,dtype=np.int64)
+    edge_data = None
+    children_order = []
+    for u,v,d in G.edges(data=True):
+        j = name_to_idx[v]
+        if parent[j] >= 0:
+            raise Exception(f"Node {v} has more than one upstream node")
+        parent[j] = name_to_idx[u]
+        children_order.append(j)
+        if len(d) > 0:
+            if edge_data is None:
+                edge_data = np.empty(len(names),dtype=object)
+            edge_data[j] = d
+
+    columns = dict()
+    present = dict()
+    if node_attributes:
+        node_dicts = [G.nodes[n] for n in names]
+        attributes = list(dict.fromkeys([k for d in node_dicts for k in d.keys()]))
+    else:
+        attributes = []
+    for a in attributes:
+        column,mask = _typed_column([d[a] if a in d else nxcol.absent for d in node_dicts])
+        columns[a] = column
+        if mask is not None:
+            present[a] = mask
+
+    return NeuronGraph(
+        names = names,
+        parent = parent,
+        columns = columns,
+        present = present,
+        graph = dict(G.graph),
+        edge_data = edge_data,
+        children_order = children_order + [i for i in range(len(names)) if parent[i] < 0],
+    )
+
+def to_G(G):
+    if isinstance(G,NeuronGraph):
+        return G.to_G()
+    return G
+
+def is_array_graph(G):
+    return isinstance(G,NeuronGraph)
+
+import neuron_nx_graph as nxg
+def tree_index(G):
+    """
+    Purpose: To get the tree structure (entry/exit times,
+    depth, subtree sizes) of a graph for constant time
+    ancestor tests and subtree sizes
+
+    Array graphs are their own index, the index of an
+    nxg.NeuronDiGraph is a derived index kept until the structure
+    changes and plain networkx graphs get a new index every call
+
+    Ex:
+    index = nxa.tree_index(G)
+    index.n_all_downstream_nodes(["L0_1","L0_4"])
+    index.is_ancestor("L0_1","L0_4")
+    """
+    if nxa.is_array_graph(G):
+        return G
+    return nxg.derived_index(G,"tree_index")
+
+def _tree_index_build(G):
+    return nxa.from_G(G,node_attributes=False)
+
+def _tree_index_update(G,index,entries):
+    return nxg.keep_if_attributes_unchanged(index,entries,[])
+
+nxg.register_derived_index("tree_index",_tree_index_build,_tree_index_update)
+
+def subtree_sizes(G):
+    """
+    Purpose: The number of nodes in the subtree
+    of every node (including itself)
+
+    For nxg.NeuronDiGraph the sizes are a derived index that is
+    updated along the upstream path of every added/removed node or edge
+    (instead of rebuilding the tree index)
+
+    Returns: dict(parent = {node:upstream node or None},size = {node:subtree size})
+
+    Ex: nxa.subtree_sizes(G)["size"]["L0_1"]
+    """
+    if nxa.is_array_graph(G):
+        parent = [None if p < 0 else G.names[p] for p in G.parent]
+        return dict(
+            parent = dict(zip(G.names,parent)),
+            size = dict(zip(G.names,G.subtree_size.tolist())),
+        )
+    return nxg.derived_index(G,"subtree_size")
+
+def _subtree_size_build(G):
+    return nxa.subtree_sizes(nxa.from_G(G,node_attributes=False))
+
+def _subtree_size_update(G,index,entries):
+    """
+    Purpose: To replay the structure changes on the
+    parent map and add/subtract the subtree size
+    of the moved subtree along its upstream path
+    """
+    parent,size = index["parent"],index["size"]
+
+    def add_upstream(n,value,stop = None):
+        while n is not None:
+            if n == stop:
+                return False
+            size[n] += value
+            n = parent[n]
+        return True
+
+    for _,operation,args in entries:
+        if operation == "node_attr":
+            continue
+        elif operation == "add_node":
+            if args[0] not in size:
+                parent[args[0]] = None
+                size[args[0]] = 1
+        elif operation == "remove_node":
+            n,children = args
+            add_upstream(parent[n],-size[n])
+            for c in children:
+                if parent.get(c,None) == n:
+                    parent[c] = None
+            del parent[n]
+            del size[n]
+        elif operation == "add_edge":
+            u,v = args
+            if parent[v] == u:
+                continue
+            if parent[v] is not None:
+                # more than one upstream node
+                return None
+            parent[v] = u
+            if not add_upstream(u,size[v],stop = v):
+                return None
+        elif operation == "remove_edge":
+            u,v = args
+            if parent.get(v,None) == u:
+                add_upstream(u,-size[v])
+                parent[v] = None
+        else:
+            return None
+    return index
+
+nxg.register_derived_index("subtree_size",_subtree_size_build,_subtree_size_update)
+
+
+# ---- helpers that work on both representations ----
+def upstream_node(G,n):
+    if nxa.is_array_graph(G):
+        return G.upstream_node(n)
+    import networkx_utils as xu
+    return xu.upstream_node(G,n)
+
+def downstream_nodes(G,n):
+    if nxa.is_array_graph(G):
+        return G.downstream_nodes(n)
+    import networkx_utils as xu
+    return xu.downstream_nodes(G,n)
+
+def all_downstream_nodes(G,n,include_self = False):
+    if nxa.is_array_graph(G):
+        return G.all_downstream_nodes(n,include_self=include_self)
+    import networkx_utils as xu
+    return xu.all_downstream_nodes(G,n,include_self=include_self)
+
+def n_all_downstream_nodes(G,n):
+    if nxa.is_array_graph(G):
+        return G.n_all_downstream_nodes(n)
+    import networkx_utils as xu
+    return xu.n_all_downstream_nodes(G,n)
+
+
+import neuron_nx_array as nxa
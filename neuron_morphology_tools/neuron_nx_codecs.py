@@ -0,0 +1,267 @@
+"""
+Purpose: Pluggable compression codecs for the graph
+and GNN artifacts (instead of always bz2 through su.compressed_pickle)
+
+Codecs: none, zlib, lzma, bz2 (standard library)
+        zstd (zstandard package) and lz4 (lz4 package) when installed
+
+The codec is recorded in the file header so readers auto-detect it:
+- pickled artifacts (.nxpkl): magic | codec name | compressed pickle
+- columnar containers: codec per block in the json header
+  (see nxcol.write_G(codec=...,column_codecs=...))
+
+Ex:
+import neuron_nx_codecs as nxcodec
+filepath = nxcodec.dump_pickle(limb_info,"./seg_0_limb_0",codec="zstd")
+limb_info = nxcodec.load_pickle(filepath)
+
+nxcodec.benchmark_codecs(filepath="../Applications/Data/864691134884771066_0_proofread_G.pbz2")
+"""
+import bz2
+import lzma
+import pickle
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+magic_default = b"NXPKL\x00\x01\x00"
+file_extension_default = ".nxpkl"
+default_codec = "zlib"
+
+default_levels = dict(
+    zlib = 6,
+    lzma = 6,
+    bz2 = 9,
+    zstd = 3,
+    lz4 = 0,
+)
+
+def _zstd_compress(data,level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+codecs = dict(
+    none = (lambda data,level: bytes(data),
+            lambda data: bytes(data)),
+    zlib = (lambda data,level: zlib.compress(data,level),
+            zlib.decompress),
+    lzma = (lambda data,level: lzma.compress(data,preset=level),
+            lzma.decompress),
+    bz2 = (lambda data,level: bz2.compress(data,compresslevel=level),
+           bz2.decompress),
+)
+
+if zstandard is not None:
+    codecs["zstd"] = (_zstd_compress,_zstd_decompress)
+
+if lz4_frame is not None:
+    codecs["lz4"] = (lambda data,level: lz4_frame.compress(data,compression_level=level),
+                     lz4_frame.decompress)
+
+
+def available_codecs():
+    return list(codecs.keys())
+
+def check_codec(codec):
+    """
+    Purpose: To validate a codec name
+    (None is the default codec, "none" is no compression)
+    """
+    if codec is None:
+        codec = default_codec
+    if codec not in codecs:
+        raise Exception(f"Codec {codec} not available (available codecs = {available_codecs()})")
+    return codec
+
+def compress(data,codec = None,level = None):
+    codec = nxcodec.check_codec(codec)
+    if level is None:
+        level = default_levels.get(codec,None)
+    return codecs[codec][0](data,level)
+
+def decompress(data,codec):
+    codec = nxcodec.check_codec(codec)
+    return codecs[codec][1](data)
+
+
+# ---------- pickled artifacts ----------
+def filepath_with_extension(filepath,extension = file_extension_default):
+    filepath = str(filepath)
+    if not filepath.endswith(extension):
+        filepath += extension
+    return filepath
+
+def dumps_pickle(obj,codec = None,level = None):
+    codec = nxcodec.check_codec(codec)
+    codec_bytes = codec.encode("utf-8")
+    payload = nxcodec.compress(
+        pickle.dumps(obj,protocol=pickle.HIGHEST_PROTOCOL),
+        codec = codec,
+        level = level)
+    return magic_default + bytes([len(codec_bytes)]) + codec_bytes + payload
+
+def loads_pickle(data):
+    """
+    Purpose: To unpickle bytes made by dumps_pickle
+    (plain bz2 pickles and plain pickles are detected too)
+    """
+    data = memoryview(data)
+    if bytes(data[:len(magic_default)]) == magic_default:
+        pos = len(magic_default)
+        codec_nbytes = data[pos]
+        codec = bytes(data[pos+1:pos+1+codec_nbytes]).decode("utf-8")
+        return pickle.loads(nxcodec.decompress(data[pos+1+codec_nbytes:],codec))
+    if bytes(data[:3]) == b"BZh":
+        return pickle.loads(bz2.decompress(data))
+    return pickle.loads(data)
+
+def dump_pickle(
+    obj,
+    filepath,
+    codec = None,
+    level = None,
+    folder = None,
+    return_filepath = True,
+    verbose = False,
+    ):
+    """
+    Purpose: To pickle an object compressed with a
+    certain codec (recorded in the file header)
+    """
+    if folder is not None:
+        filepath = Path(folder) / Path(filepath)
+    filepath = nxcodec.filepath_with_extension(filepath)
+    data = nxcodec.dumps_pickle(obj,codec=codec,level=level)
+    with open(filepath,"wb") as f:
+        f.write(data)
+    if verbose:
+        print(f"Wrote {filepath} ({codec}, {len(data)/1_000_000:.3f} MB)")
+    if return_filepath:
+        return filepath
+    return len(data)
+
+def load_pickle(filepath,verbose = False):
+    """
+    Purpose: To load a pickled artifact with any codec
+    (legacy .pbz2 files made by su.compressed_pickle are also read)
+    """
+    filepath = str(filepath)
+    if not Path(filepath).exists():
+        for ext in (file_extension_default,".pbz2"):
+            if Path(filepath + ext).exists():
+                filepath = filepath + ext
+                break
+    if verbose:
+        print(f"Loading: {filepath}")
+    with open(filepath,"rb") as f:
+        return nxcodec.loads_pickle(f.read())
+
+def is_codec_pickle_file(filepath):
+    filepath = Path(filepath)
+    if not filepath.is_file():
+        return False
+    with open(filepath,"rb") as f:
+        return f.read(len(magic_default)) == magic_default
+
+
+# ---------- benchmarking ----------
+def benchmark_codecs(
+    G = None,
+    filepath = None,
+    codecs_to_test = None,
+    artifacts = ("pickle","columnar"),
+    n_repeats = 3,
+    level = None,
+    verbose = True,
+    ):
+    """
+    Purpose: To measure the write/read throughput
+    and compression ratio of every codec on a neuron graph
+
+    Pseudocode:
+    For every artifact type (whole graph pickle, columnar container)
+    and every codec:
+    1) Time the encoding + compression (best of n_repeats)
+    2) Time the decompression + decoding (best of n_repeats)
+    3) Record the size relative to the uncompressed size
+
+    Throughputs are in MB/s of uncompressed data
+
+    Ex:
+    nxcodec.benchmark_codecs(filepath="../Applications/Data/864691134884771066_0_proofread_G.pbz2")
+    """
+    import pandas as pd
+    import neuron_nx_columnar as nxcol
+
+    if G is None:
+        G = nxcodec.load_pickle(filepath)
+
+    if codecs_to_test is None:
+        codecs_to_test = nxcodec.available_codecs()
+
+    results = []
+    for artifact in artifacts:
+        if artifact == "pickle":
+            raw_nbytes = len(pickle.dumps(G,protocol=pickle.HIGHEST_PROTOCOL))
+            def write_func(codec):
+                return nxcodec.dumps_pickle(G,codec=codec,level=level)
+            def read_func(data):
+                return nxcodec.loads_pickle(data)
+        elif artifact == "columnar":
+            raw_nbytes = len(nxcol.G_to_bytes(G,codec="none"))
+            def write_func(codec):
+                return nxcol.G_to_bytes(G,codec=codec,level=level)
+            def read_func(data):
+                return nxcol.ColumnarG(data).to_G()
+        else:
+            raise Exception(f"Unknown artifact {artifact}")
+
+        for codec in codecs_to_test:
+            write_times = []
+            read_times = []
+            for _ in range(n_repeats):
+                st = time.perf_counter()
+                data = write_func(codec)
+                write_times.append(time.perf_counter() - st)
+
+                st = time.perf_counter()
+                read_func(data)
+                read_times.append(time.perf_counter() - st)
+
+            curr_dict = dict(
+                artifact = artifact,
+                codec = codec,
+                raw_mb = raw_nbytes/1_000_000,
+                compressed_mb = len(data)/1_000_000,
+                compression_ratio = raw_nbytes/len(data),
+                write_mb_per_s = raw_nbytes/1_000_000/np.min(write_times),
+                read_mb_per_s = raw_nbytes/1_000_000/np.min(read_times),
+            )
+            if verbose:
+                print(curr_dict)
+            results.append(curr_dict)
+
+    return pd.DataFrame.from_records(results)
+
+
+import neuron_nx_codecs as nxcodec
+
+if __name__ == "__main__":
+    sample_filepath = (Path(__file__).parent.parent / "Applications" / "Data"
+                       / "864691134884771066_0_proofread_G.pbz2")
+    df = nxcodec.benchmark_codecs(filepath=sample_filepath,verbose = False)
+    print(df.to_string(index=False))
@@ -0,0 +1,809 @@
+"""
+Purpose: To store a neuron graph in a columnar
+on-disk container that can be memory-mapped
+(instead of one big bz2 pickle of the networkx object)
+
+Layout of a container:
+    magic (8 bytes) | header length (uint64) | json header | padding
+    | data blocks (each aligned to block_alignment)
+
+The json header records every block (dtype, shape, offset, nbytes)
+and how each node attribute was encoded into blocks:
+
+    scalar  : numeric/bool values -> one array of length n_nodes
+    string  : str values -> one fixed width unicode array
+    array   : same shaped numeric arrays -> one stacked array
+    ragged  : numeric arrays with varying first dimension (ex: skeleton_data)
+              -> one vertex pool + per-node offsets
+    mapping : dict with str keys (ex: width_new) -> one sub column per key
+    records : list of dicts (ex: synapse_data, spine_data, width_data)
+              -> per-node record offsets + one flattened sub column per key
+    object  : anything else -> pickled list (only unpickled if accessed)
+
+Every encoding can also carry a "present" mask (node has the attribute)
+and a "null" mask (value was None), scalar columns mixing ints and floats
+carry an "int" mask so the ints decode as ints
+
+Scalars decode to the same value as a python type: numpy
+scalars (ex: np.float64, np.int64) come back as python float/int
+
+Blocks can be compressed (one codec for the container or per column,
+see neuron_nx_codecs), the codec is stored per block in the header.
+Compressed blocks are decompressed on access instead of memory-mapped
+
+Ex:
+import neuron_nx_columnar as nxcol
+filepath = nxcol.write_G(G,"./seg_864691134884771066_0")
+G_col = nxcol.open_G(filepath)
+G_col.column("skeletal_length")
+G_rec = G_col.to_G()
+"""
+import io
+import json
+import mmap
+import pickle
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+
+import neuron_nx_codecs as nxcodec
+import neuron_nx_graph as nxg
+
+magic_default = b"NXCOL\x00\x01\x00"
+file_extension_default = ".nxcol"
+block_alignment_default = 64
+format_version = 1
+
+graph_identifiers_default = (
+    "segment_id",
+    "split_index",
+    "nucleus_id",
+)
+
+nodes_block_name = "__nodes__"
+edges_block_name = "__edges__"
+graph_block_name = "__graph__"
+edge_data_block_name = "__edge_data__"
+
+
+# --------- encoding node attribute values into blocks ---------
+class _Absent:
+    pass
+absent = _Absent()
+
+def _is_bool(v):
+    return isinstance(v,(bool,np.bool_))
+
+def _is_int(v):
+    return isinstance(v,(int,np.integer)) and not _is_bool(v)
+
+def _is_float(v):
+    return isinstance(v,(float,np.floating))
+
+def _is_numeric_array(v):
+    return isinstance(v,np.ndarray) and v.dtype.kind in "biuf"
+
+def _is_str_keyed_dict(v):
+    return isinstance(v,dict) and all(isinstance(k,str) for k in v.keys())
+
+def _is_records(v):
+    return isinstance(v,list) and all(_is_str_keyed_dict(k) for k in v)
+
+def value_kind(values):
+    """
+    Purpose: To decide which encoding will be used
+    for a list of values (absent and None values are ignored)
+    """
+    values = [v for v in values if v is not absent and v is not None]
+    if len(values) == 0:
+        return "object"
+    if all(_is_bool(v) for v in values):
+        return "scalar"
+    if all(_is_int(v) or _is_float(v) for v in values):
+        return "scalar"
+    if all(isinstance(v,str) for v in values):
+        return "string"
+    if all(_is_numeric_array(v) for v in values):
+        shapes = set([v.shape for v in values])
+        if len(shapes) == 1:
+            return "array"
+        if (all(v.ndim >= 1 for v in values)
+            and len(set([v.shape[1:] for v in values])) == 1):
+            return "ragged"
+        return "object"
+    if all(_is_records(v) for v in values):
+        return "records"
+    if all(_is_str_keyed_dict(v) for v in values):
+        return "mapping"
+    return "object"
+
+def _masks(values,name,blocks,spec):
+    present = np.array([v is not absent for v in values],dtype=bool)
+    null = np.array([v is None for v in values],dtype=bool)
+    if not present.all():
+        blocks[f"{name}/present"] = present
+        spec["present"] = f"{name}/present"
+    if null.any():
+        blocks[f"{name}/null"] = null
+        spec["null"] = f"{name}/null"
+
+def _encode_values(values,name,blocks):
+    """
+    Purpose: To encode a list of values (one per row) into
+    numpy blocks (stored in the blocks dict) and return the
+    json spec describing how to decode them
+    """
+    kind = value_kind(values)
+    spec = dict(kind=kind)
+    _masks(values,name,blocks,spec)
+    filled = [v for v in values if v is not absent and v is not None]
+
+    try:
+        if kind == "scalar":
+            if all(_is_bool(v) for v in filled):
+                dtype = bool
+            elif all(_is_int(v) for v in filled):
+                dtype = np.int64
+            else:
+                dtype = np.float64
+                # ints in a float column are marked so they decode as ints
+                is_int = np.array([_is_int(v) for v in values],dtype=bool)
+                if is_int.any():
+                    blocks[f"{name}/int"] = is_int
+                    spec["int"] = f"{name}/int"
+            blocks[f"{name}/values"] = np.array(
+                [v if (v is not absent and v is not None) else 0 for v in values],
+                dtype=dtype)
+            spec["values"] = f"{name}/values"
+        elif kind == "string":
+            blocks[f"{name}/values"] = np.array(
+                [v if (v is not absent and v is not None) else "" for v in values],
+                dtype=str)
+            spec["values"] = f"{name}/values"
+        elif kind == "array":
+            shape = filled[0].shape
+            dtype = np.result_type(*[v.dtype for v in filled])
+            blocks[f"{name}/values"] = np.array(
+                [v if (v is not absent and v is not None) else np.zeros(shape,dtype=dtype)
+                 for v in values],dtype=dtype).reshape(-1,*shape)
+            spec["values"] = f"{name}/values"
+        elif kind == "ragged":
+            inner_shape = filled[0].shape[1:]
+            dtype = np.result_type(*[v.dtype for v in filled])
+            lengths = [len(v) if (v is not absent and v is not None) else 0 for v in values]
+            offsets = np.zeros(len(values)+1,dtype=np.int64)
+            offsets[1:] = np.cumsum(lengths)
+            pool = [v for v in filled if len(v) > 0]
+            if len(pool) > 0:
+                pool = np.concatenate(pool).astype(dtype)
+            else:
+                pool = np.zeros((0,*inner_shape),dtype=dtype)
+            blocks[f"{name}/values"] = pool
+            blocks[f"{name}/offsets"] = offsets
+            spec["values"] = f"{name}/values"
+            spec["offsets"] = f"{name}/offsets"
+        elif kind == "mapping":
+            keys = list(dict.fromkeys([k for v in filled for k in v.keys()]))
+            spec["keys"] = {}
+            for k in keys:
+                sub_values = [v.get(k,absent) if (v is not absent and v is not None) else absent
+                              for v in values]
+                spec["keys"][k] = _encode_values(sub_values,f"{name}/{k}",blocks)
+        elif kind == "records":
+            lengths = [len(v) if (v is not absent and v is not None) else 0 for v in values]
+            offsets = np.zeros(len(values)+1,dtype=np.int64)
+            offsets[1:] = np.cumsum(lengths)
+            blocks[f"{name}/offsets"] = offsets
+            spec["offsets"] = f"{name}/offsets"
+            all_records = [r for v in filled for r in v]
+            keys = list(dict.fromkeys([k for r in all_records for k in r.keys()]))
+            spec["keys"] = {}
+            for k in keys:
+                spec["keys"][k] = _encode_values(
+                    [r.get(k,absent) for r in all_records],
+                    f"{name}/{k}",
+                    blocks)
+        else:
+            raise ValueError(kind)
+    except (ValueError,TypeError,OverflowError):
+        # anything that does not fit a typed layout is pickled
+        for k in [k for k in blocks if k.startswith(f"{name}/")]:
+            del blocks[k]
+        spec = dict(kind="object")
+        blocks[f"{name}/pickle"] = np.frombuffer(
+            pickle.dumps([None if v is absent else v for v in values],
+                         protocol=pickle.HIGHEST_PROTOCOL),dtype=np.uint8)
+        spec["pickle"] = f"{name}/pickle"
+        _masks(values,name,blocks,spec)
+
+    return spec
+
+def _json_safe(v):
+    if isinstance(v,np.generic):
+        return v.item()
+    if isinstance(v,(int,float,str,bool)) or v is None:
+        return v
+    return str(v)
+
+def _aligned(n,alignment):
+    return int(np.ceil(n/alignment)*alignment)
+
+def encode_G(
+    G,
+    attributes = None,
+    exclude_attributes = None,
+    graph_identifiers = graph_identifiers_default,
+    ):
+    """
+    Purpose: To turn a networkx neuron graph into
+    the header dict and named numpy blocks of a container
+
+    Pseudocode:
+    1) Fix a node order and store the node names
+    2) Store the edges as integer node indexes
+    3) Encode every node attribute as a column
+    4) Pickle the graph attributes (and edge attributes if any)
+    """
+    nodelist = list(G.nodes())
+    node_to_idx = {n:i for i,n in enumerate(nodelist)}
+    blocks = dict()
+
+    node_spec = _encode_values(nodelist,nodes_block_name,blocks)
+
+    edges = np.array([[node_to_idx[u],node_to_idx[v]] for u,v in G.edges()],
+                     dtype=np.int64).reshape(-1,2)
+    blocks[edges_block_name] = edges
+
+    blocks[f"{graph_block_name}/pickle"] = np.frombuffer(
+        pickle.dumps([dict(G.graph)],protocol=pickle.HIGHEST_PROTOCOL),dtype=np.uint8)
+    graph_spec = dict(kind="object",pickle=f"{graph_block_name}/pickle")
+
+    edge_data = [d for _,_,d in G.edges(data=True)]
+    edge_spec = None
+    if any(len(d) > 0 for d in edge_data):
+        blocks[f"{edge_data_block_name}/pickle"] = np.frombuffer(
+            pickle.dumps(edge_data,protocol=pickle.HIGHEST_PROTOCOL),dtype=np.uint8)
+        edge_spec = dict(kind="object",pickle=f"{edge_data_block_name}/pickle")
+
+    node_dicts = [G.nodes[n] for n in nodelist]
+    if attributes is None:
+        attributes = list(dict.fromkeys([k for d in node_dicts for k in d.keys()]))
+    if exclude_attributes is not None:
+        attributes = [k for k in attributes if k not in exclude_attributes]
+
+    attribute_specs = dict()
+    for a in attributes:
+        attribute_specs[a] = _encode_values(
+            [d[a] if a in d else absent for d in node_dicts],
+            f"attr/{a}",
+            blocks)
+
+    graph_attr = dict(G.graph)
+    header = dict(
+        format = "nxcol",
+        version = format_version,
+        graph_type = "DiGraph" if G.is_directed() else "Graph",
+        n_nodes = len(nodelist),
+        n_edges = len(edges),
+        identifiers = {k:_json_safe(graph_attr.get(k,None)) for k in graph_identifiers},
+        nodes = node_spec,
+        graph = graph_spec,
+        edge_data = edge_spec,
+        attributes = attribute_specs,
+    )
+
+    return header,blocks
+
+def block_codec(
+    name,
+    codec = None,
+    column_codecs = None,
+    ):
+    """
+    Purpose: To pick the codec of a block: the codec
+    of its column in column_codecs (ex: {"skeleton_data":"zstd"})
+    or else the container codec
+    """
+    if column_codecs is not None:
+        parts = name.split("/")
+        column = parts[1] if parts[0] == "attr" and len(parts) > 1 else parts[0]
+        if column in column_codecs:
+            codec = column_codecs[column]
+    # no codec = uncompressed blocks (so they can be memory mapped)
+    if codec is None:
+        return "none"
+    return nxcodec.check_codec(codec)
+
+def write_container(
+    f,
+    header,
+    blocks,
+    block_alignment = block_alignment_default,
+    codec = None,
+    column_codecs = None,
+    level = None,
+    ):
+    """
+    Purpose: To write an encoded container to an open
+    binary file (starting at the current position of the file)
+    and return the number of bytes written
+    
+    codec: codec used for every block (None = uncompressed, so
+    blocks can be memory mapped), column_codecs overrides it per column
+    """
+    block_info = dict()
+    block_bytes = dict()
+    offset = 0
+    for name,arr in blocks.items():
+        arr = np.ascontiguousarray(arr)
+        data = arr.tobytes()
+        curr_codec = nxcol.block_codec(name,codec,column_codecs)
+        if curr_codec != "none":
+            data = nxcodec.compress(data,codec=curr_codec,level=level)
+        offset = _aligned(offset,block_alignment)
+        block_info[name] = dict(
+            dtype = arr.dtype.str,
+            shape = list(arr.shape),
+            offset = offset,
+            nbytes = len(data),
+            codec = curr_codec,
+            raw_nbytes = int(arr.nbytes),
+        )
+        block_bytes[name] = data
+        offset += len(data)
+
+    header = dict(header)
+    header["block_alignment"] = block_alignment
+    header["blocks"] = block_info
+    header["data_nbytes"] = offset
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    prefix = magic_default + np.uint64(len(header_bytes)).tobytes() + header_bytes
+    data_start = _aligned(len(prefix),block_alignment)
+    f.write(prefix)
+    f.write(b"\x00"*(data_start - len(prefix)))
+
+    written = 0
+    for name,data in block_bytes.items():
+        info = block_info[name]
+        if info["offset"] > written:
+            f.write(b"\x00"*(info["offset"] - written))
+            written = info["offset"]
+        f.write(data)
+        written += info["nbytes"]
+
+    return data_start + written
+
+def G_to_bytes(
+    G,
+    codec = None,
+    column_codecs = None,
+    level = None,
+    **kwargs
+    ):
+    """
+    Purpose: To encode a graph as container bytes (in memory)
+    """
+    header,blocks = nxcol.encode_G(G,**kwargs)
+    f = io.BytesIO()
+    nxcol.write_container(
+        f,header,blocks,
+        codec=codec,
+        column_codecs=column_codecs,
+        level=level)
+    return f.getvalue()
+
+def filepath_with_extension(filepath,extension = file_extension_default):
+    filepath = str(filepath)
+    if not filepath.endswith(extension):
+        filepath += extension
+    return filepath
+
+def write_G(
+    G,
+    filepath,
+    attributes = None,
+    exclude_attributes = None,
+    block_alignment = block_alignment_default,
+    codec = None,
+    column_codecs = None,
+    level = None,
+    return_filepath = True,
+    verbose = False,
+    ):
+    """
+    Purpose: To save a neuron graph as a
+    columnar container
+
+    Ex:
+    nxcol.write_G(G,"./seg_864691134884771066_0",verbose = True)
+    
+    Ex 2: compressing only the big columns
+    nxcol.write_G(
+        G,
+        "./seg_864691134884771066_0",
+        column_codecs = dict(skeleton_data="zstd",synapse_data="zstd"),
+    )
+    """
+    filepath = nxcol.filepath_with_extension(filepath)
+    header,blocks = nxcol.encode_G(
+        G,
+        attributes=attributes,
+        exclude_attributes=exclude_attributes)
+
+    with open(filepath,"wb") as f:
+        nbytes = nxcol.write_container(
+            f,header,blocks,
+            block_alignment=block_alignment,
+            codec=codec,
+            column_codecs=column_codecs,
+            level=level)
+
+    if verbose:
+        print(f"Wrote {len(blocks)} blocks ({nbytes/1_000_000:.3f} MB) to {filepath}")
+
+    if return_filepath:
+        return filepath
+    return nbytes
+
+
+# --------- reading the container ---------
+def read_header(buffer,offset=0):
+    """
+    Purpose: To read the json header of a container
+    starting at offset in a buffer (bytes or mmap)
+
+    Returns: header dict, byte position the data blocks start at
+    """
+    magic = bytes(buffer[offset:offset+8])
+    if magic != magic_default:
+        raise Exception(f"Not a columnar neuron graph container (magic = {magic})")
+    header_nbytes = int(np.frombuffer(bytes(buffer[offset+8:offset+16]),dtype=np.uint64)[0])
+    header = json.loads(bytes(buffer[offset+16:offset+16+header_nbytes]).decode("utf-8"))
+    data_start = offset + _aligned(16+header_nbytes,header.get("block_alignment",block_alignment_default))
+    return header,data_start
+
+def is_columnar_file(filepath):
+    filepath = Path(filepath)
+    if not filepath.is_file():
+        return False
+    with open(filepath,"rb") as f:
+        return f.read(len(magic_default)) == magic_default
+
+class ColumnarG:
+    """
+    Purpose: Read only view of a container where
+    blocks are only paged in (from a memory map) when a
+    column that needs them is accessed
+
+    Ex:
+    G_col = nxcol.open_G(filepath)
+    G_col.nodelist
+    G_col.column("skeletal_length")
+    G_col.node_value("synapse_data","L0_0")
+    G_col.to_G()
+    """
+    def __init__(self,buffer,offset = 0,filepath = None):
+        self.buffer = buffer
+        self.offset = offset
+        self.filepath = filepath
+        self.header,self.data_start = nxcol.read_header(buffer,offset)
+        self._blocks = dict()
+        self._pickles = dict()
+        self._nodelist = None
+        self._node_to_idx = None
+
+    def __len__(self):
+        return self.header["n_nodes"]
+
+    def __repr__(self):
+        return (f"ColumnarG({self.header['identifiers']}, n_nodes = {self.header['n_nodes']},"
+                f" n_edges = {self.header['n_edges']}, filepath = {self.filepath})")
+
+    def close(self):
+        self._blocks = dict()
+        if isinstance(self.buffer,mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    @property
+    def identifiers(self):
+        return self.header["identifiers"]
+
+    @property
+    def attribute_names(self):
+        return list(self.header["attributes"].keys())
+
+    def block(self,name):
+        """
+        Purpose: Zero copy (read only) array
+        over one block of the container
+        (compressed blocks are decompressed into memory instead)
+        """
+        if name not in self._blocks:
+            info = self.header["blocks"][name]
+            dtype = np.dtype(info["dtype"])
+            count = int(np.prod(info["shape"]))
+            codec = info.get("codec","none")
+            if codec != "none":
+                start = self.data_start + info["offset"]
+                data = nxcodec.decompress(self.buffer[start:start + info["nbytes"]],codec)
+                self._blocks[name] = np.frombuffer(
+                    data,dtype=dtype,count=count).reshape(info["shape"])
+                return self._blocks[name]
+            self._blocks[name] = np.frombuffer(
+                self.buffer,
+                dtype=dtype,
+                count=count,
+                offset=self.data_start + info["offset"],
+            ).reshape(info["shape"])
+        return self._blocks[name]
+
+    def _pickle_block(self,name):
+        if name not in self._pickles:
+            self._pickles[name] = pickle.loads(self.block(name).tobytes())
+        return self._pickles[name]
+
+    @property
+    def nodelist(self):
+        if self._nodelist is None:
+            self._nodelist = self._decode_all(self.header["nodes"],self.header["n_nodes"])
+        return self._nodelist
+
+    def node_idx(self,node):
+        if self._node_to_idx is None:
+            self._node_to_idx = {n:i for i,n in enumerate(self.nodelist)}
+        return self._node_to_idx[node]
+
+    @property
+    def edges(self):
+        return self.block(edges_block_name)
+
+    @property
+    def graph(self):
+        return dict(self._decode_all(self.header["graph"],1)[0])
+
+    def edge_data(self):
+        if self.header.get("edge_data",None) is None:
+            return None
+        return self._pickle_block(self.header["edge_data"]["pickle"])
+
+    # ----- decoding helpers -----
+    def _present(self,spec,n):
+        if "present" in spec:
+            return self.block(spec["present"])
+        return np.ones(n,dtype=bool)
+
+    def _null(self,spec,n):
+        if "null" in spec:
+            return self.block(spec["null"])
+        return np.zeros(n,dtype=bool)
+
+    def _decode_all(self,spec,n,present = None):
+        """
+        Purpose: To decode all n rows of a spec into a
+        list of values (absent rows are returned as absent)
+        """
+        kind = spec["kind"]
+        if present is None:
+            present = self._present(spec,n)
+        null = self._null(spec,n)
+
+        if kind == "object":
+            values = list(self._pickle_block(spec["pickle"]))
+        elif kind == "scalar":
+            values = self.block(spec["values"]).tolist()
+            if "int" in spec:
+                for i in np.where(self.block(spec["int"]))[0]:
+                    values[i] = int(values[i])
+        elif kind == "string":
+            values = [str(k) for k in self.block(spec["values"]).tolist()]
+        elif kind == "array":
+            arr = self.block(spec["values"])
+            values = [np.array(arr[i]) for i in range(n)]
+        elif kind == "ragged":
+            arr = self.block(spec["values"])
+            offsets = self.block(spec["offsets"])
+            values = [np.array(arr[offsets[i]:offsets[i+1]]) for i in range(n)]
+        elif kind == "mapping":
+            sub = {k:self._decode_all(s,n) for k,s in spec["keys"].items()}
+            values = []
+            for i in range(n):
+                values.append({k:v[i] for k,v in sub.items() if v[i] is not absent})
+        elif kind == "records":
+            offsets = self.block(spec["offsets"])
+            n_records = int(offsets[-1])
+            sub = {k:self._decode_all(s,n_records) for k,s in spec["keys"].items()}
+            values = []
+            for i in range(n):
+                values.append([
+                    {k:v[j] for k,v in sub.items() if v[j] is not absent}
+                    for j in range(offsets[i],offsets[i+1])])
+        else:
+            raise Exception(f"Unknown column kind {kind}")
+
+        return [absent if not p else (None if nl else v)
+                for v,p,nl in zip(values,present,null)]
+
+    def _decode_one(self,spec,i):
+        """
+        Purpose: To decode a single row of a spec
+        """
+        if "present" in spec and not self.block(spec["present"])[i]:
+            return absent
+        if "null" in spec and self.block(spec["null"])[i]:
+            return None
+
+        kind = spec["kind"]
+        if kind == "object":
+            return self._pickle_block(spec["pickle"])[i]
+        elif kind == "scalar":
+            if "int" in spec and self.block(spec["int"])[i]:
+                return int(self.block(spec["values"])[i])
+            return self.block(spec["values"])[i].item()
+        elif kind == "string":
+            return str(self.block(spec["values"])[i])
+        elif kind == "array":
+            return np.array(self.block(spec["values"])[i])
+        elif kind == "ragged":
+            offsets = self.block(spec["offsets"])
+            return np.array(self.block(spec["values"])[offsets[i]:offsets[i+1]])
+        elif kind == "mapping":
+            value = dict()
+            for k,s in spec["keys"].items():
+                v = self._decode_one(s,i)
+                if v is not absent:
+                    value[k] = v
+            return value
+        elif kind == "records":
+            offsets = self.block(spec["offsets"])
+            return [self._decode_one(dict(kind="mapping",keys=spec["keys"]),j)
+                    for j in range(offsets[i],offsets[i+1])]
+        else:
+            raise Exception(f"Unknown column kind {kind}")
+
+    # ----- public accessors -----
+    def node_value(self,attribute,node,default = None):
+        """
+        Purpose: To decode one attribute of one node
+        (only touches the blocks of that attribute)
+        """
+        if not isinstance(node,(int,np.integer)):
+            node = self.node_idx(node)
+        value = self._decode_one(self.header["attributes"][attribute],node)
+        if value is absent:
+            return default
+        return value
+
+    def node_attribute(self,attribute):
+        """
+        Purpose: To get a dict of node --> value for
+        all nodes that have the attribute
+        """
+        values = self._decode_all(self.header["attributes"][attribute],len(self))
+        return {n:v for n,v in zip(self.nodelist,values) if v is not absent}
+
+    def column(self,attribute,fill_value = np.nan):
+        """
+        Purpose: To get a zero copy numpy column of
+        a scalar or fixed shape array attribute (absent and
+        None rows are filled with fill_value)
+
+        Ex: G_col.column("skeletal_length")
+        """
+        spec = self.header["attributes"][attribute]
+        if spec["kind"] not in ("scalar","array"):
+            raise Exception(f"{attribute} is stored as {spec['kind']} and not a numeric column")
+        values = self.block(spec["values"])
+        missing = ~self._present(spec,len(self)) | self._null(spec,len(self))
+        if missing.any():
+            values = values.astype(np.result_type(values.dtype,np.array(fill_value).dtype))
+            values[missing] = fill_value
+        return values
+
+    def to_G(
+        self,
+        attributes = None,
+        exclude_attributes = None,
+        lazy_attributes = None,
+        ):
+        """
+        Purpose: To build the networkx graph
+        stored in the container
+        
+        A DiGraph is returned as a nxg.NeuronDiGraph (so the caches
+        of values computed from it are kept between calls)
+
+        lazy_attributes: attributes that are not decoded now but left
+        as placeholders in the node dicts (decoded on first access),
+        the graph then keeps this container open
+        """
+        if self.header["graph_type"] == "DiGraph":
+            G = nxg.NeuronDiGraph()
+            node_dicts = [nxg.NodeAttrDict() for _ in range(len(self))]
+        else:
+            lazy_attributes = None
+            G = getattr(nx,self.header["graph_type"])()
+            node_dicts = [dict() for _ in range(len(self))]
+            
+        G.graph.update(self.graph)
+        nodelist = self.nodelist
+
+        if attributes is None:
+            attributes = self.attribute_names
+        if exclude_attributes is not None:
+            attributes = [k for k in attributes if k not in exclude_attributes]
+
+        for a in attributes:
+            spec = self.header["attributes"][a]
+            if lazy_attributes is not None and a in lazy_attributes:
+                present = self._present(spec,len(self))
+                null = self._null(spec,len(self))
+                for i,(d,p,nl) in enumerate(zip(node_dicts,present,null)):
+                    if p:
+                        d[a] = None if nl else nxg.LazyAttribute(self,a,i)
+                continue
+                
+            values = self._decode_all(spec,len(nodelist))
+            for d,v in zip(node_dicts,values):
+                if v is not absent:
+                    d[a] = v
+
+        G.add_nodes_from(zip(nodelist,node_dicts))
+
+        edges = self.edges
+        edge_data = self.edge_data()
+        if edge_data is None:
+            G.add_edges_from([(nodelist[u],nodelist[v]) for u,v in edges.tolist()])
+        else:
+            G.add_edges_from([(nodelist[u],nodelist[v],d)
+                              for (u,v),d in zip(edges.tolist(),edge_data)])
+        return G
+
+def open_G(filepath):
+    """
+    Purpose: To memory map a container file
+    (nothing besides the header is read until accessed)
+    """
+    filepath = str(filepath)
+    if not Path(filepath).exists():
+        filepath = nxcol.filepath_with_extension(filepath)
+    with open(filepath,"rb") as f:
+        buffer = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    return ColumnarG(buffer,filepath=filepath)
+
+def read_G(
+    filepath,
+    attributes = None,
+    exclude_attributes = None,
+    lazy_attributes = None,
+    ):
+    """
+    Purpose: To load a networkx graph from
+    a container file
+
+    Ex:
+    G = nxcol.read_G(filepath)
+    
+    Ex 2: leaving the dynamic attributes on disk until accessed
+    G = nxcol.read_G(filepath,lazy_attributes = nxu.dynamic_attributes_default)
+    """
+    G_col = nxcol.open_G(filepath)
+    try:
+        G = G_col.to_G(
+            attributes=attributes,
+            exclude_attributes=exclude_attributes,
+            lazy_attributes=lazy_attributes)
+    finally:
+        if lazy_attributes is None:
+            G_col.close()
+    return G
+
+
+import neuron_nx_columnar as nxcol
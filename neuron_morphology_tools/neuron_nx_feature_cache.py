@@ -0,0 +1,341 @@
+"""
+Purpose: On disk cache of computed node feature columns
+shared across runs and processes (so re-running the GNN exports
+with a different label or threshold doesn't recompute the features)
+
+Entries are content addressed: the key of a feature column is a hash of
+- the feature name, its registered version and dtype (see nxf.register_feature)
+  and nxf.feature_code_version
+- the node names (in order)
+- the values of the feature's inputs on those nodes
+
+so a changed graph (or changed feature code with a bumped version)
+never reads a stale column
+
+Folder layout:
+    <folder>/<key[:2]>/<key>.nxpkl : the column (list of values) pickled with nxcodec
+
+The cache is bounded by max_bytes with least recently used eviction:
+every read touches the file modification time and when the folder
+goes over max_bytes the oldest files are deleted. The folder is
+scanned for its size once per process (every FeatureCache of the
+folder then adds to the same running size, the scan is redone on eviction)
+
+Only the features registered with cache = True are cached, the ones
+that cost more to compute than to hash their inputs: on the sample
+neuron (163 branches) the 4 polar skeleton vector features take 2.5 ms
+(a polar conversion per node) while hashing their 2 input columns
+takes 0.7 ms, the label features take 0.1 ms (less than a hash of
+their inputs and a cache read) so they are not cached.
+nxio.export_GNN_info_dict computes the features before the distance
+thresholds, so a sweep over thresholds reads them from the cache
+
+Ex:
+import neuron_nx_feature_cache as nxfcache
+cache = nxfcache.FeatureCache("./feature_cache",max_bytes = 2_000_000_000)
+G = nxf.add_any_missing_node_features(G,features,feature_cache = cache)
+
+nxio.GNN_info_axon_vs_dendrite(G,feature_cache = "./feature_cache")
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+import neuron_nx_codecs as nxcodec
+
+file_extension_default = ".nxpkl"
+max_bytes_default = 5_000_000_000
+codec_default = "zlib"
+digest_size = 20
+
+
+def _update_hash(h,value):
+    """
+    Purpose: To add a node value to a hash
+    (the same content always gives the same bytes,
+    across processes and runs)
+    """
+    if isinstance(value,np.ndarray):
+        h.update(f"a{value.dtype.str}{value.shape}".encode())
+        if value.dtype.kind == "O":
+            for v in value.ravel():
+                _update_hash(h,v)
+        else:
+            h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value,dict):
+        h.update(f"d{len(value)}".encode())
+        for k in sorted(value.keys(),key=repr):
+            _update_hash(h,k)
+            _update_hash(h,value[k])
+    elif isinstance(value,(list,tuple)):
+        h.update(f"l{len(value)}".encode())
+        for v in value:
+            _update_hash(h,v)
+    elif value is None or isinstance(value,(str,bytes,bool,int,float,np.generic)):
+        r = repr(value).encode()
+        h.update(f"s{type(value).__name__}{len(r)}:".encode())
+        h.update(r)
+    else:
+        r = pickle.dumps(value,protocol=4)
+        h.update(f"p{len(r)}:".encode())
+        h.update(r)
+
+def value_digest(value):
+    h = hashlib.blake2b(digest_size=digest_size)
+    _update_hash(h,value)
+    return h.hexdigest()
+
+_missing = "__missing__"
+
+def attribute_digest(G,attribute,nodes):
+    """
+    Purpose: Content hash of an attribute on the nodes
+    (node names included, nodes without it hash as missing)
+
+    Lists and dicts are hashed through their pickle (much faster than
+    walking them for lists of synapse dicts), values that are equal
+    but pickle differently only cost a cache miss. Numeric vectors
+    of the same shape (ex: skeleton_vector_upstream) are stacked
+    and hashed in one update
+    """
+    h = hashlib.blake2b(digest_size=digest_size)
+    _update_hash(h,attribute)
+    r = pickle.dumps(list(nodes),protocol=4)
+    h.update(f"p{len(r)}:".encode())
+    h.update(r)
+    node_dicts = G.nodes
+    values = [node_dicts[n].get(attribute,_missing) for n in nodes]
+
+    if (len(values) > 0 and all(isinstance(v,np.ndarray) for v in values)
+        and values[0].dtype.kind in "biuf"
+        and all(v.dtype == values[0].dtype and v.shape == values[0].shape for v in values)):
+        _update_hash(h,np.stack(values))
+        return h.hexdigest()
+
+    for value in values:
+        if isinstance(value,(list,dict)):
+            try:
+                r = pickle.dumps(value,protocol=4)
+                h.update(f"p{len(r)}:".encode())
+                h.update(r)
+                continue
+            except Exception:
+                pass
+        _update_hash(h,value)
+    return h.hexdigest()
+
+def is_cached_feature(feature_name):
+    """
+    Purpose: If a feature is worth caching
+    (registered with cache = True)
+    """
+    entry = nxf.feature_registry.get(feature_name,None)
+    return entry is not None and entry.get("cache",False)
+
+def feature_key(G,feature_name,nodes,digests = None):
+    """
+    Purpose: The content address of a feature column
+    on the nodes of a graph
+
+    digests: dict of attribute digests reused between
+    the features of one call (filled in place)
+    """
+    entry = nxf.feature_registry[feature_name]
+    if digests is None:
+        digests = dict()
+    h = hashlib.blake2b(digest_size=digest_size)
+    _update_hash(h,[
+        feature_name,
+        nxf.feature_code_version,
+        entry["version"],
+        getattr(entry["dtype"],"__name__",str(entry["dtype"])),
+        entry["default_value"],
+    ])
+    for a in entry["inputs"]:
+        if a not in digests:
+            digests[a] = nxfcache.attribute_digest(G,a,nodes)
+        h.update(digests[a].encode())
+    return h.hexdigest()
+
+
+_folder_nbytes = dict()
+
+class FeatureCache:
+    """
+    Purpose: Size bounded (least recently used)
+    folder of feature columns addressed by content
+
+    Safe to share between processes: entries are written to a
+    temporary file and renamed, a missing or unreadable entry is a miss
+    """
+    def __init__(
+        self,
+        folder,
+        max_bytes = max_bytes_default,
+        codec = codec_default,
+        verbose = False,
+        ):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True,exist_ok=True)
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.verbose = verbose
+
+    def __repr__(self):
+        return f"FeatureCache({self.folder}, n_entries = {len(self)}, nbytes = {self.nbytes})"
+
+    @property
+    def _nbytes(self):
+        # running size shared by the caches of the folder in this process
+        return _folder_nbytes.get(str(self.folder.resolve()),None)
+
+    @_nbytes.setter
+    def _nbytes(self,value):
+        _folder_nbytes[str(self.folder.resolve())] = value
+
+    def filepath(self,key):
+        return self.folder / key[:2] / f"{key}{file_extension_default}"
+
+    def _entries(self):
+        return list(self.folder.glob(f"*/*{file_extension_default}"))
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self,key):
+        return self.filepath(key).exists()
+
+    @property
+    def nbytes(self):
+        total = 0
+        for f in self._entries():
+            try:
+                total += f.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def get(self,key):
+        """
+        Purpose: The cached column (None if not cached),
+        marks the entry as recently used
+        """
+        filepath = self.filepath(key)
+        try:
+            values = nxcodec.load_pickle(filepath)
+            os.utime(filepath)
+        except Exception:
+            return None
+        if self.verbose:
+            print(f"Feature cache hit: {key}")
+        return values
+
+    def put(self,key,values):
+        """
+        Purpose: To store a column
+        (and evict old entries if over max_bytes)
+        """
+        filepath = self.filepath(key)
+        filepath.parent.mkdir(parents=True,exist_ok=True)
+        tmp_filepath = filepath.parent / f".{key}.{os.getpid()}.tmp"
+        with open(tmp_filepath,"wb") as f:
+            f.write(nxcodec.dumps_pickle(list(values),codec=self.codec))
+        nbytes = tmp_filepath.stat().st_size
+        os.replace(tmp_filepath,filepath)
+
+        if self.max_bytes is not None:
+            if self._nbytes is None:
+                self._nbytes = self.nbytes
+            else:
+                self._nbytes += nbytes
+            if self._nbytes > self.max_bytes:
+                self.evict()
+        return filepath
+
+    def evict(self,max_bytes = None):
+        """
+        Purpose: To delete the least recently used
+        entries until the folder is under max_bytes
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        stats = []
+        for f in self._entries():
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            stats.append((st.st_mtime,st.st_size,f))
+        stats.sort(key=lambda k: k[0])
+
+        total = sum([s[1] for s in stats])
+        n_evicted = 0
+        for _,size,f in stats:
+            if total <= max_bytes:
+                break
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            n_evicted += 1
+
+        self._nbytes = total
+        if self.verbose:
+            print(f"Evicted {n_evicted} feature cache entries ({total} bytes left)")
+        return n_evicted
+
+    def clear(self):
+        return self.evict(max_bytes=0)
+
+def feature_cache(cache):
+    """
+    Purpose: A FeatureCache from a cache or a folder (None stays None)
+    """
+    if cache is None or isinstance(cache,FeatureCache):
+        return cache
+    return FeatureCache(cache)
+
+
+def add_features_from_cache(G,features,cache,nodes,digests = None):
+    """
+    Purpose: To set the features that are in the cache
+
+    Returns the features that were not cached (or are not
+    cached at all, see is_cached_feature) and the keys of the
+    cached features (to store them once computed)
+    """
+    keys = dict()
+    missing = []
+    for f in features:
+        if not nxfcache.is_cached_feature(f):
+            missing.append(f)
+            continue
+        keys[f] = nxfcache.feature_key(G,f,nodes,digests=digests)
+        values = cache.get(keys[f])
+        if values is None or len(values) != len(nodes):
+            missing.append(f)
+            continue
+        nxf.set_node_attribute_column(G,nodes,f,values)
+    return missing,keys
+
+def store_features(G,features,keys,cache,nodes):
+    """
+    Purpose: To cache the computed feature columns
+    """
+    node_dicts = G.nodes
+    for f in features:
+        if f not in keys:
+            continue
+        try:
+            values = [node_dicts[n][f] for n in nodes]
+        except KeyError:
+            continue
+        cache.put(keys[f],values)
+
+
+import neuron_nx_feature_processing as nxf
+import neuron_nx_feature_cache as nxfcache
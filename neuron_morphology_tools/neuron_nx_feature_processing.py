@@ -5,6 +5,160 @@ import networkx as nx
 import networkx_utils as xu
 import numpy as np
 import copy
+import warnings
+import neuron_nx_graph as nxg
+
+def node_attribute_names(G):
+    """
+    Purpose: The attribute names (and value types) of the limb branch nodes
+    (without building the node dataframe or loading lazy attributes)
+
+    For nxg.NeuronDiGraph (what nxu.load_G returns) this is a derived
+    index updated only for the nodes whose attributes changed
+    (see nxg.derived_index), for other graphs it is rebuilt on every call
+
+    Returns: dict(node_keys = {node:{attribute name:value type}},
+    counts = {attribute name: number of nodes with it},
+    types = {attribute name: {value type: number of nodes}})
+
+    Ex: list(nxf.node_attribute_names(G)["counts"].keys())
+    """
+    return nxg.derived_index(G,"node_attribute_names")
+
+def value_dtype(value):
+    """
+    Purpose: The type name of a node value for the attribute schema
+    (numpy scalars are named like the python ones, attributes
+    not loaded from their container yet are "lazy")
+    """
+    if type(value) is nxg.LazyAttribute:
+        return "lazy"
+    if isinstance(value,np.ndarray):
+        return f"array[{value.dtype}]"
+    if isinstance(value,np.generic):
+        value = value.item()
+    if value is None:
+        return "None"
+    return type(value).__name__
+
+def _node_attribute_names_add(index,G,n):
+    node_dict = G.nodes[n]
+    # dict.items does not load lazy attributes (array graph nodes are mappings)
+    items = dict.items(node_dict) if isinstance(node_dict,dict) else node_dict.items()
+    keys = {k:nxf.value_dtype(v) for k,v in items}
+    index["node_keys"][n] = keys
+    for k,t in keys.items():
+        index["counts"][k] = index["counts"].get(k,0) + 1
+        types = index["types"].setdefault(k,dict())
+        types[t] = types.get(t,0) + 1
+
+def _node_attribute_names_remove(index,n):
+    for k,t in index["node_keys"].pop(n).items():
+        index["counts"][k] -= 1
+        index["types"][k][t] -= 1
+        if index["types"][k][t] == 0:
+            del index["types"][k][t]
+        if index["counts"][k] == 0:
+            del index["counts"][k]
+            del index["types"][k]
+
+def _node_attribute_names_build(G):
+    index = dict(node_keys = dict(),counts = dict(),types = dict())
+    for n in nxu.limb_branch_nodes(G):
+        nxf._node_attribute_names_add(index,G,n)
+    return index
+
+def _node_attribute_names_update(G,index,entries):
+    changed_nodes = dict()
+    for _,operation,args in entries:
+        if operation in ("node_attr","add_node","remove_node"):
+            if args[0] is None:
+                return None
+            changed_nodes[args[0]] = None
+        elif operation not in ("add_edge","remove_edge"):
+            return None
+
+    for n in changed_nodes:
+        if n in index["node_keys"]:
+            nxf._node_attribute_names_remove(index,n)
+        if n in G and "S" not in n:
+            nxf._node_attribute_names_add(index,G,n)
+    return index
+
+nxg.register_derived_index(
+    "node_attribute_names",
+    _node_attribute_names_build,
+    _node_attribute_names_update)
+
+def has_feature(G,feature_name):
+    """
+    Purpose: If any limb branch node has the attribute
+
+    For nxg.NeuronDiGraph (what nxu.load_G returns) this is a
+    dictionary lookup in the attribute schema kept with the graph,
+    for nxa.NeuronGraph a look at the column, other graphs have the
+    schema rebuilt on every call (nxg.to_neuron_graph converts them)
+    """
+    if nxa.is_array_graph(G):
+        if feature_name not in G.columns:
+            return False
+        present = G.present.get(feature_name,None)
+        idx = G.idxs(nxu.limb_branch_nodes(G))
+        if present is None:
+            return len(idx) > 0
+        return bool(present[idx].any())
+    return feature_name in nxf.node_attribute_names(G)["counts"]
+
+def attribute_schema(G):
+    """
+    Purpose: The attribute schema of the limb branch nodes,
+    attribute name -> dict(dtype,count)
+    (dtype joins the value types with "|" when
+    the nodes don't agree, ex: "float|None")
+
+    For nxg.NeuronDiGraph it is kept up to date as attributes
+    are added/deleted (see nxf.node_attribute_names), for
+    nxa.NeuronGraph it is read off the typed columns
+
+    Ex:
+    nxf.attribute_schema(G)["width_no_spine"]
+    >> {'dtype': 'float', 'count': 163}
+    """
+    if nxa.is_array_graph(G):
+        idx = G.idxs(nxu.limb_branch_nodes(G))
+        column_dtypes = dict(b="bool",i="int",u="int",f="float",U="str")
+        schema = dict()
+        for a,column in G.columns.items():
+            present = G.present.get(a,None)
+            rows = idx if present is None else idx[present[idx]]
+            if len(rows) == 0:
+                continue
+            if column.dtype.kind in column_dtypes:
+                dtype = column_dtypes[column.dtype.kind]
+            else:
+                dtype = "|".join(sorted(set([nxf.value_dtype(v) for v in column[rows]])))
+            schema[a] = dict(dtype = dtype,count = len(rows))
+        return schema
+
+    index = nxf.node_attribute_names(G)
+    return {k:dict(dtype = "|".join(sorted(index["types"][k].keys())),count = c)
+            for k,c in index["counts"].items()}
+
+import pandas as pd
+def attribute_schema_df(G):
+    """
+    Purpose: The attribute schema as a dataframe
+    (attribute, dtype, count, coverage) for debugging reports
+    """
+    n_nodes = len(nxu.limb_branch_nodes(G))
+    schema = nxf.attribute_schema(G)
+    return pd.DataFrame.from_records([
+        dict(attribute = k,
+             dtype = v["dtype"],
+             count = v["count"],
+             coverage = v["count"]/n_nodes if n_nodes > 0 else 0)
+        for k,v in sorted(schema.items())],
+        columns = ["attribute","dtype","count","coverage"])
 
 def features_list(
     G,
@@ -13,17 +167,21 @@ def features_list(
     verbose = False):
     """
     Purpose: Find all of the current features
+    (from the attribute schema of the limb branch nodes,
+    see nxf.node_attribute_names)
     
     Ex: 
     import neuron_nx_feature_processing as nxf
     nxf.features_list(G)
     """
     if limb_branch_features:
-        G = nxu.limb_branch_subgraph(G)
-    node_df = xu.node_df(G)
-    current_features = list(node_df.columns)
-    if features_to_ignore is not None:
-        current_features = list(np.setdiff1d(current_features,features_to_ignore))
+        current_features = [xu.upstream_name] + list(nxf.node_attribute_names(G)["counts"].keys())
+    else:
+        node_df = xu.node_df(G)
+        current_features = list(node_df.columns)
+    if features_to_ignore is None:
+        features_to_ignore = []
+    current_features = sorted(set(current_features).difference(features_to_ignore))
 
     if verbose:
         print(f"current_features = {current_features}")
@@ -40,19 +198,27 @@ def add_node_feature(
     default_value = None,
     feature_value_dict = None,
     verbose_loop = False,
+    vectorized = True,
     #skip_if_exists = True,
     ):
     
     """
     Puprose: Will apply an feature_func
     to a node based on the current node values
+
+    vectorized: features with a column-wise version
+    (see nxf.feature_registry) are computed for
+    all nodes at once and written back in bulk, the per node
+    function is used when the column-wise one can't be
+    (missing attributes, unexpected values ...)
     """
     
     if nodes is None:
         nodes = nxu.limb_branch_nodes(G)
+    nodes = list(nodes)
         
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
     
     feature_func = nu.convert_to_array_like(feature_func)
     
@@ -62,24 +228,40 @@ def add_node_feature(
         
     def default_func(*args,**kwargs):
         return default_value
+
+    table = dict()
     
     for att_func in feature_func:
         if "str" in str(type(att_func)):
-            try:
-                att_func = getattr(nxf,att_func)
-            except:
+            func_name = att_func
+            att_func = nxf.feature_func(func_name)
+            if att_func is None:
 #                 feature_name = att_func
 #                 att_func = default_func
                 continue
+        else:
+            func_name = att_func.__name__
             
         if feature_name is None:
-            curr_name = str(att_func.__name__)
+            curr_name = str(func_name)
         else:
             curr_name = feature_name
 
         if verbose:
             print(f"\n\n---Setting {curr_name}, att_func ={att_func}")
 
+        if (vectorized and feature_value_dict is None
+            and func_name in feature_registry
+            and nxf.feature_func(func_name) is att_func):
+            values = nxf.vectorized_feature_values(
+                G,func_name,nodes,table=table)
+            if values is not None:
+                if verbose:
+                    print(f"Computed {curr_name} column-wise")
+                nxf.set_node_attribute_column(G,nodes,curr_name,values)
+                table.pop(curr_name,None)
+                continue
+
         for n in nodes:
             if feature_value_dict is not None:
                 attr_value = feature_value_dict.get(n,curr_name,default_value)
@@ -94,6 +276,7 @@ def add_node_feature(
             if verbose_loop:
                 print(f"For node {n}, {curr_name} = {attr_value}")
             G.nodes[n][curr_name] = attr_value
+        table.pop(curr_name,None)
         
     return G
 
@@ -137,17 +320,21 @@ def compartment_one_hot(node_dict,compartment):
     compartment = nu.convert_to_array_like(compartment)
     return int(node_dict["compartment"] in compartment)
 
+apical_compartments = [
+    "apical_tuft",
+    "oblique",
+    "apical_shaft",
+    "apical"]
+basal_compartments = ["basal"]
+
 def apical_label(node_dict):
     return compartment_one_hot(
         node_dict,
-        ["apical_tuft",
-        "oblique",
-        "apical_shaft",
-        "apical"])
+        apical_compartments)
 def basal_label(node_dict):
     return compartment_one_hot(
         node_dict,
-        ["basal"])
+        basal_compartments)
 
 
 
@@ -252,6 +439,407 @@ def merge_width_jump_up_dendrite_label(row_dict):
 
 
 
+# ------------- column-wise (vectorized) features -------------
+import neuron_nx_array as nxa
+
+feature_registry = dict()
+
+# bump when the feature functions change
+# (invalidates the on disk feature cache, see neuron_nx_feature_cache)
+feature_code_version = 1
+
+def register_feature(
+    name,
+    inputs = (),
+    dtype = float,
+    default_value = None,
+    func = None,
+    vectorized_func = None,
+    version = 0,
+    cache = False,
+    ):
+    """
+    Purpose: To register a node feature with
+    the attributes it is computed from
+
+    inputs: node attributes (or other registered features) the feature needs
+    dtype: the type of the feature values
+    default_value: value for nodes the feature can't be computed
+        for (None = the feature can't be computed without its inputs)
+    func: per node function (None = nxf.<name>)
+    vectorized_func: column-wise version, gets a dict mapping each of the
+        inputs to a numpy column (one row per node) and returns the values
+        of all the nodes
+    version: bump when the feature code changes (part of the feature cache key)
+    cache: if the computed columns are kept in the feature cache
+        (only worth it when computing the feature costs more
+        than hashing its inputs, see neuron_nx_feature_cache)
+
+    Ex:
+    nxf.register_feature(
+        "axon_label",
+        inputs = ["axon_compartment"],
+        dtype = int,
+        vectorized_func = lambda table: (table["axon_compartment"] == "axon").astype(int))
+    """
+    feature_registry[name] = dict(
+        inputs = tuple(inputs),
+        dtype = dtype,
+        default_value = default_value,
+        func = func,
+        vectorized_func = vectorized_func,
+        version = version,
+        cache = cache,
+    )
+
+def feature_func(name):
+    """
+    Purpose: The per node function of a feature
+    (the registered one or nxf.<name>, None if there is none)
+    """
+    func = feature_registry.get(name,dict()).get("func",None)
+    if func is None:
+        func = getattr(nxf,name,None)
+    return func
+
+def _column_from_values(values):
+    """
+    Purpose: To turn a list of node values into a column
+    (vectors are stacked into a 2D array, anything else is an object column)
+    """
+    if len(values) > 0 and all(isinstance(v,(np.ndarray,list,tuple)) for v in values):
+        try:
+            return np.stack([np.asarray(v) for v in values])
+        except ValueError:
+            pass
+    column = np.empty(len(values),dtype=object)
+    for i,v in enumerate(values):
+        column[i] = v
+    return column
+
+def node_attribute_column(G,attribute,nodes):
+    """
+    Purpose: The values of an attribute for the nodes
+    as a numpy column (raises a KeyError if a node doesn't have it)
+    """
+    if nxa.is_array_graph(G):
+        idx = G.idxs(nodes)
+        column = G.columns[attribute]
+        present = G.present.get(attribute,None)
+        if present is not None and not present[idx].all():
+            raise KeyError(attribute)
+        column = column[idx]
+        if column.dtype.kind != "O":
+            return column
+        return _column_from_values(list(column))
+    node_dicts = G.nodes
+    return _column_from_values([node_dicts[n][attribute] for n in nodes])
+
+def node_attribute_table(G,attributes,nodes=None,table=None):
+    """
+    Purpose: The node attribute table (dict of attribute to numpy column)
+    of the nodes, columns already in table are reused
+
+    Ex:
+    table = nxf.node_attribute_table(G,["skeleton_vector_upstream","compartment"])
+    table["skeleton_vector_upstream"].shape
+    """
+    if nodes is None:
+        nodes = nxu.limb_branch_nodes(G)
+    if table is None:
+        table = dict()
+    for a in attributes:
+        if a not in table:
+            table[a] = nxf.node_attribute_column(G,a,nodes)
+    return table
+
+def set_node_attribute_column(G,nodes,attribute,values):
+    """
+    Purpose: To write the values of an attribute
+    for the nodes in one pass
+    """
+    if nxa.is_array_graph(G):
+        if isinstance(values,np.ndarray) and values.ndim > 1:
+            values = values.tolist()
+        G.set_values(attribute,G.idxs(nodes),values)
+        return G
+
+    if isinstance(values,np.ndarray):
+        values = values.tolist()
+    node_dicts = G.nodes
+    for n,v in zip(nodes,values):
+        node_dicts[n][attribute] = v
+    return G
+
+def vectorized_feature_values(G,feature_name,nodes,table=None):
+    """
+    Purpose: To compute a registered feature for all
+    of the nodes at once (None if it can't be computed column-wise)
+
+    Pseudocode:
+    1) Build the columns the feature needs (reusing the table)
+    2) Apply the column-wise function
+    3) Check there is one value per node
+    """
+    entry = feature_registry.get(feature_name,None)
+    if entry is None or entry["vectorized_func"] is None:
+        return None
+    if len(nodes) == 0:
+        return np.array([])
+    try:
+        table = nxf.node_attribute_table(G,entry["inputs"],nodes,table=table)
+        values = np.asarray(entry["vectorized_func"](table),dtype=entry["dtype"])
+    except Exception:
+        return None
+    if values.shape != (len(nodes),):
+        return None
+    return values
+
+def _polar_columns(table,attribute):
+    """
+    Purpose: The (r,theta,phi) columns of a vector attribute
+    (nu.polar_3D_from_cartesian applied to every row)
+    """
+    key = ("polar",attribute)
+    if key not in table:
+        vectors = np.asarray(table[attribute],dtype=float)
+        polar = np.array([nu.polar_3D_from_cartesian(*v) for v in vectors],dtype=float)
+        table[key] = polar.reshape(len(vectors),3).T
+    return table[key]
+
+def _lookup_column(column,mapping):
+    """
+    Purpose: To map every value of a column
+    (one comparison per distinct value)
+    """
+    values = np.zeros(len(column),dtype=int)
+    for k in set(column.tolist()):
+        values[column == k] = mapping[k]
+    return values
+
+def _is_in_column(column,options):
+    return _lookup_column(column,{k:int(k in options) for k in set(column.tolist())})
+
+for _stream in ["upstream","downstream"]:
+    for _i,_axis in enumerate(["x","y","z"]):
+        register_feature(
+            f"skeleton_vector_{_stream}_{_axis}",
+            inputs = [f"skeleton_vector_{_stream}"],
+            vectorized_func = lambda table,attribute=f"skeleton_vector_{_stream}",i=_i: table[attribute][:,i])
+    for _i,_coord in [(1,"theta"),(2,"phi")]:
+        register_feature(
+            f"skeleton_vector_{_stream}_{_coord}",
+            inputs = [f"skeleton_vector_{_stream}"],
+            vectorized_func = lambda table,attribute=f"skeleton_vector_{_stream}",i=_i: _polar_columns(table,attribute)[i],
+            cache = True)
+
+register_feature(
+    "width_no_spine",
+    inputs = ["width_new"],
+    vectorized_func = lambda table: [k["no_spine_median_mesh_center"] for k in table["width_new"]])
+register_feature(
+    "axon_label",
+    inputs = ["axon_compartment"],
+    dtype = int,
+    vectorized_func = lambda table: (table["axon_compartment"] == "axon").astype(int))
+register_feature(
+    "dendrite_label",
+    inputs = ["axon_compartment"],
+    dtype = int,
+    vectorized_func = lambda table: (table["axon_compartment"] == "dendrite").astype(int))
+register_feature(
+    "compartment_proof",
+    inputs = ["compartment"],
+    dtype = int,
+    vectorized_func = lambda table: _lookup_column(table["compartment"],nxu.compartment_index_swc_map))
+register_feature(
+    "apical_label",
+    inputs = ["compartment"],
+    dtype = int,
+    vectorized_func = lambda table: _is_in_column(table["compartment"],apical_compartments))
+register_feature(
+    "basal_label",
+    inputs = ["compartment"],
+    dtype = int,
+    vectorized_func = lambda table: _is_in_column(table["compartment"],basal_compartments))
+register_feature(
+    "min_dist_synapses_pre_downstream_clip",
+    inputs = ["min_dist_synapses_pre_downstream"])
+register_feature(
+    "min_dist_synapses_pre_upstream_clip",
+    inputs = ["min_dist_synapses_pre_downstream"])
+register_feature(
+    "auto_proof_filter_label",
+    inputs = ["auto_proof_filter"],
+    dtype = int,
+    vectorized_func = lambda table: _lookup_column(
+        table["auto_proof_filter"],
+        {None:auto_proof_filter_label_map["valid"],**auto_proof_filter_label_map}))
+for _name in [
+    "merge_clean",
+    "merge_high_degree_branching_label",
+    "merge_low_degree_branching_label",
+    "merge_width_jump_up_axon_label",
+    "merge_axon_on_dendrite_label",
+    "merge_high_degree_branching_dendrite_label",
+    "merge_width_jump_up_dendrite_label",
+    "merge_double_back_dendrite_label",]:
+    register_feature(
+        _name,
+        inputs = ["auto_proof_filter"],
+        dtype = bool)
+
+
+def feature_plan(
+    G,
+    features,
+    verbose = False,
+    ):
+    """
+    Purpose: To plan how to compute the features
+    that are not on the graph yet
+
+    Pseudocode:
+    1) Skip the features already on the graph
+    2) Resolve every missing feature through the registry
+       (recursively for inputs that are registered features),
+       features with unknown names or missing inputs (and no default)
+       are unresolved
+    3) Group the features to compute into batches in dependency
+       order (a batch only needs the graph and the earlier batches)
+
+    Returns dict(present,batches,unresolved)
+    where unresolved maps each feature name to the reason
+
+    Ex:
+    nxf.feature_plan(G,nxf.features_to_output_for_gnn)
+    """
+    features = list(dict.fromkeys(nu.convert_to_array_like(features)))
+    current = set(nxf.features_list(G))
+
+    dependencies = dict()
+    unresolved = dict()
+
+    def resolve(name,stack):
+        if name in current or name in dependencies:
+            return True
+        if name in unresolved:
+            return False
+        if name in stack:
+            unresolved[name] = f"circular dependency {stack + [name]}"
+            return False
+        if name not in feature_registry:
+            unresolved[name] = "not on the graph or registered"
+            return False
+
+        entry = feature_registry[name]
+        deps = []
+        missing = []
+        for a in entry["inputs"]:
+            if a in current:
+                continue
+            if a in feature_registry and resolve(a,stack + [name]):
+                deps.append(a)
+            else:
+                missing.append(a)
+
+        if name in unresolved:
+            # part of a dependency cycle (found while resolving its inputs)
+            return False
+        if len(missing) > 0 and entry["default_value"] is None:
+            unresolved[name] = f"missing inputs {missing}"
+            return False
+        dependencies[name] = deps
+        return True
+
+    # resolved in sorted order (the order np.setdiff1d gave the missing
+    # features) so they are added to the nodes in the same order as before
+    for f in sorted(features):
+        resolve(f,[])
+
+    batches = []
+    done = set()
+    while len(done) < len(dependencies):
+        batch = [f for f,deps in dependencies.items()
+                 if f not in done and all(d in done for d in deps)]
+        batches.append(batch)
+        done.update(batch)
+
+    plan = dict(
+        present = [f for f in features if f in current],
+        batches = batches,
+        unresolved = unresolved,
+    )
+
+    if verbose:
+        print(f"Feature batches = {batches}")
+        if len(unresolved) > 0:
+            print(f"Unresolved features = {unresolved}")
+
+    return plan
+
+
+def _report_unresolved(unresolved,raise_on_unresolved = False):
+    if len(unresolved) > 0:
+        if raise_on_unresolved:
+            raise Exception(f"Unresolved features: {unresolved}")
+        warnings.warn(f"Unresolved features are skipped: {unresolved}")
+
+def _default_value_runs(batch):
+    """
+    Purpose: To split a batch into the runs of features
+    with the same default value (each run is added in one
+    add_node_feature call, in the order of the batch)
+    """
+    runs = []
+    for f in batch:
+        default_value = feature_registry[f]["default_value"]
+        if len(runs) > 0 and runs[-1][0] == default_value:
+            runs[-1][1].append(f)
+        else:
+            runs.append((default_value,[f]))
+    return runs
+
+def output_feature_order(
+    G,
+    features,
+    nodes = None,
+    raise_on_unresolved = False,
+    ):
+    """
+    Purpose: The features in the order filter_G_features leaves them
+    on the nodes (the column order of the node dataframe it is exported
+    from): the features already on the nodes in the order they were
+    added, then the missing ones in the order they are computed
+
+    Unresolved features are left out (with a warning, see
+    add_any_missing_node_features)
+
+    Ex:
+    features = nxf.output_feature_order(G,nxf.features_to_output_for_gnn)
+    nxf.feature_projection(G,features)
+    """
+    features = list(dict.fromkeys(nu.convert_to_array_like(features)))
+    wanted = set(features)
+    node_keys = nxf.node_attribute_names(G)["node_keys"]
+    if nodes is None:
+        nodes = node_keys.keys()
+
+    order = dict()
+    for n in nodes:
+        for k in node_keys.get(n,()):
+            if k in wanted:
+                order.setdefault(k,None)
+
+    plan = nxf.feature_plan(G,features)
+    nxf._report_unresolved(plan["unresolved"],raise_on_unresolved)
+    for batch in plan["batches"]:
+        for f in batch:
+            if f in wanted:
+                order.setdefault(f,None)
+    return list(order)
+
+
 def add_skeleton_vector_features(
     G,
     use_polar_coords = True,
@@ -289,31 +877,63 @@ def add_any_missing_node_features(
     features=None,
     verbose = False,
     inplace = False,
+    raise_on_unresolved = False,
+    feature_cache = None,
     #default_value = 0,
     ):
     """
     Purpose:
     1) Check that all the features are requested
     2) Generate the features that are not
+    (only the missing ones and the registered features
+    they need, in dependency order, see nxf.feature_plan)
+
+    Features that can't be computed (unknown names or
+    missing inputs) are reported with a warning before anything
+    is computed and skipped (or raise if raise_on_unresolved)
+
+    feature_cache: nxfcache.FeatureCache (or folder) the computed
+    feature columns are read from/stored in (see neuron_nx_feature_cache)
     """
     if features is None:
         features = features_to_output_for_gnn
     
-    curr_features = nxf.features_list(G)
-    features_not_computed = np.setdiff1d(features,curr_features)
+    plan = nxf.feature_plan(G,features)
+    unresolved = plan["unresolved"]
 
     if verbose:
-        print(f"features_not_computed = {features_not_computed}")
+        print(f"features_not_computed = {[f for b in plan['batches'] for f in b]}")
 
-    G_new = nxf.add_node_feature(
-        G,
-        feature_func=features_not_computed,
-        verbose = verbose,
-        inplace = inplace,
-        #default_value=default_value
-    )
+    nxf._report_unresolved(unresolved,raise_on_unresolved)
 
-    return G_new
+    if not inplace:
+        G = nxg.copy_G(G)
+
+    feature_cache = nxfcache.feature_cache(feature_cache)
+    if feature_cache is not None:
+        nodes = nxu.limb_branch_nodes(G)
+        digests = dict()
+
+    for batch in plan["batches"]:
+        if feature_cache is not None:
+            batch,keys = nxfcache.add_features_from_cache(
+                G,batch,feature_cache,nodes,digests=digests)
+            if verbose:
+                print(f"Features not in the cache = {batch}")
+
+        for default_value,names in nxf._default_value_runs(batch):
+            G = nxf.add_node_feature(
+                G,
+                feature_func=names,
+                verbose = verbose,
+                inplace = True,
+                default_value=default_value,
+            )
+
+        if feature_cache is not None:
+            nxfcache.store_features(G,batch,keys,feature_cache,nodes)
+
+    return G
 
 
 features_to_output_for_gnn_old = [
@@ -376,15 +996,138 @@ features_hierarchical = [
 features_to_output_for_gnn_hierarchical = features_to_output_for_gnn + features_hierarchical
     
 
+import neuron_nx_io as nxio
+
+def feature_projection(
+    G,
+    features,
+    nodes = None,
+    feature_matrix_dtype = "float",
+    fill_value = np.nan,
+    add_self_loops = False,
+    verbose = False,
+    ):
+    """
+    Purpose: To get the feature matrix of a graph for a list
+    of features without changing (or copying) the graph
+    (features that are not on the graph are computed straight
+    into the feature matrix instead of into the nodes)
+
+    Pseudocode:
+    1) Plan the missing features (nxf.feature_plan), unresolved ones raise
+    2) Allocate the (n_nodes x n_features) matrix in the requested dtype
+    3) Fill the columns of the features already on the nodes
+    4) Compute the missing features of the limb branch nodes batch by
+       batch (column-wise when registered, per node otherwise)
+    5) Build the edge index of the nodes
+
+    Nodes without a feature (ex: the soma) get fill_value
+
+    Returns dict(nodelist,features,feature_matrix,edge_index)
+    (the keys of nxio.adjacency_feature_info with edge_index = True)
+
+    Ex:
+    limb_info = nxf.feature_projection(
+        nxu.limb_branch_subgraph(G_limb),
+        nxf.features_to_output_for_gnn,
+    )
+    """
+    features = list(nu.convert_to_array_like(features))
+    if nodes is None:
+        nodes = list(G.nodes())
+    nodes = list(nodes)
+
+    # -- 1) planning --
+    plan = nxf.feature_plan(G,features,verbose=verbose)
+    unresolved = {f:v for f,v in plan["unresolved"].items() if f in features}
+    if len(unresolved) > 0:
+        raise Exception(f"Unresolved features: {unresolved}")
+
+    # -- 2) output buffer --
+    feature_matrix = np.empty((len(nodes),len(features)),dtype=feature_matrix_dtype)
+    feature_idx = {f:j for j,f in enumerate(features)}
+
+    def set_column(f,values,rows = None):
+        values = [fill_value if v is None else v for v in values]
+        if rows is None:
+            feature_matrix[:,feature_idx[f]] = values
+        else:
+            feature_matrix[rows,feature_idx[f]] = values
+
+    # -- 3) features on the graph --
+    node_dicts = G.nodes
+    for f in plan["present"]:
+        if nxa.is_array_graph(G):
+            set_column(f,G.column(f,fill_value=fill_value)[G.idxs(nodes)].tolist())
+        else:
+            set_column(f,[node_dicts[n].get(f,fill_value) for n in nodes])
+
+    # -- 4) missing features --
+    limb_branch = set(nxu.limb_branch_nodes(G))
+    rows = np.array([i for i,n in enumerate(nodes) if n in limb_branch],dtype=int)
+    compute_nodes = [nodes[i] for i in rows]
+    if len(rows) < len(nodes):
+        for f in features:
+            if f not in plan["present"]:
+                feature_matrix[:,feature_idx[f]] = fill_value
+
+    table = dict()
+    computed = []
+    for batch in plan["batches"]:
+        for f in batch:
+            values = nxf.vectorized_feature_values(G,f,compute_nodes,table=table)
+            if values is None:
+                entry = feature_registry[f]
+                func = nxf.feature_func(f)
+                deps = [d for d in entry["inputs"] if d in computed]
+                values = []
+                for i,n in enumerate(compute_nodes):
+                    node_dict = node_dicts[n]
+                    if len(deps) > 0:
+                        node_dict = dict(node_dict,**{d:table[d][i] for d in deps})
+                    try:
+                        values.append(func(node_dict))
+                    except:
+                        if entry["default_value"] is None:
+                            raise Exception(f"Could not compute {f} for node {n}")
+                        values.append(entry["default_value"])
+                values = nxf._column_from_values(values)
+            if verbose:
+                print(f"Computed {f}")
+            table[f] = values
+            computed.append(f)
+            if f in feature_idx:
+                set_column(f,list(values),rows)
+
+    # -- 5) connectivity --
+    edge_index = nxio.edge_index_from_G(
+        G,
+        nodelist = nodes,
+        add_self_loops = add_self_loops,
+    )
+
+    return dict(
+        nodelist = np.array(nodes),
+        features = features,
+        feature_matrix = feature_matrix,
+        edge_index = edge_index,
+    )
+
+
 def filter_G_features(
     G,
     features=None,
     inplace = False,
     verbose = False,
+    feature_cache = None,
     ):
     """
     Purpose: To reduce a networkx graph to a 
     certain number of features (and all other superflous features are deleted)
+    (nxf.feature_projection gets the feature matrix without changing the graph)
+
+    feature_cache: on disk cache of the computed features
+    (see nxf.add_any_missing_node_features)
     
     Ex: 
     axon_vs_dendrite_features = [
@@ -417,22 +1160,23 @@ def filter_G_features(
 
 
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
 
 
     G_ret = nxf.add_any_missing_node_features(
         G,
         features = features,
-        verbose = verbose
+        verbose = verbose,
+        feature_cache = feature_cache,
     )
 
     if verbose:
-        print(f"Number of features after adding missing ones = {len(xu.node_df(G_ret).columns)}")
+        print(f"Number of features after adding missing ones = {len(nxf.node_attribute_names(G_ret)['counts'])}")
 
     G_ret = xu.delete_node_attributes(G_ret,attributes_not_to_delete=features)
 
     if verbose:
-        print(f"Number of features after adding missing ones = {len(xu.node_df(G_ret).columns)}")
+        print(f"Number of features after adding missing ones = {len(nxf.node_attribute_names(G_ret)['counts'])}")
     
     return G_ret
 
@@ -440,4 +1184,5 @@ def filter_G_features(
 
 
 
+import neuron_nx_feature_cache as nxfcache
 import neuron_nx_feature_processing as nxf
\ No newline at end of file
@@ -0,0 +1,498 @@
+"""
+Purpose: networkx graph class (and node attribute dict)
+used for neuron graphs loaded from the columnar format,
+so node attributes can stay on disk until they are accessed
+
+The node attribute dict (NodeAttrDict) can hold LazyAttribute
+placeholders: the first G.nodes[n][attribute] (or .get/.items/...)
+decodes the value from the container and replaces the placeholder.
+Copies of the graph (deepcopy, subgraph().copy()) keep the
+placeholders, so filtering steps do not force the data to be loaded
+
+nxg.copy_G is the copy used by the inplace = False paths: the copy gets
+its own nodes, edges and attribute dicts but shares the attribute values
+(skeleton arrays, synapse/width lists ...) with the original until they
+are replaced, so it costs about the same as the graph structure
+instead of a deepcopy of every synapse dict
+
+nxu.load_G returns NeuronDiGraphs for every format (nxg.to_neuron_graph
+converts a plain DiGraph) and NeuronDiGraph also keeps a version number that goes up on every
+change of nodes, edges or node attributes (through the graph or its
+node dicts), so values computed from the graph can be cached and
+checked in O(1) (see nxg.graph_version and nxu.soma_distance_index)
+
+Every change is also written to a journal of (version,operation,args):
+    ("add_node",n), ("remove_node",n,children), ("add_edge",u,v),
+    ("remove_edge",u,v), ("node_attr",n,attribute (None = several)),
+    ("clear",) or ("unknown",)
+so derived indices registered with nxg.register_derived_index
+(soma distances, subtree sizes, limb partition ...) can be updated
+from the changes since they were computed instead of rebuilt
+(see nxg.derived_index)
+
+Ex:
+import neuron_nx_utils as nxu
+G = nxu.load_G(filepath,lazy_dynamic_attributes=True)
+nxg.lazy_attributes(G,"L0_0")
+G.nodes["L0_0"]["synapse_data"] #<-- only now is it decoded
+"""
+import copy
+import weakref
+
+import networkx as nx
+
+journal_max_length = 100_000
+
+
+class LazyAttribute:
+    """
+    Placeholder for a node attribute value that
+    has not been decoded from its container yet
+    """
+    __slots__ = ("loader","attribute","node")
+
+    def __init__(self,loader,attribute,node):
+        self.loader = loader
+        self.attribute = attribute
+        self.node = node
+
+    def load(self):
+        return self.loader.node_value(self.attribute,self.node)
+
+    def __deepcopy__(self,memo):
+        # placeholder is immutable, copies can share it
+        return self
+
+    def __repr__(self):
+        return f"<lazy {self.attribute}>"
+
+
+class NodeAttrDict(dict):
+    """
+    Node attribute dict that resolves LazyAttribute
+    values on first access (and bumps the version
+    of the graph that owns it when it is changed)
+    """
+    _owner = None
+    _node = None
+
+    def _changed(self,key = None):
+        if self._owner is not None:
+            self._owner._record("node_attr",self._node,key)
+
+    def __setitem__(self,key,value):
+        dict.__setitem__(self,key,value)
+        self._changed(key)
+
+    def __delitem__(self,key):
+        dict.__delitem__(self,key)
+        self._changed(key)
+
+    def clear(self):
+        dict.clear(self)
+        self._changed()
+
+    def __getitem__(self,key):
+        value = dict.__getitem__(self,key)
+        if type(value) is LazyAttribute:
+            value = value.load()
+            dict.__setitem__(self,key,value)
+        return value
+
+    def get(self,key,default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __iter__(self):
+        # defining this makes dict(d)/{**d}/plain_dict.update(d)
+        # go through __getitem__ (so placeholders never leak out)
+        return dict.__iter__(self)
+
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def pop(self,key,*default):
+        if key in self:
+            value = self[key]
+            dict.pop(self,key)
+            self._changed(key)
+            return value
+        return dict.pop(self,key,*default)
+
+    def popitem(self):
+        self.materialize()
+        item = dict.popitem(self)
+        self._changed(item[0])
+        return item
+
+    def setdefault(self,key,default=None):
+        if key in self:
+            return self[key]
+        dict.__setitem__(self,key,default)
+        self._changed(key)
+        return default
+
+    def update(self,other=(),**kwargs):
+        if isinstance(other,NodeAttrDict):
+            # keep the placeholders of the other dict
+            other = dict.items(other)
+        dict.update(self,other,**kwargs)
+        self._changed()
+
+    def copy(self):
+        new_dict = self.__class__()
+        dict.update(new_dict,dict.items(self))
+        return new_dict
+
+    __copy__ = copy
+
+    def __deepcopy__(self,memo):
+        new_dict = self.__class__()
+        if self._owner is not None:
+            # owned by the copy of the graph (if the graph is what is being copied)
+            new_dict._owner = memo.get(id(self._owner),None)
+            new_dict._node = self._node
+        for k,v in dict.items(self):
+            if type(v) is not LazyAttribute:
+                v = copy.deepcopy(v,memo)
+            dict.__setitem__(new_dict,k,v)
+        return new_dict
+
+    def __reduce__(self):
+        # pickles as a plain (fully loaded) dict
+        return (dict,(list(self.items()),))
+
+    def __eq__(self,other):
+        self.materialize()
+        if isinstance(other,NodeAttrDict):
+            other.materialize()
+        return dict.__eq__(self,other)
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def lazy_keys(self):
+        return [k for k,v in dict.items(self) if type(v) is LazyAttribute]
+
+    def is_loaded(self,key):
+        return type(dict.__getitem__(self,key)) is not LazyAttribute
+
+    def materialize(self,keys=None):
+        if keys is None:
+            keys = self.lazy_keys()
+        for k in keys:
+            if k in self:
+                self[k]
+        return self
+
+
+class _NodeDict(dict):
+    """
+    The node -> attribute dict of a NeuronDiGraph
+    (tells every NodeAttrDict the name of its node)
+    """
+    def __setitem__(self,n,node_dict):
+        if isinstance(node_dict,NodeAttrDict):
+            node_dict._node = n
+        dict.__setitem__(self,n,node_dict)
+
+
+class NeuronDiGraph(nx.DiGraph):
+    """
+    DiGraph whose node attribute dicts are NodeAttrDicts
+    and that counts (version) and journals its changes
+    """
+    _version = 0
+    _journal = None
+    _journal_start = 0
+    node_dict_factory = _NodeDict
+
+    def node_attr_dict_factory(self):
+        node_dict = NodeAttrDict()
+        node_dict._owner = self
+        return node_dict
+
+    def __setstate__(self,state):
+        # node dicts pickle as plain dicts, owned NodeAttrDicts are put back
+        # (in place, the cached node views point to this dict)
+        self.__dict__.update(state)
+        for n,d in list(self._node.items()):
+            if not isinstance(d,NodeAttrDict):
+                node_dict = self.node_attr_dict_factory()
+                dict.update(node_dict,d)
+                self._node[n] = node_dict
+
+    @property
+    def version(self):
+        return self._version
+
+    def _record(self,operation,*args):
+        """
+        Purpose: To bump the version and journal the change
+        (the journal entry i is the change to version _journal_start + i + 1)
+        """
+        self._version = self._version + 1
+        if self._journal is None:
+            self._journal = []
+        self._journal.append((self._version,operation,args))
+        if len(self._journal) > journal_max_length:
+            n_drop = len(self._journal) // 2
+            self._journal_start = self._journal[n_drop - 1][0]
+            del self._journal[:n_drop]
+
+    def _bump_version(self):
+        self._record("unknown")
+
+    def journal_since(self,version):
+        """
+        Purpose: The journal entries after a version
+        (None if they are not kept anymore)
+        """
+        if version < self._journal_start or version > self._version:
+            return None
+        if self._journal is None:
+            return []
+        return self._journal[version - self._journal_start:]
+
+    def add_node(self,node_for_adding,**attr):
+        new_node = node_for_adding not in self._node
+        super().add_node(node_for_adding,**attr)
+        if new_node:
+            self._record("add_node",node_for_adding)
+
+    def remove_node(self,n):
+        children = list(self._succ[n]) if n in self._succ else []
+        super().remove_node(n)
+        self._record("remove_node",n,children)
+
+    def remove_nodes_from(self,nodes):
+        nodes = list(nodes)
+        children = {n:list(self._succ[n]) for n in nodes if n in self._succ}
+        super().remove_nodes_from(nodes)
+        for n in nodes:
+            if n in children:
+                self._record("remove_node",n,children.pop(n))
+
+    def _record_new_nodes(self,nodes,existing):
+        for n in nodes:
+            if n not in existing:
+                existing.add(n)
+                self._record("add_node",n)
+
+    def add_edge(self,u_of_edge,v_of_edge,**attr):
+        new_nodes = [n for n in (u_of_edge,v_of_edge) if n not in self._node]
+        super().add_edge(u_of_edge,v_of_edge,**attr)
+        self._record_new_nodes(new_nodes,set())
+        self._record("add_edge",u_of_edge,v_of_edge)
+
+    def add_edges_from(self,ebunch_to_add,**attr):
+        ebunch_to_add = list(ebunch_to_add)
+        existing = set([n for e in ebunch_to_add for n in e[:2] if n in self._node])
+        super().add_edges_from(ebunch_to_add,**attr)
+        for e in ebunch_to_add:
+            self._record_new_nodes(e[:2],existing)
+            self._record("add_edge",e[0],e[1])
+
+    def remove_edge(self,u,v):
+        super().remove_edge(u,v)
+        self._record("remove_edge",u,v)
+
+    def remove_edges_from(self,ebunch):
+        ebunch = [e[:2] for e in ebunch]
+        removed = [(u,v) for u,v in ebunch if self.has_edge(u,v)]
+        super().remove_edges_from(ebunch)
+        for u,v in dict.fromkeys(removed):
+            self._record("remove_edge",u,v)
+
+    def clear(self):
+        super().clear()
+        self._record("clear")
+
+    def clear_edges(self):
+        super().clear_edges()
+        self._record("clear")
+
+    def add_nodes_from(self,nodes_for_adding,**attr):
+        # networkx merges the node dicts through a plain dict, which
+        # would load every placeholder, so NodeAttrDicts are merged here
+        attr_dicts = []
+        new_nodes = []
+
+        def node_names():
+            for n in nodes_for_adding:
+                if (isinstance(n,tuple) and len(n) == 2
+                    and isinstance(n[1],NodeAttrDict)):
+                    attr_dicts.append(n)
+                    name = n[0]
+                    n = name
+                else:
+                    # (node,attribute dict) tuples are not hashable (like in networkx)
+                    try:
+                        name = n
+                        hash(name)
+                    except TypeError:
+                        name = n[0]
+                if name not in self._node:
+                    new_nodes.append(name)
+                yield n
+
+        super().add_nodes_from(node_names(),**attr)
+        self._record_new_nodes(new_nodes,set())
+        for n,d in attr_dicts:
+            self._node[n].update(d)
+
+
+def copy_G(G):
+    """
+    Purpose: Copy on write copy of a neuron graph
+    (see module docstring): new structure and node/edge
+    attribute dicts, attribute values shared with G
+
+    Functions changing the copy have to assign new values
+    (G.nodes[n][attribute] = new_value) and not change
+    a shared value in place (ex: appending to a shared list)
+
+    Ex:
+    G_copy = nxg.copy_G(G)
+    G_copy.nodes["L0_0"]["skeletal_length"] = 0 #<-- G not changed
+    """
+    return G.copy()
+
+def to_neuron_graph(G):
+    """
+    Purpose: To get a NeuronDiGraph with the nodes, edges and
+    attributes of a plain networkx DiGraph (attribute values are
+    shared like with copy_G), so the version checked caches
+    (derived indices, attribute schema) are kept between calls
+
+    NeuronDiGraphs and anything that is not a plain DiGraph
+    (undirected graphs, subgraph views, nxa.NeuronGraph) are returned as is
+
+    Ex:
+    G = nxg.to_neuron_graph(su.decompress_pickle(filepath))
+    """
+    if type(G) is not nx.DiGraph or hasattr(G,"_graph"):
+        return G
+    G_neuron = NeuronDiGraph()
+    G_neuron.graph.update(G.graph)
+    G_neuron.add_nodes_from(G.nodes(data=True))
+    G_neuron.add_edges_from(G.edges(data=True))
+    return G_neuron
+
+_derived_index_functions = dict()
+_derived_index_cache = weakref.WeakKeyDictionary()
+
+def register_derived_index(name,build_func,update_func = None):
+    """
+    Purpose: To register a value computed from a graph
+    so nxg.derived_index can cache it and keep it up to date
+
+    build_func(G,*args) --> index
+    update_func(G,index,entries,*args) --> the index updated for the
+    journal entries (changed in place or a new object), or None
+    if it has to be rebuilt
+
+    Ex: nxg.register_derived_index("soma_distance",_soma_distance_build,_soma_distance_update)
+    """
+    _derived_index_functions[name] = (build_func,update_func)
+
+def derived_index(G,name,*args):
+    """
+    Purpose: To get a registered derived index of the graph
+
+    Pseudocode: 
+    1) Graphs that do not journal changes: build it
+    2) Cached at the current version: return it
+    3) Cached at an older version: update it from the journal
+       entries since then (if it has an update function)
+    4) Otherwise build and cache it
+
+    Updated indices can be changed in place, so an index
+    should be asked for again after the graph changes
+
+    Ex: nxg.derived_index(G,"soma_distance","skeletal_length","S0")
+    """
+    build_func,update_func = _derived_index_functions[name]
+    version = nxg.graph_version(G)
+    if version is None:
+        return build_func(G,*args)
+
+    cache = _derived_index_cache.setdefault(G,dict())
+    key = (name,) + tuple(args)
+    if key in cache:
+        index_version,index = cache[key]
+        if index_version == version:
+            return index
+        entries = G.journal_since(index_version)
+        if update_func is not None and entries is not None:
+            index = update_func(G,index,entries,*args)
+            if index is not None:
+                cache[key] = (G.version,index)
+                return index
+
+    index = build_func(G,*args)
+    cache[key] = (G.version,index)
+    return index
+
+def keep_if_attributes_unchanged(index,entries,attributes):
+    """
+    Purpose: Update function for derived indices that only
+    depend on the structure and some node attributes: the index is kept
+    if only other attributes changed (None = rebuild otherwise)
+    """
+    for _,operation,args in entries:
+        if operation != "node_attr" or args[1] is None or args[1] in attributes:
+            return None
+    return index
+
+def graph_version(G):
+    """
+    Purpose: The version number of a NeuronDiGraph
+    (None for graphs that do not track their changes,
+    and for subgraph views whose graph can change under them)
+    """
+    if isinstance(G,NeuronDiGraph) and not hasattr(G,"_graph"):
+        return G.version
+    return None
+
+def lazy_attributes(G,n):
+    """
+    Purpose: Names of the attributes of a node
+    that have not been loaded yet
+    """
+    node_dict = G.nodes[n]
+    if not isinstance(node_dict,NodeAttrDict):
+        return []
+    return node_dict.lazy_keys()
+
+def materialize_attributes(
+    G,
+    attributes=None,
+    nodes = None,
+    verbose = False,
+    ):
+    """
+    Purpose: To load (from disk) any lazy
+    attributes of the requested nodes
+    """
+    if nodes is None:
+        nodes = list(G.nodes())
+
+    for n in nodes:
+        node_dict = G.nodes[n]
+        if isinstance(node_dict,NodeAttrDict):
+            if verbose:
+                print(f"Loading {node_dict.lazy_keys()} for node {n}")
+            node_dict.materialize(attributes)
+    return G
+
+
+import neuron_nx_graph as nxg
@@ -7,6 +7,10 @@ import networkx_utils as xu
 from pathlib import Path
 import numpy as np
 import time
+import neuron_nx_archive as nxar
+import neuron_nx_codecs as nxcodec
+import neuron_nx_graph as nxg
+@nxar.opens_archive
 def export_GNN_info_dict(
     G,
     features_to_output,
@@ -31,11 +35,37 @@ def export_GNN_info_dict(
     return_filepaths = False,
     return_G_before_output = False,
     
+    archive = None,
+    codec = None,
+    edge_index = False,
+    feature_cache = None,
     
     ):
     """
     To process a neuron object before output
     in dictionary format to be used by a GNN
+    
+    archive: neuron archive (or archive filepath) where the output dicts
+    of the neuron are appended as one entry (instead of one file per output),
+    when return_filepaths the archive filepath is returned for each output.
+    An archive filepath is opened (and closed) by this call, only one process
+    can append to an archive at a time (export_GNN_info_batch appends
+    from the parent process)
+    
+    codec: compression codec of the output files/archive entry 
+    (see neuron_nx_codecs), None keeps the bz2 .pbz2 files
+    
+    edge_index: if True the graph is output as an int32 COO "edge_index"
+    (n_edges x 2, both directions) built from the edges of the tree
+    instead of a dense n x n "adjacency" matrix
+
+    feature_cache: on disk cache of the computed features (FeatureCache
+    or folder, see neuron_nx_feature_cache) so re-exports with other
+    labels/thresholds reuse the feature columns of earlier runs
+    
+    Ex: 
+    with nxar.NeuronArchive("./Axon_vs_Dendrite",mode="a") as ar:
+        nxio.export_GNN_info_dict(G,features_to_output,archive = ar)
     """
     print(f"return_filepaths =- {return_filepaths}")
     
@@ -50,6 +80,9 @@ def export_GNN_info_dict(
             print(f"*** Warning graph_label is None")
     
     
+    # versioned graph so the indices and attribute schema are reused
+    G = nxg.to_neuron_graph(G)
+
     G_dict = xu.graph_attr_dict(G)
     
     if verbose:
@@ -60,9 +93,8 @@ def export_GNN_info_dict(
     if description is not None:
         filename += f"_{description}"
         
-        
-        
     filepaths = []
+    output_dicts = []
 
     # ----------- Does a lot of the preprocessing before outputting----------
     if axon_dendrite is not None:
@@ -105,20 +137,43 @@ def export_GNN_info_dict(
         )
         
 
-    if len(nxu.limb_branch_subgraph(G_dist_filt).nodes()) > 0:
-        G_with_feats = nxf.filter_G_features(
-                    G_dist_filt,
-                    features=features_to_output,
-                    inplace = False,
-                    verbose = verbose,
-                )
-    else:
-        G_with_feats = G_dist_filt
-    
+    limb_branch_nodes = nxu.limb_branch_nodes(G_dist_filt)
+
     if return_G_before_output:
+        if len(limb_branch_nodes) > 0:
+            G_with_feats = nxf.filter_G_features(
+                        G_dist_filt,
+                        features=features_to_output,
+                        inplace = False,
+                        verbose = verbose,
+                        feature_cache = feature_cache,
+                    )
+        else:
+            G_with_feats = G_dist_filt
         if divide_into_limbs:
             G_with_feats = nxu.limb_graphs_from_soma_connected_nodes(G_with_feats)
         return G_with_feats
+
+    # the feature matrix of all the branches at once (the graph is not
+    # copied or changed), the outputs take the rows of their nodes
+    G_with_feats = G_dist_filt
+    if len(limb_branch_nodes) > 0:
+        if feature_cache is not None:
+            # computed (or read from the cache) before the distance
+            # thresholds so exports with other thresholds get the same entries
+            G_filt_feats = nxf.add_any_missing_node_features(
+                G_filt,
+                features = features_to_output,
+                verbose = verbose,
+                feature_cache = feature_cache,
+            )
+            G_with_feats = nxg.copy_G(G_filt_feats.subgraph(list(G_dist_filt.nodes())))
+        projection = nxf.feature_projection(
+            G_with_feats,
+            nxf.output_feature_order(G_dist_filt,features_to_output),
+            nodes = limb_branch_nodes,
+            verbose = verbose,
+        )
     # ----------- Dividing up and outputting the files -----------
     if divide_into_limbs:
 #         print(f"G_with_feats.nodes() = {G_with_feats.nodes()}")
@@ -133,17 +188,16 @@ def export_GNN_info_dict(
                 print(f"Outputing limb {j}---")
 
 
-            most_starting_branch = xu.most_upstream_node(G_limb)
+            most_starting_branch = nxu.most_upstream_node(G_limb)
             #converting to non-directional
             G_limb = nx.Graph(G_limb)
 
             G_limb = nxu.limb_branch_subgraph(G_limb)
-            limb_info = xu.adjacency_feature_info(
+            limb_info = nxio.adjacency_feature_info_from_projection(
                 G = G_limb,
-                return_df_for_feature_matrix = False,
+                projection = projection,
                 feature_matrix_dtype = feature_matrix_dtype,
-                dense_adjacency=True
-
+                edge_index = edge_index,
             )
 
             limb_info["label_name"] = label_name
@@ -152,8 +206,17 @@ def export_GNN_info_dict(
             curr_filename = f"{filename}_limb_{j}_starting_branch_{most_starting_branch}"
 
             output_path = str((Path(folder)/Path(curr_filename)).absolute())
+            output_dicts.append(limb_info)
 
-            if return_filepaths:
+            if return_filepaths and archive is not None:
+                ret_filepath = archive.filepath
+            elif return_filepaths and codec is not None:
+                ret_filepath = nxcodec.dump_pickle(
+                    limb_info,
+                    output_path,
+                    codec = codec,
+                    verbose = verbose)
+            elif return_filepaths:
                 ret_filepath = su.compressed_pickle(
                     limb_info,
                     output_path,
@@ -176,12 +239,11 @@ def export_GNN_info_dict(
         G_no_soma = nx.Graph(G_no_soma)
 
         if len(G_no_soma.nodes()) > 0:
-            G_info = xu.adjacency_feature_info(
+            G_info = nxio.adjacency_feature_info_from_projection(
                     G = G_no_soma,
-                    return_df_for_feature_matrix = False,
+                    projection = projection,
                     feature_matrix_dtype = "float",
-                    dense_adjacency=True
-
+                    edge_index = edge_index,
                 )
 
             G_info["label_name"] = label_name
@@ -189,8 +251,17 @@ def export_GNN_info_dict(
 
             curr_filename = f"{filename}"
             output_path = str((Path(folder)/Path(curr_filename)).absolute())
+            output_dicts.append(G_info)
 
-            if return_filepaths:
+            if return_filepaths and archive is not None:
+                ret_filepath = archive.filepath
+            elif return_filepaths and codec is not None:
+                ret_filepath = nxcodec.dump_pickle(
+                    G_info,
+                    output_path,
+                    codec = codec,
+                    verbose = verbose)
+            elif return_filepaths:
                 ret_filepath = su.compressed_pickle(
                         G_info,
                         output_path,
@@ -200,6 +271,13 @@ def export_GNN_info_dict(
                 ret_filepath = G_info
 
             filepaths.append(ret_filepath)
+        
+    if archive is not None:
+        archive.append(
+            output_dicts,
+            key = nxar.normalize_key(G_dict),
+            file_format = "pickle",
+            codec = codec)
 
     if verbose:
         print(f"\n\n---Total time = {time.time() - st}")
@@ -265,6 +343,20 @@ def feature_df_from_adj_feature_dict(adj_feature_dict):
         
     return df
 
+def edge_list_from_adj_feature_dict(adj_feature_dict):
+    """
+    Purpose: To get the (n_edges x 2) node index
+    pairs of an exported graph dict, from its "edge_index"
+    or else from the nonzero entries of its "adjacency"
+    """
+    if "edge_index" in adj_feature_dict:
+        return np.asarray(adj_feature_dict["edge_index"]).reshape(-1,2)
+    adjacency = adj_feature_dict["adjacency"]
+    if hasattr(adjacency,"tocoo"):
+        adjacency = adjacency.tocoo()
+        return np.vstack([adjacency.row,adjacency.col]).T
+    return np.argwhere(np.asarray(adjacency))
+
 def G_from_adj_feature_dict(
     adj_feature_dict=None,
     filepath = None,
@@ -275,6 +367,13 @@ def G_from_adj_feature_dict(
     Purpose: To recover the original graph
     stored in the adjacency dict information
     
+    Pseudocode:
+    1) Get the edges as node index pairs (edge_index or
+       the nonzero entries of the adjacency)
+    2) Build the node attribute dicts from the feature
+       matrix columns in one pass
+    3) Add all nodes and edges in bulk (no plotting unless plot = True)
+    
     Ex: 
     import neuron_nx_io as nxio
     G_rec = nxio.G_from_adj_feature_dict(
@@ -287,23 +386,65 @@ def G_from_adj_feature_dict(
     if adj_feature_dict is None:
         if verbose:
             print(f"Reading from {filepath}")
-        adj_feature_dict = su.decompress_pickle(filepath)
+        adj_feature_dict = nxcodec.load_pickle(filepath)
 
-    df = nxio.feature_df_from_adj_feature_dict(adj_feature_dict)
+    nodelist = list(adj_feature_dict["nodelist"])
+    if isinstance(adj_feature_dict["feature_matrix"],pd.DataFrame):
+        node_dicts = adj_feature_dict["feature_matrix"].to_dict(orient="records")
+    else:
+        features = list(adj_feature_dict["features"])
+        node_dicts = [dict(zip(features,row)) for row in
+                      np.asarray(adj_feature_dict["feature_matrix"]).tolist()]
         
+    G = nx.Graph()
+    G.add_nodes_from(zip(nodelist,node_dicts))
+    edges = nxio.edge_list_from_adj_feature_dict(adj_feature_dict).tolist()
+    G.add_edges_from([(nodelist[u],nodelist[v]) for u,v in edges])
     
-    G = xu.G_from_adjacency_matrix(
-    matrix = adj_feature_dict["adjacency"],
-    nodelist = adj_feature_dict["nodelist"],
-    plot = True,
-    )
-    
-    G = xu.set_node_attributes_from_df(G,df,index_name="node")
+    if plot:
+        nx.draw(G,with_labels = True)
     
     if verbose:
         print("label_name,graph_label = ",(adj_feature_dict["label_name"],adj_feature_dict["graph_label"]))
     return G
 
+def _G_from_adj_feature_dict_job(job):
+    source,key = job
+    if key is None:
+        obj = nxcodec.load_pickle(source)
+    else:
+        with nxar.NeuronArchive(source) as ar:
+            obj = ar.get(key)
+    if isinstance(obj,(list,tuple)):
+        return [nxio.G_from_adj_feature_dict(k) for k in obj]
+    return nxio.G_from_adj_feature_dict(obj)
+
+def G_from_adj_feature_dict_batch(
+    sources,
+    n_workers = None,
+    chunksize = 1,
+    verbose = False,
+    ):
+    """
+    Purpose: To rebuild the graphs of many exported
+    files (ex: for a QA sweep) in a process pool
+
+    sources: glob string, list of exported files or
+    a neuron archive (each entry gives a list of graphs)
+
+    Returns: list of graphs (or lists of graphs) in the order of the sources
+
+    Ex:
+    Gs = nxio.G_from_adj_feature_dict_batch("./Axon_vs_Dendrite/*.pbz2",n_workers = 8)
+    """
+    jobs = nxio._batch_sources(sources)
+    if verbose:
+        print(f"Rebuilding graphs of {len(jobs)} exports")
+    if n_workers is not None and n_workers <= 1:
+        return [nxio._G_from_adj_feature_dict_job(k) for k in jobs]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(nxio._G_from_adj_feature_dict_job,jobs,chunksize=chunksize))
+
 
 
 # ----------------- exporting different types of graph attributes for GNNs -----------
@@ -434,7 +575,7 @@ def GNN_info_compartment_proof(
     verbose = verbose,
         
     return_filepaths = return_filepaths,
-    
+    **kwargs
     )
     
     return filepaths
@@ -514,7 +655,8 @@ def GNN_info_merge_errors(
         verbose = verbose,
 
         axon_dendrite = axon_dendrite,
-        return_filepaths = return_filepaths
+        return_filepaths = return_filepaths,
+        **kwargs
         )
     
     return filepaths
@@ -590,7 +732,384 @@ def GNN_info_cell_type_fine(
     return filepaths
 
 
+# ------------ Batch exporting of a corpus of neurons -------------
+import collections
+import concurrent.futures
+import glob
+import json
+import os
+import traceback
+
+manifest_filename_default = "export_manifest.jsonl"
+
+def _batch_sources(sources):
+    """
+    Purpose: To turn the batch input into a list of jobs
+    (source filepath, archive key)
+
+    sources can be:
+    - a glob string (ex: "./graphs/*.pbz2")
+    - a list of filepaths
+    - a neuron archive (or archive filepath): one job per entry
+    """
+    if nxar.is_archive(sources):
+        if isinstance(sources,nxar.NeuronArchive):
+            archive_path = sources.filepath
+            keys = sources.keys()
+        else:
+            archive_path = nxar.archive_filepath(sources)
+            with nxar.NeuronArchive(archive_path) as ar:
+                keys = ar.keys()
+        return [(archive_path,tuple(k)) for k in keys]
+
+    if isinstance(sources,(str,Path)):
+        sources = sorted(glob.glob(str(sources)))
+    return [(str(s),None) for s in sources]
+
+def _job_name(source,key):
+    if key is None:
+        return source
+    return f"{source}:{'_'.join([str(k) for k in key])}"
+
+def read_export_manifest(manifest_filepath):
+    """
+    Purpose: To read the json lines manifest of a batch export
+    (a partially written last line from a crash is ignored)
+
+    Returns: list of records
+    """
+    records = []
+    if not Path(manifest_filepath).exists():
+        return records
+    with open(manifest_filepath,"r") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def export_manifest_df(manifest_filepath):
+    """
+    Purpose: To view the manifest of a batch export
+    as a dataframe (latest record per neuron)
+    """
+    df = pd.DataFrame.from_records(nxio.read_export_manifest(manifest_filepath))
+    if len(df) > 0:
+        df = df.drop_duplicates(subset=["name"],keep="last").reset_index(drop=True)
+    return df
+
+def _append_manifest_record(f,record):
+    f.write(json.dumps(record,default=str) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def _job_record(job,error = None):
+    """
+    Purpose: The manifest record of an export job
+    (a failed one if error is given)
+    """
+    source,key = job[:2]
+    record = dict(
+        name = nxio._job_name(source,key),
+        source = source,
+        key = key,
+        pid = os.getpid(),
+    )
+    if error is not None:
+        record["status"] = "failed"
+        record["error"] = f"{type(error).__name__}: {error}"
+        record["traceback"] = "".join(traceback.format_exception(type(error),error,error.__traceback__))
+        record["time"] = None
+    return record
+
+def _export_GNN_info_job(job):
+    """
+    Purpose: Worker for export_GNN_info_batch, exports one neuron
+    and returns its manifest record (errors are recorded, not raised)
+    """
+    source,key,export_func,export_kwargs,load_kwargs,return_outputs = job
+    st = time.time()
+    record = nxio._job_record(job)
+    outputs = None
+    try:
+        if key is None:
+            G = nxu.load_G(source,**load_kwargs)
+        else:
+            with nxar.NeuronArchive(source) as ar:
+                G = ar.get(key,**load_kwargs)
+        if isinstance(export_func,str):
+            export_func = getattr(nxio,export_func)
+
+        if return_outputs:
+            # outputs go back to the parent process (ex: to be put in an archive)
+            outputs = export_func(G,return_filepaths = False,**export_kwargs)
+            record["key"] = nxar.normalize_key(xu.graph_attr_dict(G))
+            record["n_outputs"] = len(outputs)
+        else:
+            filepaths = export_func(G,return_filepaths = True,**export_kwargs)
+            record["outputs"] = [str(k) for k in filepaths]
+            record["n_outputs"] = len(filepaths)
+        record["status"] = "success"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+        record["traceback"] = traceback.format_exc()
+
+    record["time"] = time.time() - st
+    return record,outputs
+
+def _export_GNN_info_chunk(jobs):
+    """
+    Purpose: Worker for export_GNN_info_batch, exports a
+    chunk of neurons (returns the (record,outputs) of each)
+    """
+    return [nxio._export_GNN_info_job(job) for job in jobs]
+
+def export_GNN_info_batch(
+    sources,
+    export_func = "GNN_info_axon_vs_dendrite",
+    manifest_filepath = None,
+    folder = None,
+    n_workers = None,
+    chunksize = 1,
+    retry_failed = True,
+    archive = None,
+    load_kwargs = None,
+    verbose = False,
+    **kwargs
+    ):
+    """
+    Purpose: To run a GNN export (export_GNN_info_dict or
+    any GNN_info_* wrapper) over a corpus of neurons in a process pool,
+    recording every neuron in a manifest so an interrupted run can resume
+
+    Pseudocode:
+    1) Build the list of jobs from the glob/list of graph files/archive
+    2) Read the manifest and skip neurons already exported
+       (and the failed ones when retry_failed = False)
+    3) Run the remaining jobs in a process pool (n_workers),
+       each one loads its graph and calls the export function
+    4) As each neuron finishes (in any order) append a record to the manifest:
+       name, source, key, status (success/failed), error, time, outputs
+       (a job whose worker died is recorded as failed)
+
+    export_func: name of a function in this module or a picklable callable
+    n_workers: None = all cpus, 0/1 = run in this process
+    chunksize: number of neurons sent to a worker at once
+    (the records of a chunk are written when the whole chunk finishes)
+    archive: neuron archive (or filepath) where the output dicts are appended,
+    only the parent process writes to it (workers send back their outputs)
+    kwargs: passed to the export function
+
+    Ex:
+    manifest_df = nxio.export_GNN_info_batch(
+        "./proofread_graphs/*.pbz2",
+        export_func = "GNN_info_compartment_proof",
+        folder = "./Compartments_Proof/",
+        n_workers = 16,
+        codec = "zstd",
+    )
+    """
+    st = time.time()
+    if load_kwargs is None:
+        load_kwargs = dict()
+    kwargs.pop("return_filepaths",None)
+
+    if folder is not None:
+        Path(folder).mkdir(parents=True,exist_ok=True)
+        kwargs["folder"] = folder
+
+    if manifest_filepath is None:
+        manifest_filepath = Path(folder if folder is not None else "./") / manifest_filename_default
+    manifest_filepath = str(manifest_filepath)
+
+    if archive is not None and not isinstance(archive,nxar.NeuronArchive):
+        archive = nxar.NeuronArchive(archive,mode="a")
+
+    # -- 1) and 2) jobs not already in the manifest --
+    done_status = dict()
+    for r in nxio.read_export_manifest(manifest_filepath):
+        done_status[r["name"]] = r["status"]
+
+    skip_status = ["success"]
+    if not retry_failed:
+        skip_status.append("failed")
+
+    jobs = []
+    n_skipped = 0
+    for source,key in nxio._batch_sources(sources):
+        if done_status.get(nxio._job_name(source,key),None) in skip_status:
+            n_skipped += 1
+            continue
+        jobs.append((source,key,export_func,kwargs,load_kwargs,archive is not None))
+
+    if verbose:
+        print(f"{len(jobs)} neurons to export ({n_skipped} already in manifest {manifest_filepath})")
+
+    # -- 3) and 4) running the jobs --
+    def record_result(f,record,outputs):
+        if record["status"] == "success" and archive is not None:
+            archive.append(
+                outputs,
+                key = record["key"],
+                file_format = "pickle",
+                codec = kwargs.get("codec",None))
+            record["outputs"] = [archive.filepath]
+        nxio._append_manifest_record(f,record)
+        if verbose:
+            print(f"{record['name']}: {record['status']} ({record['time'] or 0:.2f} s)")
+
+    with open(manifest_filepath,"a") as f:
+        if n_workers is not None and n_workers <= 1:
+            for job in jobs:
+                record_result(f,*nxio._export_GNN_info_job(job))
+        elif len(jobs) > 0:
+            chunksize = max(chunksize,1)
+            chunks = [jobs[i:i+chunksize] for i in range(0,len(jobs),chunksize)]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = {executor.submit(nxio._export_GNN_info_chunk,chunk):chunk for chunk in chunks}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # ex: BrokenProcessPool when a worker dies
+                        results = [(nxio._job_record(job,error=e),None) for job in futures[future]]
+                    for record,outputs in results:
+                        record_result(f,record,outputs)
+
+    if verbose:
+        print(f"Total time for batch export = {time.time() - st}")
+
+    return nxio.export_manifest_df(manifest_filepath)
+
+
 # ------------ For the simplified version of Gnn CODE -------------
+def edge_index_from_G(
+    G,
+    nodelist = None,
+    undirected = True,
+    add_self_loops = False,
+    dtype = "int32",
+    ):
+    """
+    Purpose: To get the COO edge index (n_edges x 2) of
+    a graph straight from its edges (the parent -> child
+    relationships of the tree), without any adjacency matrix
+
+    Pseudocode:
+    1) Map the node names to their index in nodelist
+    2) Convert the edges (and their reverse if undirected) to indices
+    3) Sort the rows by (row,col) and remove duplicates,
+       which is the order the edges are read off a dense adjacency matrix
+
+    Ex:
+    edge_index = nxio.edge_index_from_G(G_limb,nodelist = limb_info["nodelist"])
+    """
+    if nodelist is None:
+        nodelist = list(G.nodes())
+    node_to_idx = {n:i for i,n in enumerate(nodelist)}
+
+    edges = [(node_to_idx[u],node_to_idx[v]) for u,v in G.edges()
+             if u in node_to_idx and v in node_to_idx]
+    edge_index = np.array(edges,dtype=dtype).reshape(-1,2)
+
+    if undirected:
+        edge_index = np.vstack([edge_index,edge_index[:,::-1]])
+
+    if add_self_loops:
+        edge_index = nxio.edge_index_with_self_loops(edge_index,len(nodelist))
+
+    if len(edge_index) > 0:
+        edge_index = np.unique(edge_index,axis=0)
+
+    return edge_index
+
+def edge_index_with_self_loops(edge_index,n_nodes):
+    """
+    Purpose: To add a (i,i) edge for every node to a
+    COO edge index (keeping the rows sorted by (row,col))
+    """
+    edge_index = np.asarray(edge_index).reshape(-1,2)
+    self_loops = np.repeat(np.arange(n_nodes,dtype=edge_index.dtype),2).reshape(-1,2)
+    return np.unique(np.vstack([edge_index,self_loops]),axis=0)
+
+def edge_index_from_graph_data(data,add_self_loops = False):
+    """
+    Purpose: To get the edge index of a graph data dict
+    whether it was exported with an "edge_index" or a dense "adjacency"
+    """
+    if "edge_index" in data:
+        edge_index = data["edge_index"]
+        if add_self_loops:
+            edge_index = nxio.edge_index_with_self_loops(edge_index,len(data["nodelist"]))
+        return edge_index
+    return nu.edge_list_from_adjacency_matrix(
+        data["adjacency"],
+        add_self_loops=add_self_loops)
+
+def adjacency_feature_info(
+    G,
+    features = None,
+    feature_matrix_dtype = "float",
+    dense_adjacency = True,
+    edge_index = False,
+    ):
+    """
+    Purpose: To get the nodelist/features/feature_matrix of a
+    graph along with its connectivity as either a dense "adjacency"
+    or (edge_index = True) a COO "edge_index" built from the edges
+    """
+    info = xu.adjacency_feature_info(
+        G,
+        return_df_for_feature_matrix = False,
+        feature_matrix_dtype = feature_matrix_dtype,
+        dense_adjacency= dense_adjacency and not edge_index,
+        features=features
+    )
+    if edge_index:
+        info.pop("adjacency",None)
+        info["edge_index"] = nxio.edge_index_from_G(
+            G,
+            nodelist = info["nodelist"],
+        )
+    return info
+
+def adjacency_feature_info_from_projection(
+    G,
+    projection,
+    feature_matrix_dtype = "float",
+    dense_adjacency = True,
+    edge_index = False,
+    ):
+    """
+    Purpose: adjacency_feature_info of a graph whose nodes have rows
+    in a feature projection of a bigger graph (nxf.feature_projection),
+    the rows are taken instead of reading the node features again
+
+    Ex:
+    projection = nxf.feature_projection(G,features,nodes = nxu.limb_branch_nodes(G))
+    limb_info = nxio.adjacency_feature_info_from_projection(G_limb,projection)
+    """
+    nodelist = list(G.nodes())
+    node_rows = {n:i for i,n in enumerate(projection["nodelist"].tolist())}
+    rows = np.array([node_rows[n] for n in nodelist],dtype=int)
+
+    info = dict(
+        nodelist = np.array(nodelist),
+        features = list(projection["features"]),
+        feature_matrix = projection["feature_matrix"][rows].astype(feature_matrix_dtype),
+    )
+    if edge_index:
+        info["edge_index"] = nxio.edge_index_from_G(G,nodelist = nodelist)
+    elif dense_adjacency:
+        # int like xu.adjacency_feature_info (a dense scipy adjacency matrix)
+        info["adjacency"] = nx.to_numpy_array(G,nodelist = nodelist,dtype = "int")
+    return info
+
 def compressed_dict_from_G(
     G,
     features = None,
@@ -600,23 +1119,23 @@ def compressed_dict_from_G(
         "nucleus_id",
         "external_layer"),
     dense_adjacency = True,
-    data_name = "data"
+    data_name = "data",
+    edge_index = False,
     ):
     
     g_atts = xu.graph_attr_dict(G)
     curr_dict = {k:g_atts[k] for k in graph_identifiers}
-    curr_dict[data_name] = xu.adjacency_feature_info(
+    curr_dict[data_name] = nxio.adjacency_feature_info(
         G,
-        return_df_for_feature_matrix = False,
         feature_matrix_dtype = "float",
         dense_adjacency=dense_adjacency,
-        features=features
+        features=features,
+        edge_index = edge_index,
     )
     
     return curr_dict
 
 import numpy_utils as nu
-import copy
 def combine_limb_graph_data(
     graph_data,
     limb_idx,
@@ -627,77 +1146,79 @@ def combine_limb_graph_data(
     max_limbs = 25,
     limb_attributes_to_add = None,
     ):
-
-    all_graph_data = copy.deepcopy(graph_data)
-
-    n_nodes = np.sum([len(k["data"]["nodelist"]) for k in all_graph_data ])
+    """
+    Purpose: To combine the graph data of the limbs
+    of a neuron into one graph data (block diagonal
+    adjacency/concatenated edge index) and the cluster
+    assignment of each node to its limb
+
+    Pseudocode:
+    1) Get the node offset of every limb from the node counts
+    2) Stack the feature matrices (and the limb attributes
+       repeated for the nodes of each limb) in one call
+    3) Put each limb adjacency in its diagonal block
+       (or shift each limb edge index by its node offset)
+    4) Build the cluster assignment vector from the node counts
+
+    The limb graph data is not copied (or modified)
+    """
+    limb_data = [k["data"] for k in graph_data]
+    n_limbs = len(limb_data)
+    node_counts = np.array([len(g["nodelist"]) for g in limb_data],dtype="int")
+    node_offsets = np.concatenate([[0],np.cumsum(node_counts)]).astype("int")
+    n_nodes = node_offsets[-1]
     
     if verbose:
         print(f"n_nodes = {n_nodes}")
 
-    node_count = 0
-    nodelist = []
-    adjacency_edges = []
-    features_list = []
-    all_edges = 0
-
+    # -- 2) features --
+    features_list = np.vstack([g["feature_matrix"] for g in limb_data])
+    if limb_attributes_to_add is not None:
+        limb_values = np.array([[v[j] for v in limb_attributes_to_add.values()]
+                                for j in range(n_limbs)])
+        features_list = np.hstack([
+            features_list,
+            np.repeat(limb_values,node_counts,axis=0).reshape(n_nodes,-1)
+        ])
+    nodelist = np.hstack([g["nodelist"] for g in limb_data])
+
+    # -- 3) connectivity --
+    # limbs exported with an edge_index are combined without a dense adjacency
+    use_edge_index = "edge_index" in limb_data[0]
+    if use_edge_index:
+        limb_edges = [np.asarray(g["edge_index"]).reshape(-1,2) for g in limb_data]
+        edge_offsets = np.repeat(node_offsets[:-1],[len(e) for e in limb_edges])
+        edge_index = (np.vstack(limb_edges) + edge_offsets.reshape(-1,1)).astype("int32")
+    else:
+        big_adj = np.zeros((n_nodes,n_nodes)).astype('int')
+        for j,g in enumerate(limb_data):
+            start,end = node_offsets[j],node_offsets[j+1]
+            big_adj[start:end,start:end] = g["adjacency"]
+            if verbose:
+                print(start,end)
+                print(f"adj_matrix = \n{g['adjacency']}")
 
-    big_adj = np.zeros((n_nodes,n_nodes)).astype('int')
-    
+    # -- 4) cluster assignment --
     if not flat_cluster_matrix:
         clust_matrix = np.zeros((max_limbs,max_nodes)).astype("int")
+        for j in range(n_limbs):
+            clust_matrix[j,node_offsets[j]:node_offsets[j+1]] = 1/node_counts[j]
     else:
-        clust_matrix = np.zeros(n_nodes).astype("int")
-
-    for j,l_idx in enumerate(limb_idx):
-        g = all_graph_data[j]["data"]
-        curr_n_nodes = len(g["nodelist"])
-
-
-        adj_matrix = g["adjacency"]
-        big_adj[node_count:node_count+curr_n_nodes,node_count:node_count+curr_n_nodes] = adj_matrix
-
-        if verbose:
-            print(node_count,node_count+curr_n_nodes)
-            print(f"adj_matrix = \n{adj_matrix}")
-
-        curr_features = g["feature_matrix"]
-        if limb_attributes_to_add is not None:
-            curr_array = np.array([v[j] for v in limb_attributes_to_add.values()])
-            features_values = np.tile(
-                curr_array,
-                (len(curr_features),1)
-            )
-            #print(f"curr_features.shape ={curr_features.shape}")
-            curr_features = np.hstack([curr_features,features_values])
-
-
-        features_list.append(curr_features)
-        nodelist.append(g["nodelist"])
-
-        if not flat_cluster_matrix:
-            clust_matrix[j,node_count:node_count+curr_n_nodes] = 1/curr_n_nodes
-        else:
-            clust_matrix[node_count:node_count+curr_n_nodes] = j
-            
-        node_count += curr_n_nodes
-
-    nodelist = np.hstack(nodelist)
-    features_list = np.vstack(features_list)
-    
-    
-    new_graph_data = all_graph_data[0].copy()
-    fnames = new_graph_data["data"]["features"]
-    if limb_attributes_to_add is not None:
-        features_names = list(limb_attributes_to_add.keys())
-        fnames += features_names
-    
+        clust_matrix = np.repeat(np.arange(n_limbs),node_counts).astype("int")
 
     # put back into one giant graph data
+    new_graph_data = dict(graph_data[0])
+    new_graph_data["data"] = dict(limb_data[0])
+    fnames = list(limb_data[0]["features"])
+    if limb_attributes_to_add is not None:
+        fnames += list(limb_attributes_to_add.keys())
     
     new_graph_data["data"]["feature_matrix"] = nu.replace_nan_with_zero(features_list)
     new_graph_data["data"]["nodelist"] = nodelist
-    new_graph_data["data"]["adjacency"] = big_adj
+    if use_edge_index:
+        new_graph_data["data"]["edge_index"] = edge_index
+    else:
+        new_graph_data["data"]["adjacency"] = big_adj
     new_graph_data["data"]["features"] = fnames
     
     if return_cluster_matrix:
@@ -711,6 +1232,249 @@ from tqdm_utils import tqdm
 import neuron_nx_io as nxio
 import pandas as pd
 
+def neuron_record_for_train_from_limb_df(
+    curr_df,
+    sort_attributes = None,
+    limb_attributes_to_add_to_branches = None,
+    add_pool_suffix = True,
+    node_weight_name = "skeletal_length",
+    edge_weight = False,
+    edge_weight_method = "max",
+    export_pool1_clusters = True,
+    hierarchical = False,
+    attributes_pool1 = (),
+    attributes_pool1_extra = None,
+    attributes_pool2 = (),
+    graph_type = "binary_tree",
+    ):
+    """
+    Purpose: To combine the limb rows of one neuron
+    into its training record (see neuron_df_for_train_from_limb_df)
+    """
+    attributes_pool1 = list(attributes_pool1)
+    attributes_pool2 = list(attributes_pool2)
+    
+    if edge_weight:
+        add_self_loops = True
+    else:
+        add_self_loops = False
+
+    if sort_attributes is not None:
+        curr_df = pu.sort_df_by_column(
+            curr_df,
+            columns=sort_attributes)
+
+    limb_idx = curr_df["limb_idx"].to_numpy()
+
+    if limb_attributes_to_add_to_branches is not None and len(limb_attributes_to_add_to_branches) > 0:
+        limb_attributes_to_add = {
+            f:curr_df[f].to_numpy() for f in limb_attributes_to_add_to_branches
+        }
+    else:
+        limb_attributes_to_add = None
+
+    graph_data,clust_matrix = nxio.combine_limb_graph_data(
+        graph_data = curr_df["graph_data"].to_list(),
+        limb_idx = limb_idx,
+        limb_attributes_to_add=limb_attributes_to_add
+    )
+        
+    if add_pool_suffix or hierarchical:
+        suffix = "_pool0"
+    else:
+        suffix = ""
+
+    ex_dict = curr_df.iloc[:1,:].to_dict(orient="records")[0]
+    ex_dict[f"names{suffix}"] = graph_data["data"]["nodelist"]
+    ex_dict[f"x_features{suffix}"] = graph_data["data"]["features"]
+    ex_dict[f"x{suffix}"] = graph_data["data"]["feature_matrix"]
+    ex_dict[f"edge_index{suffix}"] = nxio.edge_index_from_graph_data(
+        graph_data["data"],
+        add_self_loops=add_self_loops)
+        
+    sk_length_idx = np.where(np.array(ex_dict[f"x_features{suffix}"]) == node_weight_name)[0][0]
+    weight_values = ex_dict[f"x{suffix}"][:,sk_length_idx].astype("float")
+        
+    if node_weight_name is not None:
+        ex_dict[f"node_weight{suffix}"] = weight_values
+            
+    if edge_weight:
+        if len(ex_dict[f"edge_index{suffix}"]) > 0:
+            ex_dict[f"edge_weight{suffix}"] = getattr(np,edge_weight_method)(
+                weight_values[ex_dict[f"edge_index{suffix}"]],axis=1
+            ).astype("float")
+        else:
+            ex_dict[f"edge_weight{suffix}"] = np.array([]).astype('float')
+            
+            
+    if hierarchical or export_pool1_clusters:
+        ex_dict["pool1_names"] = limb_idx
+        ex_dict["pool1"] = clust_matrix
+
+    # ---- adding on all of the extra components for heirarchical pooling ------
+        
+    if hierarchical:
+            
+        if len(attributes_pool1) > 0:
+            shape = (-1,len(attributes_pool1))
+        else:
+            shape = (1,0)
+        ex_dict["x_pool1"] = curr_df[attributes_pool1].to_numpy().reshape(*shape)
+        ex_dict["x_features_pool1"] =  attributes_pool1
+        ex_dict["edge_index_pool1"] = xu.edge_list_from_graph_type(
+            n=len(limb_idx),
+            graph_type=graph_type,
+            plot=False,
+            add_self_loops=add_self_loops,
+        )
+            
+        weight_values = curr_df[node_weight_name].to_numpy().astype("float")
+        
+        if node_weight_name is not None:
+            ex_dict[f"node_weight_pool1"] = weight_values
+
+        if edge_weight:
+            if len(ex_dict[f"edge_index_pool1"]) > 0:
+                ex_dict[f"edge_weight_pool1"] = getattr(np,edge_weight_method)(
+                    weight_values[ex_dict[f"edge_index_pool1"]],axis=1
+                ).astype("float")
+            else:
+                ex_dict[f"edge_weight_pool1"] = np.array([]).astype('float')
+            
+        # adding on extra features to carry with
+        if attributes_pool1_extra is not None:
+            shape = (-1,len(attributes_pool1_extra))
+            ex_dict["x_pool1_extra"] = curr_df[attributes_pool1_extra].to_numpy().reshape(*shape)
+            ex_dict["x_features_pool1_extra"] =  attributes_pool1_extra
+            
+
+        #ex_dict["x_pool2"] = curr_df[attributes_pool2].to_numpy()
+        if len(attributes_pool2) > 0:
+            shape = (-1,len(attributes_pool2))
+        else:
+            shape = (1,0)
+        ex_dict["x_pool2"] = curr_df[attributes_pool2].iloc[0,:].to_numpy().reshape(*shape)
+        ex_dict["x_features_pool2"] =  attributes_pool2
+            
+            
+    del ex_dict["graph_data"]
+
+    return ex_dict
+
+def _neuron_record_for_train_job(args):
+    curr_df,kwargs = args
+    return nxio.neuron_record_for_train_from_limb_df(curr_df,**kwargs)
+
+def neuron_groups_from_limb_df(df):
+    """
+    Purpose: To iterate over the limb rows of each neuron
+    (one pass over the limb dataframe, neurons in order of first appearance)
+
+    df: limb dataframe or neuron archive (or archive filepath), the
+    archive is streamed one entry at a time (never loaded all at once)
+    """
+    if nxar.is_archive(df):
+        if not isinstance(df,nxar.NeuronArchive):
+            df = nxar.NeuronArchive(df)
+        for _,limb_dicts in df.items():
+            yield from nxio.neuron_groups_from_limb_df(
+                pd.DataFrame.from_records(list(limb_dicts)))
+        return
+
+    for _,curr_df in df.groupby(["segment_id","split_index"],sort=False):
+        yield curr_df
+
+def _apply_chunk(args):
+    """
+    Purpose: Worker for _imap_bounded, maps func
+    over a chunk of items (one pool task)
+    """
+    func,chunk = args
+    return [func(item) for item in chunk]
+
+def _imap_bounded(func,items,n_workers = None,max_pending = None,chunksize = 1):
+    """
+    Purpose: To map func over items in a process pool (results in order)
+    with at most max_pending tasks submitted at a time, so a long
+    (or lazily read) iterable is never pulled into memory all at once
+
+    Pseudocode:
+    1) Group the items into tasks of chunksize items
+    2) Submit tasks until max_pending futures are waiting
+    3) Yield the results of the oldest task and submit the next one
+    4) On exit (also when the consumer stops early) cancel
+       the futures that have not started
+
+    max_pending: None = 2 * n_workers (counted in tasks, so at most
+    max_pending * chunksize items are read ahead)
+    chunksize: items sent to a worker in one task
+    """
+    chunksize = max(chunksize,1)
+    def chunks():
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunksize:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        if max_pending is None:
+            max_pending = 2*executor._max_workers
+        max_pending = max(max_pending,1)
+
+        futures = collections.deque()
+        try:
+            for chunk in chunks():
+                futures.append(executor.submit(nxio._apply_chunk,(func,chunk)))
+                if len(futures) >= max_pending:
+                    yield from futures.popleft().result()
+            while len(futures) > 0:
+                yield from futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+def neuron_records_for_train_from_limb_df(
+    df,
+    n_workers = None,
+    chunksize = 1,
+    max_pending = None,
+    progress_bar = True,
+    **kwargs
+    ):
+    """
+    Purpose: To generate the training record of
+    each neuron in the limb dataframe (or archive)
+    one at a time (see neuron_df_for_train_from_limb_df)
+
+    n_workers: None/0/1 = in this process, otherwise
+    the neurons are combined in a process pool (in order)
+    max_pending: most tasks submitted to the pool
+    at once (None = 2 * n_workers)
+    chunksize: neurons combined in one pool task
+    (at most max_pending * chunksize neurons are read ahead)
+    """
+    groups = nxio.neuron_groups_from_limb_df(df)
+    if progress_bar:
+        total = None
+        if isinstance(df,pd.DataFrame):
+            total = len(df[["segment_id","split_index"]].drop_duplicates())
+        groups = tqdm(groups,total=total)
+
+    if n_workers is None or n_workers <= 1:
+        for curr_df in groups:
+            yield nxio.neuron_record_for_train_from_limb_df(curr_df,**kwargs)
+    else:
+        yield from nxio._imap_bounded(
+            nxio._neuron_record_for_train_job,
+            ((curr_df,kwargs) for curr_df in groups),
+            n_workers = n_workers,
+            max_pending = max_pending,
+            chunksize = chunksize)
+
 def neuron_df_for_train_from_limb_df(
     df,
     sort_attributes = None,#("soma_start_angle_max",)
@@ -719,17 +1483,17 @@ def neuron_df_for_train_from_limb_df(
         "max_soma_volume",
         "n_syn_soma"
         ),
-    
+
     add_pool_suffix = True,
-    
+
     node_weight_name = "skeletal_length",
     edge_weight = False,
     edge_weight_method = "max",
-    
-    
+
+
     #--- for hierarchical ---
     export_pool1_clusters = True,
-    
+
     hierarchical = False,
     attributes_pool1 = ("soma_start_angle_max",),
     attributes_pool1_extra = None,
@@ -738,14 +1502,51 @@ def neuron_df_for_train_from_limb_df(
         "n_syn_soma",
     ),
     graph_type = "binary_tree",#"complete_graph"
+
+    n_workers = None,
+    chunksize = 1,
+    max_pending = None,
+    stream = False,
+    stream_chunk_size = None,
     verbose =False,
     ):
-    
+    """
+    Purpose: To combine the limb rows of each neuron
+    into one training record per neuron
+
+    df: the limb dataframe (one row per limb with a graph_data column),
+    or a neuron archive (or archive filepath) whose entries are
+    the list of limb dicts of each neuron
+
+    Limbs exported with edge_index = True are combined from
+    their edge indexes (no dense adjacency is built)
+
+    chunksize: neurons combined in one pool task
+    verbose: print the number of neurons and the time
+    (when stream = False)
+
+    Pseudocode:
+    1) Group the limb rows by (segment_id,split_index) in one pass
+    2) Combine the limbs of each neuron into a record
+       (in a process pool when n_workers > 1)
+    3) Return all records as one dataframe, or when stream = True
+       a generator of the records (or of dataframes of
+       stream_chunk_size neurons)
+
+    Ex:
+    for neuron_df in nxio.neuron_df_for_train_from_limb_df(
+        "./Axon_vs_Dendrite.nxar",
+        stream = True,
+        stream_chunk_size = 10_000,
+        n_workers = 8):
+        ...
+    """
+
     if attributes_pool1 is not None:
         attributes_pool1 = list(attributes_pool1)
     else:
         attributes_pool1 = []
-    
+
     if attributes_pool2 is not None:
         attributes_pool2 = list(attributes_pool2)
     else:
@@ -755,127 +1556,99 @@ def neuron_df_for_train_from_limb_df(
         limb_attributes_to_add_to_branches = np.setdiff1d(
             limb_attributes_to_add_to_branches,np.union1d(attributes_pool1,attributes_pool2)
         )
-    
-    unique_seg_split = pu.filter_to_first_instance_of_unique_column(
-        df[["segment_id","split_index"]],
-        column_name=["segment_id","split_index"]
-    )
-    
-    if edge_weight:
-        add_self_loops = True
-    else:
-        add_self_loops = False
-
-    new_dicts = []
-    segs_splits = unique_seg_split.index.to_numpy()
-    for segment_id,split_index in tqdm(segs_splits):
-        curr_df = df.query(f"(segment_id=={segment_id}) and (split_index == {split_index})")
-
-        if sort_attributes is not None:
-            curr_df = pu.sort_df_by_column(
-                curr_df,
-                columns=sort_attributes)
-
-        limb_idx = curr_df["limb_idx"].to_numpy()    
-
-        if limb_attributes_to_add_to_branches is not None and len(limb_attributes_to_add_to_branches) > 0:
-            limb_attributes_to_add = {
-                f:curr_df[f].to_numpy() for f in limb_attributes_to_add_to_branches
-            }
-        else:
-            limb_attributes_to_add = None
 
-        graph_data,clust_matrix = nxio.combine_limb_graph_data(
-            graph_data = curr_df["graph_data"].to_list(),
-            limb_idx = limb_idx,
-            limb_attributes_to_add=limb_attributes_to_add
-        )
-        
-        if add_pool_suffix or hierarchical:
-            suffix = "_pool0"
-        else:
-            suffix = ""
-
-        ex_dict = pu.df_to_dicts(curr_df.iloc[:1,:])[0]
-        ex_dict[f"names{suffix}"] = graph_data["data"]["nodelist"]
-        ex_dict[f"x_features{suffix}"] = graph_data["data"]["features"]
-        ex_dict[f"x{suffix}"] = graph_data["data"]["feature_matrix"]
-        ex_dict[f"edge_index{suffix}"] = nu.edge_list_from_adjacency_matrix(
-            graph_data["data"]["adjacency"],
-            add_self_loops=add_self_loops)
-        
-        sk_length_idx = np.where(np.array(ex_dict[f"x_features{suffix}"]) == node_weight_name)[0][0]
-        weight_values = ex_dict[f"x{suffix}"][:,sk_length_idx].astype("float")
-        
-        if node_weight_name is not None:
-            ex_dict[f"node_weight{suffix}"] = weight_values
-            
-        if edge_weight:
-            if len(ex_dict[f"edge_index{suffix}"]) > 0:
-                ex_dict[f"edge_weight{suffix}"] = getattr(np,edge_weight_method)(
-                    weight_values[ex_dict[f"edge_index{suffix}"]],axis=1
-                ).astype("float")
-            else:
-                ex_dict[f"edge_weight{suffix}"] = np.array([]).astype('float')
-            
-            
-        if hierarchical or export_pool1_clusters:
-            ex_dict["pool1_names"] = limb_idx
-            ex_dict["pool1"] = clust_matrix
+    records = nxio.neuron_records_for_train_from_limb_df(
+        df,
+        n_workers = n_workers,
+        chunksize = chunksize,
+        max_pending = max_pending,
+        sort_attributes = sort_attributes,
+        limb_attributes_to_add_to_branches = limb_attributes_to_add_to_branches,
+        add_pool_suffix = add_pool_suffix,
+        node_weight_name = node_weight_name,
+        edge_weight = edge_weight,
+        edge_weight_method = edge_weight_method,
+        export_pool1_clusters = export_pool1_clusters,
+        hierarchical = hierarchical,
+        attributes_pool1 = attributes_pool1,
+        attributes_pool1_extra = attributes_pool1_extra,
+        attributes_pool2 = attributes_pool2,
+        graph_type = graph_type,
+    )
 
-        # ---- adding on all of the extra components for heirarchical pooling ------
-        
-        if hierarchical:
-            
-            if len(attributes_pool1) > 0:
-                shape = (-1,len(attributes_pool1))
-            else:
-                shape = (1,0)
-            ex_dict["x_pool1"] = curr_df[attributes_pool1].to_numpy().reshape(*shape)
-            ex_dict["x_features_pool1"] =  attributes_pool1
-            ex_dict["edge_index_pool1"] = xu.edge_list_from_graph_type(
-                n=len(limb_idx),
-                graph_type=graph_type,
-                plot=False,
-                add_self_loops=add_self_loops,
-            )
-            
-            weight_values = curr_df[node_weight_name].to_numpy().astype("float")
-        
-            if node_weight_name is not None:
-                ex_dict[f"node_weight_pool1"] = weight_values
-
-            if edge_weight:
-                if len(ex_dict[f"edge_index_pool1"]) > 0:
-                    ex_dict[f"edge_weight_pool1"] = getattr(np,edge_weight_method)(
-                        weight_values[ex_dict[f"edge_index_pool1"]],axis=1
-                    ).astype("float")
-                else:
-                    ex_dict[f"edge_weight_pool1"] = np.array([]).astype('float')
-            
-            # adding on extra features to carry with
-            if attributes_pool1_extra is not None:
-                shape = (-1,len(attributes_pool1_extra))
-                ex_dict["x_pool1_extra"] = curr_df[attributes_pool1_extra].to_numpy().reshape(*shape)
-                ex_dict["x_features_pool1_extra"] =  attributes_pool1_extra
-            
+    if stream:
+        if stream_chunk_size is None:
+            return records
+        return nxio._record_df_chunks(records,stream_chunk_size)
 
-            #ex_dict["x_pool2"] = curr_df[attributes_pool2].to_numpy()
-            if len(attributes_pool2) > 0:
-                shape = (-1,len(attributes_pool2))
-            else:
-                shape = (1,0)
-            ex_dict["x_pool2"] = curr_df[attributes_pool2].iloc[0,:].to_numpy().reshape(*shape)
-            ex_dict["x_features_pool2"] =  attributes_pool2
-            
-            
-        del ex_dict["graph_data"]
+    st = time.time()
+    df_with_labels = pd.DataFrame.from_records(list(records))
+    if verbose:
+        print(f"# of neurons = {len(df_with_labels)} (total time = {time.time() - st:.2f})")
+    return df_with_labels
 
-        new_dicts.append(ex_dict)
+def _record_df_chunks(records,chunk_size):
+    chunk = []
+    for r in records:
+        chunk.append(r)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame.from_records(chunk)
+            chunk = []
+    if len(chunk) > 0:
+        yield pd.DataFrame.from_records(chunk)
 
 
-    df_with_labels = pd.DataFrame.from_records(new_dicts)
-    return df_with_labels
+import neuron_nx_shards as nxshard
+def neuron_shards_for_train_from_limb_df(
+    df,
+    folder,
+    max_records = nxshard.max_records_default,
+    max_bytes = None,
+    prefix = nxshard.prefix_default,
+    codec = None,
+    verbose = False,
+    **kwargs
+    ):
+    """
+    Purpose: To write the training records of every neuron
+    to shards on disk as they are made (so memory stays at one shard
+    no matter how many neurons) instead of returning one DataFrame
+
+    Pseudocode:
+    1) Stream the neuron records (neuron_df_for_train_from_limb_df(stream = True))
+    2) Buffer them in a shard writer that flushes a shard every
+       max_records records or max_bytes
+    3) Return the shard reader over the folder
+
+    kwargs: passed to neuron_df_for_train_from_limb_df
+
+    Ex:
+    reader = nxio.neuron_shards_for_train_from_limb_df(
+        "./Axon_vs_Dendrite.nxar",
+        folder = "./Axon_vs_Dendrite_train",
+        max_bytes = 500_000_000,
+        n_workers = 8,
+    )
+    for shard_df in reader.iter_dfs():
+        ...
+    """
+    kwargs.pop("stream_chunk_size",None)
+    records = nxio.neuron_df_for_train_from_limb_df(
+        df,
+        stream = True,
+        verbose = verbose,
+        **kwargs)
+
+    with nxshard.ShardWriter(
+        folder,
+        prefix = prefix,
+        max_records = max_records,
+        max_bytes = max_bytes,
+        codec = codec,
+        verbose = verbose) as writer:
+        writer.write_records(records)
+
+    return nxshard.ShardReader(folder,prefix = prefix)
 
 
 import neuron_nx_io as nxio
\ No newline at end of file
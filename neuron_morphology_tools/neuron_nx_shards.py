@@ -0,0 +1,321 @@
+"""
+Purpose: To write the GNN training records (one dict per neuron
+with x_pool0, edge_index_pool0, pool1 ...) to fixed size shards on disk
+as they are made, instead of one DataFrame holding every neuron
+
+Each shard is a columnar container (see neuron_nx_columnar) whose rows
+are records: every key of the records is one column, so the arrays of
+all records in a shard are stored back to back (ragged columns)
+and can be memory mapped when read
+
+A shard is flushed when it reaches max_records records or
+max_bytes (estimated from the size of the values)
+
+Folder layout:
+    <prefix>_00000.nxrec, <prefix>_00001.nxrec, ...
+    <prefix>.index : one json line per shard
+        {"filename":...,"start":...,"n_records":...,"nbytes":...,"keys":[[segment_id,split_index],...]}
+
+Ex:
+import neuron_nx_shards as nxshard
+with nxshard.ShardWriter("./train_shards",max_bytes = 500_000_000) as writer:
+    for record in nxio.neuron_df_for_train_from_limb_df(limb_df,stream=True):
+        writer.write(record)
+
+reader = nxshard.ShardReader("./train_shards")
+for shard_df in reader.iter_dfs():
+    ...
+"""
+import bisect
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+import neuron_nx_columnar as nxcol
+
+file_extension_default = ".nxrec"
+index_extension = ".index"
+prefix_default = "shard"
+max_records_default = 10_000
+
+key_names = ("segment_id","split_index")
+
+
+def record_nbytes(record):
+    """
+    Purpose: Rough estimate of the bytes a record
+    will take in a shard (used for the byte budget)
+    """
+    nbytes = 0
+    for v in record.values():
+        if isinstance(v,np.ndarray) and v.dtype.kind != "O":
+            nbytes += v.nbytes
+        elif isinstance(v,(int,float,bool,np.generic)) or v is None:
+            nbytes += 8
+        elif isinstance(v,str):
+            nbytes += 4*len(v)
+        else:
+            nbytes += len(pickle.dumps(v,protocol=pickle.HIGHEST_PROTOCOL))
+    return nbytes
+
+def encode_records(records):
+    """
+    Purpose: To turn a list of record dicts into the header dict
+    and named numpy blocks of a shard container
+    (every key is encoded as one column over the records)
+    """
+    columns = list(dict.fromkeys([k for r in records for k in r.keys()]))
+    blocks = dict()
+    column_specs = dict()
+    for c in columns:
+        column_specs[c] = nxcol._encode_values(
+            [r.get(c,nxcol.absent) for r in records],
+            f"attr/{c}",
+            blocks)
+
+    header = dict(
+        format = "nxrec",
+        version = nxcol.format_version,
+        n_records = len(records),
+        attributes = column_specs,
+    )
+    return header,blocks
+
+def _record_key(record):
+    return [nxcol._json_safe(record.get(k,None)) for k in key_names]
+
+
+class RecordShard(nxcol.ColumnarG):
+    """
+    Purpose: Read only (memory mapped) view
+    of the records of one shard
+
+    Ex:
+    shard = nxshard.open_shard(filepath)
+    shard.column("segment_id")
+    shard.record(0)
+    shard.to_df()
+    """
+    def __len__(self):
+        return self.header["n_records"]
+
+    def __repr__(self):
+        return f"RecordShard(n_records = {len(self)}, filepath = {self.filepath})"
+
+    @property
+    def columns(self):
+        return self.attribute_names
+
+    def column_values(self,column):
+        """
+        Purpose: To decode one column of every record
+        (records without it get None)
+        """
+        values = self._decode_all(self.header["attributes"][column],len(self))
+        return [None if v is nxcol.absent else v for v in values]
+
+    def record(self,i,columns = None):
+        if columns is None:
+            columns = self.columns
+        record = dict()
+        for c in columns:
+            v = self._decode_one(self.header["attributes"][c],i)
+            if v is not nxcol.absent:
+                record[c] = v
+        return record
+
+    def records(self,columns = None):
+        if columns is None:
+            columns = self.columns
+        values = {c:self._decode_all(self.header["attributes"][c],len(self)) for c in columns}
+        return [{c:values[c][i] for c in columns if values[c][i] is not nxcol.absent}
+                for i in range(len(self))]
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def to_df(self,columns = None):
+        import pandas as pd
+        return pd.DataFrame.from_records(self.records(columns))
+
+def open_shard(filepath):
+    """
+    Purpose: To memory map one shard file
+    """
+    G_col = nxcol.open_G(filepath)
+    return RecordShard(G_col.buffer,filepath=G_col.filepath)
+
+
+class ShardWriter:
+    """
+    Purpose: To write records to a folder of shards,
+    flushing a shard every max_records records or max_bytes
+    (whichever comes first) so only one shard is ever held in memory
+
+    Shards are numbered after the ones already in the folder
+    (so a writer can be reopened to add more records)
+    """
+    def __init__(
+        self,
+        folder,
+        prefix = prefix_default,
+        max_records = max_records_default,
+        max_bytes = None,
+        codec = None,
+        column_codecs = None,
+        verbose = False,
+        ):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True,exist_ok=True)
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.column_codecs = column_codecs
+        self.verbose = verbose
+        self.index_filepath = self.folder / f"{prefix}{index_extension}"
+
+        self.shards = read_index(self.folder,prefix)
+        self.n_records = sum([s["n_records"] for s in self.shards])
+        self._records = []
+        self._nbytes = 0
+
+    def write(self,record):
+        self._records.append(record)
+        self._nbytes += nxshard.record_nbytes(record)
+        if ((self.max_records is not None and len(self._records) >= self.max_records)
+            or (self.max_bytes is not None and self._nbytes >= self.max_bytes)):
+            self.flush()
+
+    def write_records(self,records):
+        for r in records:
+            self.write(r)
+        return self
+
+    def flush(self):
+        """
+        Purpose: To write the buffered records as a
+        new shard and append it to the index
+        """
+        if len(self._records) == 0:
+            return None
+        filename = f"{self.prefix}_{len(self.shards):05d}{file_extension_default}"
+        header,blocks = nxshard.encode_records(self._records)
+        with open(self.folder / filename,"wb") as f:
+            nbytes = nxcol.write_container(
+                f,header,blocks,
+                codec=self.codec,
+                column_codecs=self.column_codecs)
+
+        entry = dict(
+            filename = filename,
+            start = self.n_records,
+            n_records = len(self._records),
+            nbytes = nbytes,
+            keys = [_record_key(r) for r in self._records],
+        )
+        with open(self.index_filepath,"a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        if self.verbose:
+            print(f"Wrote {filename} ({entry['n_records']} records, {nbytes/1_000_000:.3f} MB)")
+
+        self.shards.append(entry)
+        self.n_records += entry["n_records"]
+        self._records = []
+        self._nbytes = 0
+        return entry
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __repr__(self):
+        return f"ShardWriter({self.folder}, n_shards = {len(self.shards)}, n_records = {self.n_records})"
+
+def read_index(folder,prefix = prefix_default):
+    """
+    Purpose: To read the shard index of a folder
+    (shards whose file is missing or partially written are dropped)
+    """
+    folder = Path(folder)
+    index_filepath = folder / f"{prefix}{index_extension}"
+    shards = []
+    if not index_filepath.exists():
+        return shards
+    with open(index_filepath,"r") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            filepath = folder / entry["filename"]
+            if not filepath.exists() or filepath.stat().st_size < entry["nbytes"]:
+                break
+            shards.append(entry)
+    return shards
+
+
+class ShardReader:
+    """
+    Purpose: To stream (or randomly access)
+    the records of a folder of shards, one shard in memory at a time
+    """
+    def __init__(self,folder,prefix = prefix_default):
+        self.folder = Path(folder)
+        self.prefix = prefix
+        self.shards = nxshard.read_index(self.folder,prefix)
+        self._starts = [s["start"] for s in self.shards]
+
+    def __len__(self):
+        return sum([s["n_records"] for s in self.shards])
+
+    def __repr__(self):
+        return f"ShardReader({self.folder}, n_shards = {len(self.shards)}, n_records = {len(self)})"
+
+    @property
+    def filepaths(self):
+        return [str(self.folder / s["filename"]) for s in self.shards]
+
+    def shard(self,i):
+        return nxshard.open_shard(self.folder / self.shards[i]["filename"])
+
+    def iter_shards(self):
+        for i in range(len(self.shards)):
+            shard = self.shard(i)
+            yield shard
+            shard.close()
+
+    def iter_dfs(self,columns = None):
+        for shard in self.iter_shards():
+            yield shard.to_df(columns)
+
+    def __iter__(self):
+        for shard in self.iter_shards():
+            yield from shard.records()
+
+    def record(self,i,columns = None):
+        """
+        Purpose: To get one record by its global index
+        """
+        shard_idx = bisect.bisect_right(self._starts,i) - 1
+        if shard_idx < 0 or i >= len(self):
+            raise IndexError(i)
+        with self.shard(shard_idx) as shard:
+            return shard.record(i - self.shards[shard_idx]["start"],columns)
+
+    def keys(self):
+        return [tuple(k) for s in self.shards for k in s["keys"]]
+
+
+import neuron_nx_shards as nxshard
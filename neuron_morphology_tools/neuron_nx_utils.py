@@ -29,7 +29,7 @@ def delete_attributes(
     ):
     
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
     
     if attributes is None:
         attributes = list(nxu.dynamic_attributes_default)
@@ -51,36 +51,148 @@ def name_from_G(G,append=None):
         name += f"_{append}"
     return name
     
+import neuron_nx_columnar as nxcol
+import neuron_nx_codecs as nxcodec
+from pathlib import Path
 def save_G(
     G,
     filepath=None,
     filename_append = None,
     delete_dynamic_attributes = True,
+    file_format = "pickle",
+    codec = None,
+    column_codecs = None,
     verbose = False
     ):
     
     """
     Purpose: To save the graph
     nxu.save_G(G_ax,filename_append="axon_high_fid")
+    
+    file_format: 
+    - "pickle": compressed pickle of the networkx object 
+      (.pbz2 through su.compressed_pickle if codec is None, 
+      else .nxpkl with the codec recorded in the header)
+    - "columnar": memory-mappable columnar container (.nxcol), 
+    see neuron_nx_columnar
+    
+    codec: compression codec (see neuron_nx_codecs), 
+    column_codecs: codec per column (columnar only)
+    
+    Ex: 
+    nxu.save_G(G,file_format="columnar",delete_dynamic_attributes=False)
+    nxu.save_G(G,codec="zstd")
     """
     
+    if filepath is None:
+        filepath = f"./{nxu.name_from_G(G,append=filename_append)}"
+        
+    if file_format == "columnar":
+        # the dynamic attributes can just be skipped when writing (no copy needed)
+        return nxcol.write_G(
+            G,
+            filepath,
+            exclude_attributes = nxu.dynamic_attributes_default if delete_dynamic_attributes else None,
+            codec = codec,
+            column_codecs = column_codecs,
+            verbose = verbose)
+    elif file_format != "pickle":
+        raise Exception(f"Unknown file_format: {file_format}")
+    
     if delete_dynamic_attributes:
         G = nxu.delete_attributes(
             G,
             inplace = False,
             verbose = False)
-    if filepath is None:
-        filepath = f"./{nxu.name_from_G(G,append=filename_append)}"
+        
+    if codec is not None:
+        return nxcodec.dump_pickle(G,filepath,codec=codec,verbose=verbose)
     
     return su.compressed_pickle(G,filepath)
 
-def load_G(filepath):
-    return su.decompress_pickle(filepath)
+def load_G(
+    filepath,
+    attributes = None,
+    exclude_attributes = None,
+    lazy_dynamic_attributes = False,
+    lazy_attributes = None,
+    ):
+    """
+    Purpose: To load a graph saved with save_G
+    (the file format is detected from the file),
+    a DiGraph is returned as a nxg.NeuronDiGraph
+    
+    Options only for the columnar format:
+    - attributes/exclude_attributes: restrict which node attributes are loaded
+    - lazy_dynamic_attributes: leave the dynamic attributes (spine_data,synapse_data,
+      width_data,skeleton_data) on disk and only decode them for a node
+      the first time they are accessed
+    - lazy_attributes: any other list of attributes to load lazily
+    
+    Ex: 
+    G = nxu.load_G(filepath,lazy_dynamic_attributes=True)
+    G.nodes["L0_0"]["synapse_data"]
+    """
+    filepath = str(filepath)
+    if not Path(filepath).exists():
+        for ext in (nxcol.file_extension_default,nxcodec.file_extension_default,".pbz2"):
+            if Path(filepath + ext).exists():
+                filepath = filepath + ext
+                break
+    if (str(filepath).endswith(nxcol.file_extension_default)
+        or nxcol.is_columnar_file(filepath)):
+        if lazy_dynamic_attributes:
+            lazy_attributes = list(nxu.dynamic_attributes_default) + list(
+                lazy_attributes if lazy_attributes is not None else [])
+        return nxcol.read_G(
+            filepath,
+            attributes = attributes,
+            exclude_attributes = exclude_attributes,
+            lazy_attributes = lazy_attributes)
+    if (str(filepath).endswith(nxcodec.file_extension_default)
+        or nxcodec.is_codec_pickle_file(filepath)):
+        return nxg.to_neuron_graph(nxcodec.load_pickle(filepath))
+    return nxg.to_neuron_graph(su.decompress_pickle(filepath))
     
 
 def skeletal_length_on_path(G,path):
     return np.sum([G.nodes[k]["skeletal_length"] for k in path])
 
+def data_obj_table(
+    G,
+    data_type,
+    nodes = None,
+    value_name = "upstream_dist",
+    ):
+    """
+    Purpose: To flatten the data objects (synapse/spine/width dicts)
+    of the nodes into one table
+
+    Returns: dict(
+        objs = list of the object dicts (not copied),
+        node = node of each object,
+        values = numpy array of value_name of each object)
+
+    Ex:
+    syn_table = nxu.data_obj_table(G,"synapse_data")
+    """
+    if nodes is None:
+        nodes = list(G.nodes())
+    objs = []
+    obj_nodes = []
+    for n in nodes:
+        curr_objs = G.nodes[n].get(data_type,None)
+        if curr_objs is None or len(curr_objs) == 0:
+            continue
+        objs += curr_objs
+        obj_nodes += [n]*len(curr_objs)
+
+    return dict(
+        objs = objs,
+        node = np.array(obj_nodes,dtype=object),
+        values = np.array([k[value_name] for k in objs],dtype=float),
+    )
+
 def calculate_soma_distance_to_data_objs(
     G,
     verbose = False,
@@ -90,30 +202,34 @@ def calculate_soma_distance_to_data_objs(
     Purpose: To set the soma distance for all attributes
 
     Pseudocode: 
-    Iterate through all of the nodes with L in name
-    1) Find the path back to the soma
-    2) Calculate the sum of skeletal length back to the soma
-    for each attrbute
-    3) Add skeletal length to the upstream dist to get the soma distance
+    1) Get the skeletal length between the soma and every
+       node with L in name (one traversal with the soma distance index)
+    for each attrbute in data_to_update
+    2) Flatten the objects of all the nodes into one table
+    3) Add the upstream distance of the node to the upstream_dist
+       of all objects at once to get the soma distance
 
     """
-    for node in G.nodes():
-        if "L" not in node:
-            continue
-        if verbose:
-            print(f"--working on node {node}--")
-        inbetween_node_path = xu.shortest_path(G,"S0",node)[1:-1]
-        data_to_update = ("synapse_data","spine_data","width_data")
-
-        soma_dist_on_path = nxu.skeletal_length_on_path(G,inbetween_node_path)
+    if isinstance(data_to_update,str):
+        data_to_update = [data_to_update]
+        
+    nodes = [n for n in G.nodes() if "L" in n]
+    soma_dist = nxu.soma_distance_index(G)["upstream"]
+    
+    if verbose:
+        for node in nodes:
+            print(f"soma_dist_on_path for {node} = {soma_dist[node]}")
 
+    for dtype in data_to_update:
+        table = nxu.data_obj_table(G,dtype,nodes=nodes)
+        if len(table["objs"]) == 0:
+            continue
+        node_offset = np.array([soma_dist[n] for n in table["node"]],dtype=float)
+        soma_distance = table["values"] + node_offset
+        for obj,d in zip(table["objs"],soma_distance):
+            obj["soma_distance"] = d
         if verbose:
-            print(f"inbetween_node_path = {inbetween_node_path}")
-            print(f"soma_dist_on_path = {soma_dist_on_path}")
-
-        for dtype in data_to_update:
-            for obj in G.nodes[node][dtype]:
-                obj["soma_distance"] = obj["upstream_dist"] + soma_dist_on_path
+            print(f"Set soma_distance of {len(table['objs'])} {dtype} objects")
                 
                 
 def draw_tree(
@@ -186,6 +302,7 @@ def remove_node(
     verbose = False,
     maintain_skeleton_connectivity = True,
     remove_all_downstream_nodes = False,
+    batch = True,
     **kwargs
     ):
     """
@@ -197,6 +314,12 @@ def remove_node(
         a. (if none then just delete and return)
     2) For each downstream node:
 
+    batch: when removing several nodes, the skeleton_data and width_data
+    of the children are patched once at the end (with all the removed
+    upstream nodes in the order they were removed) instead of after
+    every removal, and remove_all_downstream_nodes deletes all the
+    subtrees in one call (same result as removing the nodes one at a time)
+
     Attributes that need to be changed: 
 
     # if ask to alter skeleton
@@ -234,9 +357,24 @@ def remove_node(
     """
 
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
 
     nodes = nu.convert_to_array_like(node)
+    
+    if batch and len(nodes) > 1 and remove_all_downstream_nodes:
+        total_nodes_to_delete = set()
+        for node in nodes:
+            if node not in G or node in total_nodes_to_delete:
+                continue
+            total_nodes_to_delete.add(node)
+            total_nodes_to_delete.update(xu.all_downstream_nodes(G,node))
+        if verbose:
+            print(f"Removing all downstream nodes along with nodes {nodes}: {total_nodes_to_delete}")
+        return xu.remove_nodes_from(G,[n for n in G.nodes() if n in total_nodes_to_delete])
+    
+    batch = batch and len(nodes) > 1
+    # child -> [(endpoint_upstream,width_upstream,skeletal_length_upstream)] in removal order
+    skeleton_patches = dict()
     for node in nodes:
         if verbose:
             print(f"--Working on removing node {node}")
@@ -252,7 +390,11 @@ def remove_node(
             print(f"downstream_nodes = {downstream_nodes}")
 
         if len(downstream_nodes) > 0 and not remove_all_downstream_nodes:
-            if node in nxu.soma_connected_nodes(G):
+            if soma_node_name_global in G:
+                soma_connected = node in G[soma_node_name_global]
+            else:
+                soma_connected = node in nxu.soma_connected_nodes(G)
+            if soma_connected:
                 soma_vals = ["soma_start_vec","soma_start_angle"]
                 if verbose:
                     print(f"Adding {soma_vals} to the downstream nodes")
@@ -268,11 +410,16 @@ def remove_node(
                     print(f"Adding endpoint_upstream {endpoint_upstream} to the downstream nodes skeleton")
                 for n in downstream_nodes:
                     G.nodes[n]["endpoint_upstream"]  = endpoint_upstream
+                    if batch:
+                        skeleton_patches.setdefault(n,[]).append(
+                            (endpoint_upstream,width_upstream,skeletal_length_upstream))
+                        continue
                     G.nodes[n]["skeleton_data"] = np.concatenate([[endpoint_upstream],G.nodes[n]["skeleton_data"]])
-                    for i,(k) in enumerate(G.nodes[n]["width_data"]):
-                        G.nodes[n]["width_data"][i]["upstream_dist"] = G.nodes[n]["width_data"][i]["upstream_dist"] + width_upstream
+                    # new width dicts (the old ones can be shared with the graph this was copied from)
+                    width_data = [dict(k,upstream_dist = k["upstream_dist"] + width_upstream)
+                                  for k in G.nodes[n]["width_data"]]
                     G.nodes[n]["width_data"] = [dict(upstream_dist=skeletal_length_upstream,
-                                                     width = width_upstream)] + G.nodes[n]["width_data"]
+                                                     width = width_upstream)] + width_data
                     
         if not remove_all_downstream_nodes:
             xu.remove_node_reattach_children_di(G,node,inplace = True)
@@ -286,7 +433,36 @@ def remove_node(
                 print(f"Removing all downstream nodes along with node {node}: {total_nodes_to_delete}")
             G = xu.remove_nodes_from(G,total_nodes_to_delete)
             
+    for n,patches in skeleton_patches.items():
+        if n in G:
+            nxu._apply_skeleton_patches(G,n,patches)
+            
     return G
+
+def _apply_skeleton_patches(G,n,patches):
+    """
+    Purpose: To add the endpoints and widths of the removed
+    upstream nodes (in the order they were removed) to the
+    skeleton_data and width_data of a node all at once
+    (same values as adding them after every removal)
+    """
+    G.nodes[n]["skeleton_data"] = np.concatenate(
+        [[p[0] for p in patches[::-1]],G.nodes[n]["skeleton_data"]])
+    
+    width_data = []
+    for k in G.nodes[n]["width_data"]:
+        upstream_dist = k["upstream_dist"]
+        for _,width_upstream,_ in patches:
+            upstream_dist = upstream_dist + width_upstream
+        width_data.append(dict(k,upstream_dist = upstream_dist))
+            
+    new_width_data = []
+    for i,(_,width_upstream,skeletal_length_upstream) in enumerate(patches):
+        upstream_dist = skeletal_length_upstream
+        for _,w,_ in patches[i+1:]:
+            upstream_dist = upstream_dist + w
+        new_width_data.append(dict(upstream_dist=upstream_dist,width = width_upstream))
+    G.nodes[n]["width_data"] = new_width_data[::-1] + width_data
     
 
 def remove_small_starter_branches(
@@ -311,7 +487,7 @@ def remove_small_starter_branches(
     """
 
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
 
     sm_st_branches = nxu.small_starter_branches(
         G,
@@ -668,19 +844,111 @@ def limb_from_node_name(name):
 def branch_from_node_name(name):
     return int(name[name.find("_")+1:])
 
+import neuron_nx_graph as nxg
+def limb_index(G):
+    """
+    Purpose: To parse the limb and branch of every
+    limb branch node name once and group the nodes by limb
+
+    The index is cached on nxa.NeuronGraph and is a registered derived
+    index of nxg.NeuronDiGraph (nodes added or removed since it was
+    built are applied to it without parsing the other names again),
+    plain networkx graphs get a new index every call
+
+    Returns: dict(
+        nodes = array of the limb branch nodes (graph order),
+        limb = limb idx of each node,
+        branch = branch idx of each node,
+        limb_positions = {limb_idx:positions of its nodes in nodes})
+
+    Ex:
+    index = nxu.limb_index(G)
+    index["nodes"][index["limb_positions"][2]]
+    """
+    if nxa.is_array_graph(G):
+        key = ("limb_index",)
+        if key not in G._cache:
+            G._cache[key] = nxu._limb_index_from_nodes(G.names)
+        return G._cache[key]
+    
+    return nxg.derived_index(G,"limb_index")
+
+def _limb_index_from_nodes(nodes,limb = None,branch = None):
+    """
+    limb,branch: already parsed limb and branch idx of
+    the nodes (None for the ones to parse)
+    """
+    names = [k for k in nodes if "S" not in k] if limb is None else list(nodes)
+    if limb is None:
+        limb = np.full(len(names),-1,dtype=int)
+        branch = np.full(len(names),-1,dtype=int)
+    to_parse = np.where(branch < 0)[0]
+    for i in to_parse:
+        k = names[i]
+        split_idx = k.find("_")
+        limb[i] = int(k[1:split_idx])
+        branch[i] = int(k[split_idx+1:])
+        
+    order = np.argsort(limb,kind="stable")
+    limb_values,starts = np.unique(limb[order],return_index=True)
+    limb_positions = {k:v for k,v in zip(limb_values.tolist(),np.split(order,starts[1:]))}
+    
+    return dict(
+        nodes = np.array(names,dtype=object),
+        limb = limb,
+        branch = branch,
+        limb_positions = limb_positions,
+    )
+
+def _limb_index_update(G,index,entries):
+    """
+    Purpose: To apply the added/removed nodes
+    from the journal to the limb index
+    """
+    nodes = dict.fromkeys(index["nodes"])
+    for _,operation,args in entries:
+        if operation == "add_node":
+            if "S" not in args[0]:
+                nodes[args[0]] = None
+        elif operation == "remove_node":
+            nodes.pop(args[0],None)
+        elif operation not in ("node_attr","add_edge","remove_edge"):
+            return None
+    
+    old_positions = {n:i for i,n in enumerate(index["nodes"])}
+    positions = np.array([old_positions.get(n,-1) for n in nodes],dtype=int)
+    new_node = positions < 0
+    limb = np.where(new_node,-1,index["limb"][positions])
+    branch = np.where(new_node,-1,index["branch"][positions])
+    return nxu._limb_index_from_nodes(list(nodes),limb = limb,branch = branch)
+
+def _limb_index_build(G):
+    return nxu._limb_index_from_nodes(G.nodes())
+
+nxg.register_derived_index(
+    "limb_index",
+    _limb_index_build,
+    _limb_index_update)
+
 def limb_branch_nodes(G):
+    if nxa.is_array_graph(G) or nxg.graph_version(G) is not None:
+        return list(nxu.limb_index(G)["nodes"])
     return [k for k in G.nodes() if "S" not in k]
 
 def limb_branch_subgraph(G):
     return G.subgraph(nxu.limb_branch_nodes(G)).copy()
 
 def all_limb_idxs_in_G(G):
-    return np.sort(np.unique([nxu.limb_from_node_name(k)
-                     for k in limb_branch_nodes(G)]))
+    return np.sort(np.array(list(nxu.limb_index(G)["limb_positions"].keys()),dtype=int))
 
-def all_limb_graphs(G,return_idxs = False):
+def all_limb_graphs(G,return_idxs = False,as_view = True):
+    """
+    Purpose: The graph of every limb (in limb order),
+    read only subgraph views of G unless as_view = False
+    """
+    index = nxu.limb_index(G)
     limb_idxs = nxu.all_limb_idxs_in_G(G)
-    return_graphs = [limb_graph(G,k) for k in limb_idxs]
+    return_graphs = [nxu.limb_graph(G,k,index=index,as_view=as_view) for k in limb_idxs]
     if return_idxs:
         return return_graphs,limb_idxs
     else:
@@ -710,9 +978,15 @@ def limb_graph(
     most_upstream_node = None,
     branches_idx = None,
     verbose = False,
+    as_view = True,
+    index = None,
     ):
     """
     Purpose: To return a graph of a certain limb
+    (a read only subgraph view of G unless as_view = False)
+    
+    index: limb index of G (see nxu.limb_index) if
+    already computed
     
     Ex: nxu.limb_graph(G_ax,limb_idx = 3,verbose = True)
     """
@@ -728,19 +1002,22 @@ def limb_graph(
                 print(f"Returning whole graph")
             return G
 
-        subgraph_nodes = [k for k in nxu.limb_branch_nodes(G)
-                         if nxu.limb_from_node_name(k) == limb_idx]
+        if index is None:
+            index = nxu.limb_index(G)
+        positions = index["limb_positions"].get(limb_idx,np.array([],dtype=int))
+        
+        if branches_idx is not None:
+            positions = positions[np.isin(index["branch"][positions],list(branches_idx))]
+        subgraph_nodes = list(index["nodes"][positions])
         
         if branches_idx is not None:
-            subgraph_nodes = [k for k in subgraph_nodes
-                             if nxu.branch_from_node_name(k) in branches_idx]
 
             if verbose:
                 print(f"subgraph_nodes after branch restriction: {subgraph_nodes}")
     elif most_upstream_node is not None:
         if verbose:
             print(f"Using the most upstream method")
-        subgraph_nodes = xu.all_downstream_nodes(
+        subgraph_nodes = nxa.all_downstream_nodes(
             G,
             most_upstream_node,
             include_self=True)
@@ -749,17 +1026,21 @@ def limb_graph(
     if verbose:
         print(f"subgraph_nodes after restriction: {subgraph_nodes}")
         
+    if as_view:
+        return G.subgraph(subgraph_nodes)
     return G.subgraph(subgraph_nodes).copy()
 
 
+node_match_attributes_default = (
+    "endpoint_upstream",
+    #"endpoint_downstream",
+    "skeleton_vector_upstream",
+)
+
 def node_match_by_dict(
     dict1,
     dict2,
-    attributes = (
-        "endpoint_upstream",
-        #"endpoint_downstream",
-        "skeleton_vector_upstream",
-    ),
+    attributes = node_match_attributes_default,
     verbose = False,
     ):
     """
@@ -796,20 +1077,54 @@ def node_match_by_dict(
     return match_flag
 
 
+import itertools
+def node_match_key(
+    node_dict,
+    attributes = node_match_attributes_default,
+    ):
+    """
+    Purpose: Hashable key of the attributes compared by
+    node_match_by_dict (nodes match exactly when their keys are equal)
+    
+    Arrays become (shape,values as floats) so 1 and 1.0 give the same key
+    
+    Ex: nxu.node_match_key(G.nodes["L0_0"])
+    """
+    key = []
+    for a in attributes:
+        val = node_dict[a]
+        if "array" in str(type(val)):
+            val = (val.shape,tuple(np.asarray(val,dtype=float).ravel().tolist()))
+        elif type(val) == list:
+            val = tuple(val)
+        key.append(val)
+    return tuple(key)
+
+def _node_match_cell(node_dict,attribute,tolerance):
+    return tuple(np.floor(np.asarray(node_dict[attribute],dtype=float).ravel()/tolerance).astype(int).tolist())
+
 def node_map(
     G_source,
     G_target,
     verbose = False,
+    attributes = node_match_attributes_default,
+    tolerance = None,
     ):
     """
     Purpose: To find the matches of all the nodes
     of one graph to another:
 
     Pseudocode: 
+    1) Hash the compared attributes (see node_match_key) of every
+       target node into a dict: (limb,key) --> target nodes
     For each node in the source graph
-        Iterate through the target graph nodes
-            Compare the certain properties, and if all match then assign as the correct mapping
+    2) Look up the target nodes on the same limb with the same key
+    3) If no exact match and a tolerance is given: look in the
+       neighboring cells of a grid (cell size = tolerance) over the first
+       attribute, and keep the nodes with all attributes within the tolerance
             
+    tolerance: allowed absolute difference (float noise) for
+    nodes without an exact match (None = exact matches only)
             
     nxu.node_map(
         G_source = G_ax,
@@ -817,25 +1132,39 @@ def node_map(
         verbose = True
     )
     """
+    attributes = list(attributes)
     source_to_target_map = dict()
+    
+    source_index = nxu.limb_index(G_source)
+    target_index = nxu.limb_index(G_target)
+    
+    target_lookup = dict()
+    for nt,limb_idx in zip(target_index["nodes"],target_index["limb"]):
+        key = (limb_idx,nxu.node_match_key(G_target.nodes[nt],attributes))
+        target_lookup.setdefault(key,[]).append(nt)
+        
+    target_grid = None
 
-    for n in nxu.limb_branch_nodes(G_source):
-
-        limb_idx = nxu.limb_from_node_name(n)
-        matching_nodes = []
-        for nt in nxu.limb_branch_nodes(G_target):
-
-            limb_idx_t = nxu.limb_from_node_name(nt)
-            if limb_idx != limb_idx_t:
-                continue
-
-            match_result = nxu.node_match_by_dict(
-                G_source.nodes[n],
-                G_target.nodes[nt],
-            )
-
-            if match_result:
-                matching_nodes.append(nt)
+    for n,limb_idx in zip(source_index["nodes"],source_index["limb"]):
+        
+        matching_nodes = target_lookup.get(
+            (limb_idx,nxu.node_match_key(G_source.nodes[n],attributes)),[])
+        
+        if len(matching_nodes) == 0 and tolerance is not None:
+            if target_grid is None:
+                target_grid = dict()
+                for nt,limb_idx_t in zip(target_index["nodes"],target_index["limb"]):
+                    cell = nxu._node_match_cell(G_target.nodes[nt],attributes[0],tolerance)
+                    target_grid.setdefault((limb_idx_t,cell),[]).append(nt)
+                    
+            cell = np.array(nxu._node_match_cell(G_source.nodes[n],attributes[0],tolerance))
+            candidates = []
+            for offset in itertools.product([-1,0,1],repeat=len(cell)):
+                candidates += target_grid.get((limb_idx,tuple((cell + offset).tolist())),[])
+                
+            matching_nodes = [nt for nt in candidates if np.all([
+                np.allclose(G_source.nodes[n][a],G_target.nodes[nt][a],rtol=0,atol=tolerance)
+                for a in attributes])]
 
         if verbose:
             print(f"Node {n} --> {matching_nodes}")
@@ -865,11 +1194,13 @@ def node_map(
 def nodes_without_match(
     G_source,
     G_target,
-    verbose = False):
+    verbose = False,
+    tolerance = None):
     
     curr_map = nxu.node_map(
         G_source,
-        G_target)
+        G_target,
+        tolerance = tolerance)
     
     no_map = np.array([k for k,v in curr_map.items() if v is None])
     
@@ -944,6 +1275,96 @@ def skeleton_coordinates_from_G(
 from pykdtree.kdtree import KDTree
 import pandas as pd
 
+def skeleton_point_index(G):
+    """
+    Purpose: One KDTree over the skeleton points of
+    all the limb branch nodes of the graph (each point
+    labeled with the position of its node)
+
+    The index is a registered derived index of nxg.NeuronDiGraph
+    (kept until a node, edge or skeleton_data is changed)
+
+    Returns: dict(nodes = array of nodes,kdtree = KDTree,
+    labels = node position of every point)
+
+    Ex: 
+    index = nxu.skeleton_point_index(nxu.limb_graph(G,2))
+    """
+    return nxg.derived_index(G,"skeleton_point_index")
+
+def _skeleton_point_index_build(G):
+    nodes = nxu.limb_branch_nodes(G)
+    skeletons = [G.nodes[n]["skeleton_data"] for n in nodes]
+    labels = np.repeat(np.arange(len(nodes)),[len(k) for k in skeletons])
+    points = np.vstack(skeletons) if len(skeletons) > 0 else np.zeros((0,3))
+    index = dict(
+        nodes = np.array(nodes),
+        kdtree = KDTree(points) if len(points) > 0 else None,
+        labels = labels,
+    )
+    return index
+
+def _skeleton_point_index_update(G,index,entries):
+    return nxg.keep_if_attributes_unchanged(index,entries,["skeleton_data"])
+
+nxg.register_derived_index(
+    "skeleton_point_index",
+    _skeleton_point_index_build,
+    _skeleton_point_index_update)
+
+def closest_nodes_to_coordinates(
+    G,
+    coordinates,
+    index = None,
+    n_neighbors = 8,
+    ):
+    """
+    Purpose: For every coordinate, the smallest distance to the
+    skeleton of the limb branch nodes and all the nodes at
+    exactly that distance (in node order), from one batched
+    query of the skeleton point index
+
+    Pseudocode: 
+    1) Query the n_neighbors closest skeleton points of all coordinates
+    2) For coordinates whose n_neighbors-th point is still at the min
+       distance (ex: many nodes sharing an endpoint) query more points
+    3) The closest nodes are the labels of the points at the min distance
+
+    Returns: min_dist array, list of node arrays
+
+    Ex:
+    min_dist,min_nodes = nxu.closest_nodes_to_coordinates(G_limb,split_coordinates)
+    """
+    if index is None:
+        index = nxu.skeleton_point_index(G)
+    coordinates = np.array(coordinates).reshape(-1,3)
+    n_points = len(index["labels"])
+    if n_points == 0:
+        raise Exception("No skeleton points to query")
+    
+    min_dist = np.zeros(len(coordinates))
+    min_nodes = [None]*len(coordinates)
+    to_query = np.arange(len(coordinates))
+    k = n_neighbors
+    while len(to_query) > 0:
+        k = min(k,n_points)
+        dist,pt_idx = index["kdtree"].query(coordinates[to_query],k=k)
+        dist = dist.reshape(len(to_query),k)
+        pt_idx = pt_idx.reshape(len(to_query),k)
+        
+        requery = []
+        for j,c_idx in enumerate(to_query):
+            if k < n_points and dist[j,-1] == dist[j,0]:
+                requery.append(c_idx)
+                continue
+            at_min = pt_idx[j][dist[j] == dist[j,0]].astype(int)
+            min_dist[c_idx] = dist[j,0]
+            min_nodes[c_idx] = index["nodes"][np.unique(index["labels"][at_min])]
+        to_query = np.array(requery,dtype=int)
+        k = 2*k
+        
+    return min_dist,min_nodes
+
 def split_location_node_map_df(
     G,
     split_locations,
@@ -966,8 +1387,9 @@ def split_location_node_map_df(
     Pseudocode: 
     Iterate through all filters and limbs to work
     with the split locations and possible nodes to match with
-
-
+    (all the split locations of a filter/limb are matched to the closest
+    node skeleton in one query of a KDTree over the limb skeleton points,
+    built once per limb)
 
     """
 
@@ -980,9 +1402,11 @@ def split_location_node_map_df(
             verbose = verbose )
 
     if nodelist is not None: 
-        G_search = G.subgraph(nodelist).copy()
+        G_search = G.subgraph(nodelist)
     else:
         G_search = G
+    search_index = nxu.limb_index(G_search)
+    skeleton_indexes = dict()
 
     split_counter = 0
     for filter_name,filter_splits in split_locations.items():
@@ -990,7 +1414,7 @@ def split_location_node_map_df(
             filter_splits = {"L-1":filter_splits}
 
         for limb_name,split_loc in filter_splits.items():
-            G_limb = nxu.limb_graph(G_search,limb_name)
+            G_limb = nxu.limb_graph(G_search,limb_name,index=search_index)
 
 #             sk_pts,sk_names = nxu.skeleton_coordinates_from_G(
 #                 G_limb,
@@ -999,6 +1423,23 @@ def split_location_node_map_df(
 
             if len(G_limb) == 0:
                 raise Exception("Empty graph")
+                
+            """
+            4/13: Want to determine the node that has the lowest average distance
+            
+            Pseudocode:
+            1) Build one KDTree on the skeleton points of all the nodes
+            2) Find the closest distance of every split to each node skeleton
+            3) Keep the name and distance of the closest nodes
+            
+            """
+            if limb_name not in skeleton_indexes:
+                skeleton_indexes[limb_name] = nxu.skeleton_point_index(G_limb)
+            split_min_dist,split_min_nodes = nxu.closest_nodes_to_coordinates(
+                G_limb,
+                split_loc,
+                index = skeleton_indexes[limb_name],
+            )
 
             for i,s in enumerate(split_loc):
                 
@@ -1007,33 +1448,8 @@ def split_location_node_map_df(
                                    coord = s,
                                   filter_name = filter_name)
                 
-                """
-                4/13: Want to determine the node that has the lowest average distance
-                
-                Pseudocode:
-                1) Iterate through all of the nodes
-                2) Build a KDTree on their skeleton points
-                3) Find the average distance
-                4) Add to name and distance to list to find min later
-                
-                """
-                sk_names = []
-                dist_from_split = []
-                for n in nxu.limb_branch_nodes(G_limb):
-                    '''    
-                    dist_from_split = np.linalg.norm(sk_pts - s,axis = 1)
-                    '''
-                    n_kd = KDTree(G_limb.nodes[n]["skeleton_data"])
-                    dist,_ = n_kd.query(s.reshape(-1,3))
-                    sk_names.append(n)
-                    dist_from_split.append(np.mean(dist))
-                    
-                sk_names = np.array(sk_names)
-                dist_from_split = np.array(dist_from_split)
-
-                min_dist = np.min(dist_from_split)
-                min_arg = np.where(dist_from_split == min_dist)[0]
-                min_nodes = sk_names[min_arg]
+                min_dist = split_min_dist[i]
+                min_nodes = split_min_nodes[i]
 
                 if len(min_nodes) != 1 and error_if_no_one_match:
                     raise Exception(f"Split {i} ({s}) had min_dist ({min_dist}) had more than one match ({min_nodes})")
@@ -1106,7 +1522,7 @@ def set_auto_proof_filter_attribute(
         filter_attribute_name = nxu.auto_proof_filter_name_default
 
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
 
     xu.set_node_attribute(
         G,
@@ -1124,7 +1540,8 @@ def set_auto_proof_filter_attribute(
             else:
                 if G.nodes[n][filter_attribute_name] is None:
                     G.nodes[n][filter_attribute_name] = []
-                G.nodes[n][filter_attribute_name].append(f)
+                # a new list (the old one can be shared with the graph this was copied from)
+                G.nodes[n][filter_attribute_name] = G.nodes[n][filter_attribute_name] + [f]
 
     if verbose:
         print(f"nodes with filter attributes")
@@ -1163,6 +1580,7 @@ def soma_connected_nodes(
 
 
 import numpy as np
+import neuron_nx_array as nxa
 def most_upstream_nodes(
     G,
     nodes=None,
@@ -1171,7 +1589,8 @@ def most_upstream_nodes(
     ):
     """
     Purpose: To get a count of the number of
-    downstream nodes
+    downstream nodes (subtree sizes from nxa.subtree_sizes
+    for directed graphs)
     
     Ex: 
     nxu.most_upstream_nodes(
@@ -1185,7 +1604,13 @@ def most_upstream_nodes(
         
     nodes = np.array(nodes)
 
-    down_count = np.array([xu.n_all_downstream_nodes(G,k) for k in nodes])
+    if nxa.is_array_graph(G):
+        down_count = G.n_all_downstream_nodes(nodes)
+    elif G.is_directed():
+        subtree_size = nxa.subtree_sizes(G)["size"]
+        down_count = np.array([subtree_size[k] - 1 for k in nodes])
+    else:
+        down_count = np.array([xu.n_all_downstream_nodes(G,k) for k in nodes])
     down_count_idx_sorted = np.flip(np.argsort(down_count))
     nodes_sorted = nodes[down_count_idx_sorted]
     down_count_sorted = down_count[down_count_idx_sorted]
@@ -1246,7 +1671,7 @@ def limb_graphs_from_soma_connected_nodes(
     for node in soma_conn_nodes:
         if verbose:
             print(f"-- Working on soma node {node}")
-        limb_graph = nxu.limb_graph(G,most_upstream_node=node)
+        limb_graph = nxu.limb_graph(G,most_upstream_node=node,as_view=False)
 
         if plot:
             most_up_node = xu.most_upstream_node(limb_graph)
@@ -1259,6 +1684,144 @@ def limb_graphs_from_soma_connected_nodes(
     return total_limb_graphs
 
 
+import weakref
+from collections import deque
+import neuron_nx_graph as nxg
+
+def soma_distance_index(
+    G,
+    distance_attribute = "skeletal_length",
+    destination_node = "S0",
+    verbose = False,
+    ):
+    """
+    Purpose: To compute the upstream and downstream soma
+    distance of every node in one top down traversal
+    (instead of walking back to the soma from each node)
+
+    upstream distance = sum of distance_attribute of all nodes
+    between the node and destination_node (not including either)
+    downstream distance = upstream distance + distance_attribute of the node
+
+    Pseudocode:
+    1) Start from the nodes without an upstream node (upstream distance 0)
+    2) Going down breadth first: child upstream distance =
+       parent upstream distance + parent length (0 below the destination node)
+
+    For nxg.NeuronDiGraph the index is a registered derived index:
+    after the graph is changed only the subtrees below the changed nodes,
+    edges or lengths are recomputed (see nxg.derived_index).
+    For plain networkx graphs it is recomputed on every call
+
+    Returns: dict(upstream = {node:distance},downstream = {node:distance})
+
+    Ex:
+    soma_dist = nxu.soma_distance_index(G)
+    soma_dist["upstream"]["L0_19"]
+    """
+    if nxa.is_array_graph(G):
+        upstream = G.upstream_distances(distance_attribute,destination_node)
+        lengths = G.column(distance_attribute,fill_value = 0)
+        names = list(G.names)
+        return dict(
+            upstream = dict(zip(names,upstream.tolist())),
+            downstream = dict(zip(names,(upstream + lengths).tolist())),
+        )
+
+    st = time.time()
+    index = nxg.derived_index(G,"soma_distance",distance_attribute,destination_node)
+    if verbose:
+        print(f"Soma distance index for {len(index['upstream'])} nodes: {time.time() - st:.4f}")
+    return index
+
+def _soma_distances_from_nodes(
+    G,
+    upstream,
+    downstream,
+    start_nodes,
+    distance_attribute,
+    destination_node,
+    ):
+    """
+    Purpose: To (re)compute the soma distances of the subtrees
+    of the start nodes from the distance of their upstream node
+    """
+    node_dicts = G.nodes
+    succ = G.succ
+    queue = deque()
+    for n in start_nodes:
+        parents = list(G.pred[n])
+        if len(parents) == 0:
+            upstream[n] = 0
+        elif parents[0] not in downstream:
+            return False
+        else:
+            upstream[n] = 0 if parents[0] == destination_node else downstream[parents[0]]
+        queue.append(n)
+
+    while queue:
+        n = queue.popleft()
+        if n == destination_node:
+            # the soma has no length of its own (the distances start at it)
+            downstream[n] = upstream[n]
+            child_dist = 0
+        else:
+            downstream[n] = upstream[n] + node_dicts[n][distance_attribute]
+            child_dist = downstream[n]
+        for c in succ[n]:
+            upstream[c] = child_dist
+            queue.append(c)
+    return True
+
+def _soma_distance_index_build(G,distance_attribute,destination_node):
+    upstream = dict()
+    downstream = dict()
+    nxu._soma_distances_from_nodes(
+        G,upstream,downstream,
+        [n for n in G.nodes() if len(G.pred[n]) == 0],
+        distance_attribute,destination_node)
+    return dict(upstream = upstream,downstream = downstream)
+
+def _soma_distance_index_update(G,index,entries,distance_attribute,destination_node):
+    """
+    Purpose: To update the soma distances from the journal entries
+    (only the subtrees of the changed nodes are recomputed)
+    """
+    upstream,downstream = index["upstream"],index["downstream"]
+    start_nodes = []
+    for _,operation,args in entries:
+        if operation == "node_attr":
+            n,key = args
+            if n is None:
+                return None
+            if key is None or key == distance_attribute:
+                start_nodes.append(n)
+        elif operation == "add_node":
+            start_nodes.append(args[0])
+        elif operation == "remove_node":
+            n,children = args
+            if n == destination_node:
+                return None
+            upstream.pop(n,None)
+            downstream.pop(n,None)
+            start_nodes += children
+        elif operation in ("add_edge","remove_edge"):
+            start_nodes.append(args[1])
+        else:
+            return None
+
+    start_nodes = [n for n in dict.fromkeys(start_nodes) if n in G]
+    for n in start_nodes:
+        if not nxu._soma_distances_from_nodes(
+            G,upstream,downstream,[n],distance_attribute,destination_node):
+            return None
+    return index
+
+nxg.register_derived_index(
+    "soma_distance",
+    _soma_distance_index_build,
+    _soma_distance_index_update)
+
 def distance_from_node_to_soma(
     G,
     node,
@@ -1275,6 +1838,19 @@ def distance_from_node_to_soma(
     Pseudocode: 
     1) 
     """
+    if nxa.is_array_graph(G) and not verbose:
+        i = G.idx(node)
+        path_length = G.upstream_distances(distance_attribute,destination_node)[i]
+        if include_self_distance:
+            path_length += G.column(distance_attribute)[i]
+        if return_path:
+            node_path = []
+            for n in G.path_to_root(node,include_self=include_self_distance):
+                if n == destination_node:
+                    break
+                node_path.append(n)
+            return path_length,node_path
+        return path_length
 
 
     total_lengths = []
@@ -1327,6 +1903,9 @@ def distance_upstream_from_soma(
     if from_attributes:
         return G.nodes[node]["soma_distance_skeletal"]
     
+    if nxg.graph_version(G) is not None and not verbose:
+        return nxu.soma_distance_index(G,**kwargs)["upstream"][node]
+    
     return distance_from_node_to_soma(
     G,
     node,
@@ -1354,6 +1933,9 @@ def distance_downstream_from_soma(
     if from_attributes:
         return G.nodes[node]["soma_distance_skeletal"] + G.nodes[node]["skeletal_length"]
     
+    if nxg.graph_version(G) is not None and not verbose:
+        return nxu.soma_distance_index(G,**kwargs)["downstream"][node]
+    
     return distance_from_node_to_soma(
     G,
     node,
@@ -1371,11 +1953,25 @@ def distance_from_soma_df(
     from_attributes=False):
     """
     Purpose: Find all the soma distances of 
-    all the nodes
+    all the nodes (from one soma distance index
+    unless from_attributes)
     """
     if nodes is None:
         nodes = nxu.limb_branch_nodes(G)
 
+    if nxa.is_array_graph(G) and not from_attributes:
+        idx = G.idxs(nodes)
+        soma_distance = G.upstream_distances()[idx]
+        if distance_type == "downstream":
+            soma_distance = soma_distance + G.column("skeletal_length")[idx]
+        return pd.DataFrame(dict(node = list(nodes),soma_distance = soma_distance))
+
+    if not from_attributes:
+        soma_dist = nxu.soma_distance_index(G)[distance_type]
+        return pd.DataFrame(dict(
+            node = list(nodes),
+            soma_distance = np.array([soma_dist[n] for n in nodes],dtype=float)))
+
     dist_dict = [{"node":n,"soma_distance":getattr(nxu,f"distance_{distance_type}_from_soma")(G,n,from_attributes=from_attributes)}
                 for n in nodes]
 
@@ -1569,7 +2165,7 @@ def soma_filter_by_complete_graph(
     nxu.draw_tree(G_no_soma)
     """
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
     
     if connect_previous_touching_soma_nodes:
         soma_conn_nodes = nxu.soma_connected_nodes(G)
@@ -1635,8 +2231,8 @@ def filter_axon_on_dendrite_splits_to_most_upstream(
     
     Pseudocode:
     1) Get all of the nodes that are in axon on dendrite mergers
-    2) For each node:
-    a. Get either just the parent or all of the upstream node
+    2) For each node (from the tree index in one pass):
+    a. Check either just the parent or all of the upstream nodes
     b. add node to list ot be cleared if has upstream axon on dendrite
     
     Ex: 
@@ -1646,23 +2242,21 @@ def filter_axon_on_dendrite_splits_to_most_upstream(
     """
     axon_on_dendrite_nodes = nxu.nodes_with_auto_proof_filter_type(G,"axon_on_dendrite")
     
+    has_upstream = nxa.tree_index(G).has_upstream_in_nodes(
+        axon_on_dendrite_nodes,
+        parent_only = filter_out_only_if_parent_in_split)
+    
     if not inplace:
-        G = copy.deepcopy(G)
+        G = nxg.copy_G(G)
     
     if verbose:
         print(f"axon_on_dendrite_nodes ({len(axon_on_dendrite_nodes)}) = {axon_on_dendrite_nodes}")
         
     nodes_to_clear = []
-    for n in axon_on_dendrite_nodes:
-        if filter_out_only_if_parent_in_split:
-            up_nodes = [xu.upstream_node(G,n)]
-        else:
-            up_nodes = xu.all_upstream_nodes(G,n)
-            
-        ax_on_dendr_upstream = np.intersect1d(axon_on_dendrite_nodes,up_nodes)
-        if len(ax_on_dendr_upstream) > 0:
+    for n,n_has_upstream in zip(axon_on_dendrite_nodes,has_upstream):
+        if n_has_upstream:
             if verbose:
-                print(f"Removing node {n} because had upstream axon on dendrite: {ax_on_dendr_upstream}")
+                print(f"Removing node {n} because had upstream axon on dendrite")
             nodes_to_clear.append(n)
             
     G = nxu.clear_nodes_auto_proof_filter_feature(G,nodes_to_clear,verbose = verbose)
@@ -2134,6 +2728,7 @@ def inter_attribute_intervals_dict_from_neuron_G(
         )
         
         limb_graphs,limb_idxs = nxu.all_limb_graphs(G,return_idxs=True)
+        soma_dist = nxu.soma_distance_index(G)["upstream"]
 
         if verbose:
             print(f"# of limb graphs: {len(limb_graphs)}")
@@ -2159,7 +2754,7 @@ def inter_attribute_intervals_dict_from_neuron_G(
             for n in G_limb.nodes():
                 curr_dt = dict(branch=n,
                                    compartment=nxu.compartment_from_node(G_limb,n),
-                                     skeletal_distance_to_soma = nxu.distance_upstream_from_soma(G,node=n),
+                                     skeletal_distance_to_soma = soma_dist[n],
                                    skeletal_length = G_limb.nodes[n]["skeletal_length"],
                                     width = nxu.width_from_node(G_limb,n))
                 if branch_features_to_add is not None:
@@ -2376,10 +2971,14 @@ def filter_graph(
     filter_away_soma = True,
     output_graph_type = "Graph",
     verbose = False,
+    feature_cache = None,
     ):
     """
     Purpose: To filter the graph object
     before the GNN processes
+
+    feature_cache: on disk cache of the computed features
+    (FeatureCache or folder, see neuron_nx_feature_cache)
     
     Pseudocode: 
     1) Reduces to only dendrite subgraph
@@ -2394,6 +2993,9 @@ def filter_graph(
     
     if features_to_output is None:
         features_to_output = nxf.features_to_output_for_gnn
+
+    # versioned graph so the indices and attribute schema are reused
+    G = nxg.to_neuron_graph(G)
     
     if debug:
         print('L0_123' in G)
@@ -2459,6 +3061,7 @@ def filter_graph(
                     features=features_to_output,
                     inplace = False,
                     verbose = verbose,
+                    feature_cache = feature_cache,
                 )
     else:
         G_with_feats = G_dist_filt
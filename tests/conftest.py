@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import networkx as nx
+import pytest
+
+package_dir = Path(__file__).resolve().parents[1] / "neuron_morphology_tools"
+sys.path.insert(0,str(package_dir))
+
+sample_filepath = (Path(__file__).resolve().parents[1] / "Applications" / "Data"
+                   / "864691134884771066_0_proofread_G.pbz2")
+
+
+def same_value(a,b):
+    """
+    Deep equality of node values (numpy arrays compared by value)
+    """
+    if isinstance(a,np.ndarray) or isinstance(b,np.ndarray):
+        return (isinstance(a,np.ndarray) and isinstance(b,np.ndarray)
+                and a.shape == b.shape and np.array_equal(a,b,equal_nan=True))
+    if isinstance(a,dict):
+        return (isinstance(b,dict) and a.keys() == b.keys()
+                and all(same_value(a[k],b[k]) for k in a))
+    if isinstance(a,(list,tuple)):
+        return (isinstance(b,(list,tuple)) and len(a) == len(b)
+                and all(same_value(x,y) for x,y in zip(a,b)))
+    if isinstance(a,float) and isinstance(b,float) and np.isnan(a) and np.isnan(b):
+        return True
+    return a == b
+
+def same_graph(G1,G2):
+    if list(G1.nodes()) != list(G2.nodes()) or set(G1.edges()) != set(G2.edges()):
+        return False
+    return all(same_value(dict(G1.nodes[n]),dict(G2.nodes[n])) for n in G1.nodes())
+
+
+@pytest.fixture
+def sample_G():
+    import neuron_nx_codecs as nxcodec
+    return nxcodec.load_pickle(sample_filepath)
+
+@pytest.fixture
+def small_G():
+    """
+    Small neuron tree: soma S0 with two limbs
+    """
+    G = nx.DiGraph()
+    G.graph.update(segment_id = 1,split_index = 0,nucleus_id = 2)
+    G.add_node("S0",mesh_volume = 10.0)
+    edges = [("S0","L0_0"),("L0_0","L0_1"),("L0_0","L0_2"),("S0","L1_0"),("L1_0","L1_1")]
+    G.add_edges_from(edges)
+    rng = np.random.default_rng(0)
+    for i,n in enumerate(n for n in G.nodes() if n != "S0"):
+        G.nodes[n].update(
+            skeletal_length = float(rng.uniform(1,10)),
+            n_spines = i,
+            spine_volume_density = 0 if i % 2 else 0.5,
+            compartment = "basal" if i % 2 else "apical",
+            axon_compartment = "dendrite",
+            skeleton_vector_upstream = rng.normal(size=3),
+            skeleton_vector_downstream = rng.normal(size=3),
+            width_new = dict(no_spine_median_mesh_center = float(i),median_mesh_center = 1.0),
+            skeleton_data = rng.normal(size=(i+2,3)),
+            synapse_data = [dict(syn_id = j,volume = float(j),upstream_dist = 1.0) for j in range(i)],
+            labels = ["a"] if i % 2 else [],
+            auto_proof_filter = None,
+        )
+    return G
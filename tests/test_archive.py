@@ -0,0 +1,65 @@
+import pytest
+
+import neuron_nx_archive as nxar
+from conftest import same_graph
+
+
+def test_round_trip_graphs_and_pickles(tmp_path,small_G):
+    filepath = tmp_path / "neurons"
+    with nxar.NeuronArchive(filepath,mode="a") as ar:
+        key = ar.append(small_G)
+        ar.append([dict(a=1)],key=(5,0),file_format="pickle",codec="zlib")
+        ar.append([dict(a=2)],key=(6,0),file_format="pickle")
+
+    ar = nxar.NeuronArchive(filepath)
+    assert len(ar) == 3
+    assert same_graph(small_G,ar.get(key))
+    assert ar.get((5,0)) == [dict(a=1)]
+    assert ar.get((6,0)) == [dict(a=2)]
+    assert [k for k,_ in ar.items()] == [key,nxar.normalize_key((5,0)),nxar.normalize_key((6,0))]
+    ar.close()
+
+def test_latest_entry_wins_and_index_rebuilt(tmp_path):
+    filepath = tmp_path / "neurons"
+    with nxar.NeuronArchive(filepath,mode="a") as ar:
+        ar.append("old",key=(1,0),file_format="pickle")
+        ar.append("new",key=(1,0),file_format="pickle")
+    (tmp_path / f"neurons{nxar.file_extension_default}{nxar.index_extension}").unlink()
+    with nxar.NeuronArchive(filepath) as ar:
+        assert ar.get((1,0)) == "new"
+
+def test_export_closes_archive_it_opens(tmp_path,small_G,monkeypatch):
+    pytest.importorskip("networkx_utils")
+    import neuron_nx_io as nxio
+
+    opened = []
+    class TrackedArchive(nxar.NeuronArchive):
+        def __init__(self,*args,**kwargs):
+            super().__init__(*args,**kwargs)
+            opened.append(self)
+    monkeypatch.setattr(nxar,"NeuronArchive",TrackedArchive)
+
+    nxio.export_GNN_info_dict(
+        small_G,
+        features_to_output = ["skeletal_length"],
+        archive = str(tmp_path / "out"),
+        distance_threshold = None,
+        remove_starter_branches = False,
+        return_G_before_output = True,
+    )
+    assert len(opened) == 1 and opened[0]._f is None
+
+def test_export_leaves_passed_archive_open(tmp_path,small_G):
+    pytest.importorskip("networkx_utils")
+    import neuron_nx_io as nxio
+
+    with nxar.NeuronArchive(str(tmp_path / "out"),mode="a") as ar:
+        nxio.export_GNN_info_dict(
+            small_G,
+            features_to_output = ["skeletal_length"],
+            archive = ar,
+            distance_threshold = None,
+            remove_starter_branches = False,
+            return_G_before_output = True,
+        )
+        assert ar._f is not None
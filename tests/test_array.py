@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import neuron_nx_array as nxa
+from conftest import same_graph
+
+
+def test_round_trip(small_G):
+    assert same_graph(small_G,nxa.from_G(small_G).to_G())
+
+def test_node_writes_are_kept(small_G):
+    G = nxa.from_G(small_G)
+    G.nodes["L0_1"]["n_spines"] = 7
+    G.nodes["L0_1"]["compartment"] = "axon_long_name"
+    G.nodes["S0"]["skeletal_length"] = 3.0
+    G.nodes["L1_0"]["new_attribute"] = [1,2]
+    assert G.nodes["L0_1"]["n_spines"] == 7
+    assert G.nodes["L0_1"]["compartment"] == "axon_long_name"
+    assert G.nodes["S0"]["skeletal_length"] == 3.0
+    assert G.nodes["L1_0"]["new_attribute"] == [1,2]
+    assert "new_attribute" not in G.nodes["L0_1"]
+
+    for n,d in [("L0_1",dict(n_spines = 7,compartment = "axon_long_name")),
+                ("S0",dict(skeletal_length = 3.0)),
+                ("L1_0",dict(new_attribute = [1,2]))]:
+        small_G.nodes[n].update(d)
+    assert same_graph(small_G,G.to_G())
+
+def test_node_writes_keep_column_type(small_G):
+    G = nxa.from_G(small_G)
+    G.nodes["L0_2"]["n_spines"] = 10
+    assert G.columns["n_spines"].dtype == np.int64
+    G.nodes["L0_2"]["n_spines"] = 1.5
+    assert G.nodes["L0_2"]["n_spines"] == 1.5
+    assert G.nodes["L0_1"]["n_spines"] == small_G.nodes["L0_1"]["n_spines"]
+
+def test_node_delete(small_G):
+    G = nxa.from_G(small_G)
+    del G.nodes["L0_1"]["n_spines"]
+    assert "n_spines" not in G.nodes["L0_1"]
+    with pytest.raises(KeyError):
+        G.nodes["L0_1"]["n_spines"]
+    del small_G.nodes["L0_1"]["n_spines"]
+    assert same_graph(small_G,G.to_G())
+
+def test_set_values_typed(small_G):
+    G = nxa.from_G(small_G)
+    nodes = ["L0_1","L1_1"]
+    G.set_values("n_spines",G.idxs(nodes),np.array([5,6]))
+    assert G.columns["n_spines"].dtype == np.int64
+    assert [G.nodes[n]["n_spines"] for n in nodes] == [5,6]
+
+    G.set_values("label",G.idxs(nodes),np.array([True,False]))
+    assert G.columns["label"].dtype == bool
+    assert "label" not in G.nodes["S0"]
+    G.set_values("label",np.arange(len(G)),np.ones(len(G),dtype=bool))
+    assert "label" not in G.present
+
+    G.set_values("compartment",G.idxs(["L0_1"]),["a_much_longer_name"])
+    assert G.nodes["L0_1"]["compartment"] == "a_much_longer_name"
+    assert G.nodes["L0_2"]["compartment"] == small_G.nodes["L0_2"]["compartment"]
+
+    G.set_values("n_spines",G.idxs(["L0_2"]),[0.5])
+    assert G.nodes["L0_2"]["n_spines"] == 0.5
+    assert G.nodes["L0_1"]["n_spines"] == 5
+
+def test_attribute_schema_of_nodes(small_G):
+    pytest.importorskip("networkx_utils")
+    import neuron_nx_feature_processing as nxf
+    G = nxa.from_G(small_G)
+    assert nxf.node_attribute_names(G)["counts"] == nxf.node_attribute_names(small_G)["counts"]
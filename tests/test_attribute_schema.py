@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_array as nxa
+import neuron_nx_feature_processing as nxf
+import neuron_nx_utils as nxu
+
+
+def test_schema_kept_for_loaded_graph(tmp_path,small_G):
+    filepath = nxu.save_G(small_G,str(tmp_path / "g"),codec = "zlib",delete_dynamic_attributes = False)
+    G = nxu.load_G(filepath)
+    index = nxf.node_attribute_names(G)
+    assert nxf.has_feature(G,"n_spines")
+    assert not nxf.has_feature(G,"t_new")
+    assert nxf.node_attribute_names(G) is index
+
+    G.nodes["L0_1"]["t_new"] = 1.0
+    assert nxf.has_feature(G,"t_new")
+    assert nxf.attribute_schema(G)["t_new"] == dict(dtype = "float",count = 1)
+    del G.nodes["L0_1"]["t_new"]
+    assert not nxf.has_feature(G,"t_new")
+
+def test_has_feature_array_graph(small_G):
+    G = nxa.from_G(small_G)
+    assert nxf.has_feature(G,"n_spines")
+    # only the soma has it
+    assert not nxf.has_feature(G,"mesh_volume")
+    assert not nxf.has_feature(G,"t_new")
+    G.nodes["L1_1"]["t_new"] = 1
+    assert nxf.has_feature(G,"t_new")
@@ -0,0 +1,45 @@
+import bz2
+import pickle
+
+import numpy as np
+import pytest
+
+import neuron_nx_codecs as nxcodec
+import neuron_nx_columnar as nxcol
+from conftest import same_graph,same_value
+
+obj = dict(x = np.arange(10.0),names = ["L0_0","L0_1"],label = None)
+
+
+@pytest.mark.parametrize("codec",nxcodec.available_codecs())
+def test_round_trip(codec):
+    assert same_value(nxcodec.loads_pickle(nxcodec.dumps_pickle(obj,codec=codec)),obj)
+    data = b"neuron" * 100
+    assert nxcodec.decompress(nxcodec.compress(data,codec=codec),codec) == data
+
+def test_default_codec_is_the_same_for_every_entry_point():
+    data = b"neuron" * 100
+    assert nxcodec.check_codec(None) == nxcodec.default_codec
+    assert nxcodec.compress(data) == nxcodec.compress(data,codec=None)
+    assert nxcodec.compress(data) == nxcodec.compress(data,codec=nxcodec.default_codec)
+    assert nxcodec.dumps_pickle(obj) == nxcodec.dumps_pickle(obj,codec=nxcodec.default_codec)
+
+def test_unknown_codec_raises():
+    with pytest.raises(Exception):
+        nxcodec.check_codec("not_a_codec")
+
+def test_dump_and_load_file(tmp_path,small_G):
+    filepath = nxcodec.dump_pickle(small_G,tmp_path / "g",codec="bz2")
+    assert str(filepath).endswith(nxcodec.file_extension_default)
+    assert nxcodec.is_codec_pickle_file(filepath)
+    assert same_graph(small_G,nxcodec.load_pickle(tmp_path / "g"))
+
+def test_legacy_bz2_pickle(tmp_path):
+    filepath = tmp_path / "legacy.pbz2"
+    filepath.write_bytes(bz2.compress(pickle.dumps(obj)))
+    assert same_value(nxcodec.load_pickle(filepath),obj)
+
+def test_containers_are_uncompressed_without_codec(tmp_path,small_G):
+    filepath = nxcol.write_G(small_G,tmp_path / "g")
+    with nxcol.open_G(filepath) as G_col:
+        assert set(info.get("codec","none") for info in G_col.header["blocks"].values()) == {"none"}
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import neuron_nx_columnar as nxcol
+from conftest import same_graph,same_value
+
+
+def test_round_trip_small(tmp_path,small_G):
+    filepath = nxcol.write_G(small_G,tmp_path / "g")
+    G = nxcol.read_G(filepath)
+    assert same_graph(small_G,G)
+    assert dict(G.graph) == dict(small_G.graph)
+
+def test_mixed_int_float_column_keeps_ints(tmp_path,small_G):
+    filepath = nxcol.write_G(small_G,tmp_path / "g")
+    G = nxcol.read_G(filepath)
+    for n in small_G.nodes():
+        if "spine_volume_density" not in small_G.nodes[n]:
+            continue
+        assert type(G.nodes[n]["spine_volume_density"]) is type(small_G.nodes[n]["spine_volume_density"])
+    with nxcol.open_G(filepath) as G_col:
+        assert type(G_col.node_value("spine_volume_density","L0_1")) is int
+
+def test_round_trip_sample(tmp_path,sample_G):
+    filepath = nxcol.write_G(sample_G,tmp_path / "g")
+    G = nxcol.read_G(filepath)
+    assert same_graph(sample_G,G)
+
+@pytest.mark.parametrize("codec",["zlib","bz2","lzma"])
+def test_round_trip_compressed(tmp_path,small_G,codec):
+    filepath = nxcol.write_G(small_G,tmp_path / "g",codec=codec)
+    assert same_graph(small_G,nxcol.read_G(filepath))
+
+def test_lazy_attributes(tmp_path,small_G):
+    filepath = nxcol.write_G(small_G,tmp_path / "g")
+    G = nxcol.read_G(filepath,lazy_attributes=["skeleton_data","synapse_data"])
+    assert same_value(G.nodes["L0_2"]["skeleton_data"],small_G.nodes["L0_2"]["skeleton_data"])
+    assert same_graph(small_G,G)
+
+def test_load_G_without_extension(tmp_path,small_G):
+    pytest.importorskip("networkx_utils")
+    import neuron_nx_utils as nxu
+    nxu.save_G(small_G,str(tmp_path / "g"),file_format="columnar",delete_dynamic_attributes=False)
+    assert same_graph(small_G,nxu.load_G(str(tmp_path / "g")))
+    nxu.save_G(small_G,str(tmp_path / "h"),codec="zlib",delete_dynamic_attributes=False)
+    assert same_graph(small_G,nxu.load_G(str(tmp_path / "h")))
+
+@pytest.mark.parametrize("save_kwargs",[
+    dict(file_format = "columnar"),
+    dict(file_format = "columnar",codec = "zlib"),
+    dict(codec = "zlib"),
+    dict(),
+])
+def test_load_G_returns_neuron_graph(tmp_path,small_G,save_kwargs):
+    pytest.importorskip("networkx_utils")
+    import neuron_nx_graph as nxg
+    import neuron_nx_utils as nxu
+    filepath = nxu.save_G(small_G,str(tmp_path / "g"),delete_dynamic_attributes=False,**save_kwargs)
+    G = nxu.load_G(filepath)
+    assert isinstance(G,nxg.NeuronDiGraph)
+    assert same_graph(small_G,G)
+    assert nxu.soma_distance_index(G) is nxu.soma_distance_index(G)
@@ -0,0 +1,77 @@
+import copy
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_feature_processing as nxf
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+from conftest import same_graph
+
+features = ["skeletal_length","n_spines","skeleton_vector_upstream_theta","width_no_spine"]
+split_df = pd.DataFrame(dict(
+    node = ["L0_20","L0_19","L1_0"],
+    filter_name = ["axon_on_dendrite","axon_on_dendrite","high_degree_branching"]))
+
+# the inplace = False paths that copy with nxg.copy_G instead of copy.deepcopy
+copying_calls = {
+    "add_node_feature":lambda G: nxf.add_node_feature(G,features[2:],inplace = False),
+    "add_any_missing_node_features":lambda G: nxf.add_any_missing_node_features(G,features),
+    "filter_G_features":lambda G: nxf.filter_G_features(G,features = features),
+    "delete_attributes":lambda G: nxu.delete_attributes(G,inplace = False),
+    "remove_node":lambda G: nxu.remove_node(G,["L0_25","L0_22","L0_19"]),
+    "remove_node_one_at_a_time":lambda G: nxu.remove_node(G,["L0_25","L0_22","L0_19"],batch = False),
+    "remove_node_downstream":lambda G: nxu.remove_node(G,["L0_25","L1_0"],remove_all_downstream_nodes = True),
+    "remove_small_starter_branches":lambda G: nxu.remove_small_starter_branches(
+        G,skeletal_length_min = 20_000,verbose = False),
+    "soma_filter_by_complete_graph":lambda G: nxu.soma_filter_by_complete_graph(G),
+    "set_auto_proof_filter_attribute":lambda G: nxu.set_auto_proof_filter_attribute(
+        G,split_df = split_df,inplace = False),
+    "set_auto_proof_filter_attribute_lists":lambda G: nxu.set_auto_proof_filter_attribute(
+        G,split_df = split_df,inplace = False,
+        error_on_non_unique_node_names = False,filter_axon_on_dendrite_splits = False),
+    "filter_axon_on_dendrite_splits_to_most_upstream":
+        lambda G: nxu.filter_axon_on_dendrite_splits_to_most_upstream(G),
+}
+
+@pytest.fixture
+def labeled_G(sample_G):
+    for n in sample_G.nodes():
+        sample_G.nodes[n]["auto_proof_filter"] = None
+    for n in ["L0_20","L0_19","L0_11"]:
+        sample_G.nodes[n]["auto_proof_filter"] = "axon_on_dendrite"
+    return sample_G
+
+@pytest.mark.parametrize("name",list(copying_calls))
+def test_source_graph_unchanged(labeled_G,name):
+    before = copy.deepcopy(labeled_G)
+    G = copying_calls[name](labeled_G)
+
+    assert G is not labeled_G
+    assert same_graph(labeled_G,before)
+    assert labeled_G.graph == before.graph
+
+    # writes to the result (new values) do not reach the source
+    for n in list(G.nodes())[:5]:
+        assert G.nodes[n] is not labeled_G.nodes[n]
+        G.nodes[n]["skeletal_length"] = -1
+    assert same_graph(labeled_G,before)
+
+def test_copy_G_shares_values_until_replaced(small_G):
+    G = nxg.copy_G(small_G)
+    assert G.nodes["L0_1"]["skeleton_data"] is small_G.nodes["L0_1"]["skeleton_data"]
+    G.nodes["L0_1"]["skeleton_data"] = G.nodes["L0_1"]["skeleton_data"][1:]
+    G.add_edge("L0_1","L1_1")
+    G.graph["segment_id"] = 5
+    assert len(small_G.nodes["L0_1"]["skeleton_data"]) == len(G.nodes["L0_1"]["skeleton_data"]) + 1
+    assert not small_G.has_edge("L0_1","L1_1")
+    assert small_G.graph["segment_id"] == 1
+
+def test_auto_proof_filter_lists_not_shared(labeled_G):
+    G = nxu.set_auto_proof_filter_attribute(
+        labeled_G,split_df = split_df,inplace = False,default_value = [],
+        error_on_non_unique_node_names = False,filter_axon_on_dendrite_splits = False)
+    assert G.nodes["L0_20"]["auto_proof_filter"] == ["axon_on_dendrite"]
+    assert G.nodes["L1_0"]["auto_proof_filter"] == ["high_degree_branching"]
+    assert G.nodes["L0_9"]["auto_proof_filter"] == []
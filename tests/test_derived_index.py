@@ -0,0 +1,114 @@
+import copy
+
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_array as nxa
+import neuron_nx_feature_processing as nxf
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+from conftest import same_value
+
+derived_indices = [
+    ("tree_index",),
+    ("subtree_size",),
+    ("soma_distance","skeletal_length","S0"),
+    ("limb_index",),
+    ("skeleton_point_index",),
+    ("node_attribute_names",),
+]
+
+def same_index(name,index,rebuilt):
+    if name == "tree_index":
+        return (list(index.names) == list(rebuilt.names)
+                and np.array_equal(index.parent,rebuilt.parent)
+                and np.array_equal(index.subtree_size,rebuilt.subtree_size)
+                and np.array_equal(index.tin,rebuilt.tin)
+                and np.array_equal(index.tout,rebuilt.tout))
+    if name == "skeleton_point_index":
+        points = rebuilt["kdtree"].data.reshape(-1,3)
+        return (list(index["nodes"]) == list(rebuilt["nodes"])
+                and np.array_equal(index["labels"],rebuilt["labels"])
+                and np.array_equal(index["kdtree"].query(points)[1],rebuilt["kdtree"].query(points)[1]))
+    if name == "soma_distance":
+        return all(index[k].keys() == rebuilt[k].keys()
+                   and np.allclose([index[k][n] for n in rebuilt[k]],list(rebuilt[k].values()))
+                   for k in ["upstream","downstream"])
+    if name == "limb_index":
+        return (list(index["nodes"]) == list(rebuilt["nodes"])
+                and np.array_equal(index["limb"],rebuilt["limb"])
+                and np.array_equal(index["branch"],rebuilt["branch"])
+                and index["limb_positions"].keys() == rebuilt["limb_positions"].keys()
+                and all(np.array_equal(v,rebuilt["limb_positions"][k])
+                        for k,v in index["limb_positions"].items()))
+    return same_value(index,rebuilt)
+
+def assert_indices_match_rebuild(G):
+    G_plain = nx.DiGraph(G)
+    for name,*args in derived_indices:
+        index = nxg.derived_index(G,name,*args)
+        assert same_index(name,index,nxg.derived_index(G_plain,name,*args)),name
+
+def add_limb(G):
+    G.add_node("L8_0",**copy.deepcopy(dict(G.nodes["L7_0"])))
+    G.add_node("L8_1",**copy.deepcopy(dict(G.nodes["L7_1"])))
+    G.add_edges_from([("S0","L8_0"),("L8_0","L8_1")])
+
+def set_attributes(G):
+    G.nodes["L1_0"]["skeletal_length"] = 5.0
+    G.nodes["L1_2"]["skeleton_data"] = G.nodes["L1_2"]["skeleton_data"] + 10
+    G.nodes["L3_0"]["new_attribute"] = 1
+    G.nodes["L3_1"].update(n_spines = 2.5)
+    del G.nodes["L3_0"]["labels"]
+
+def move_subtree(G):
+    G.remove_edge("L0_20","L0_19")
+    G.add_edge("L0_26","L0_19")
+
+edits = {
+    "remove_node":lambda G: nxu.remove_node(G,["L0_25","L0_22"],inplace = True),
+    "remove_node_one_at_a_time":lambda G: nxu.remove_node(G,["L0_25","L0_22"],inplace = True,batch = False),
+    "remove_downstream":lambda G: nxu.remove_node(G,"L2_0",inplace = True,remove_all_downstream_nodes = True),
+    "set":set_attributes,
+    "add_limb":add_limb,
+    "move_subtree":move_subtree,
+}
+
+@pytest.mark.parametrize("edit",list(edits))
+def test_index_after_edit_matches_rebuild(sample_G,edit):
+    G = nxg.to_neuron_graph(sample_G)
+    assert_indices_match_rebuild(G)
+    version = G.version
+    edits[edit](G)
+    assert G.version > version
+    assert_indices_match_rebuild(G)
+
+def test_index_after_many_edits_matches_rebuild(sample_G):
+    G = nxg.to_neuron_graph(sample_G)
+    assert_indices_match_rebuild(G)
+    for edit in ["set","remove_node","add_limb","move_subtree","remove_downstream"]:
+        edits[edit](G)
+        assert_indices_match_rebuild(G)
+
+def test_indices_updated_not_rebuilt(sample_G):
+    G = nxg.to_neuron_graph(sample_G)
+    tree_index = nxa.tree_index(G)
+    soma_dist = nxu.soma_distance_index(G)
+    schema = nxf.node_attribute_names(G)
+
+    G.nodes["L1_0"]["skeletal_length"] = 5.0
+    G.nodes["L1_0"]["n_spines"] = 3
+    # only attributes changed: the structure index is kept,
+    # the soma distances and schema are updated in place
+    assert nxa.tree_index(G) is tree_index
+    assert nxu.soma_distance_index(G) is soma_dist
+    assert nxf.node_attribute_names(G) is schema
+    assert nxf.node_attribute_names(G)["node_keys"]["L1_0"]["n_spines"] == "int"
+    assert_indices_match_rebuild(G)
+
+    G.remove_node("L1_0")
+    assert nxa.tree_index(G) is not tree_index
+    assert "L1_0" not in nxf.node_attribute_names(G)["node_keys"]
+    assert_indices_match_rebuild(G)
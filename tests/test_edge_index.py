@@ -0,0 +1,76 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_io as nxio
+
+
+def dense_from_edge_index(edge_index,n_nodes):
+    adjacency = np.zeros((n_nodes,n_nodes),dtype="int")
+    adjacency[edge_index[:,0],edge_index[:,1]] = 1
+    return adjacency
+
+def export(G,edge_index):
+    return nxio.export_GNN_info_dict(
+        G,
+        ["skeletal_length","n_spines"],
+        remove_starter_branches = False,
+        distance_threshold = None,
+        edge_index = edge_index,
+    )
+
+def test_export_edge_index_matches_dense(sample_G):
+    dense_infos = export(sample_G,edge_index = False)
+    edge_infos = export(sample_G,edge_index = True)
+    assert len(dense_infos) == len(edge_infos) > 0
+
+    for dense,sparse in zip(dense_infos,edge_infos):
+        n_nodes = len(sparse["nodelist"])
+        assert "adjacency" not in sparse
+        # the same nodes (rows compared by node name)
+        dense_idx = {n:i for i,n in enumerate(dense["nodelist"])}
+        order = np.array([dense_idx[n] for n in sparse["nodelist"]])
+        adjacency = dense["adjacency"][np.ix_(order,order)]
+
+        edge_index = sparse["edge_index"]
+        assert np.array_equal(dense_from_edge_index(edge_index,n_nodes),adjacency)
+        # rows in the order they are read off the dense adjacency
+        assert np.array_equal(edge_index,np.argwhere(adjacency))
+
+        loops = nxio.edge_index_from_graph_data(sparse,add_self_loops = True)
+        assert np.array_equal(
+            dense_from_edge_index(loops,n_nodes),
+            np.maximum(adjacency,np.eye(n_nodes,dtype="int")))
+        assert np.array_equal(loops,np.argwhere(np.maximum(adjacency,np.eye(n_nodes,dtype="int"))))
+        assert np.array_equal(nxio.edge_index_from_graph_data(sparse),edge_index)
+
+def test_edge_index_from_G(small_G):
+    nodelist = list(small_G.nodes())
+    n_nodes = len(nodelist)
+    adjacency = nx.to_numpy_array(small_G,nodelist = nodelist,dtype = "int")
+
+    directed = nxio.edge_index_from_G(small_G,undirected = False)
+    assert np.array_equal(dense_from_edge_index(directed,n_nodes),adjacency)
+
+    undirected = nxio.edge_index_from_G(small_G)
+    assert undirected.dtype == np.dtype("int32")
+    assert np.array_equal(undirected,np.argwhere(adjacency + adjacency.T))
+
+    loops = nxio.edge_index_from_G(small_G,add_self_loops = True)
+    assert np.array_equal(loops,np.argwhere(adjacency + adjacency.T + np.eye(n_nodes,dtype="int")))
+    assert np.array_equal(loops,nxio.edge_index_with_self_loops(undirected,n_nodes))
+
+def test_edge_index_nodelist_subset(small_G):
+    # edges to nodes outside the nodelist are left out
+    nodelist = ["L0_2","L0_0","L0_1"]
+    edge_index = nxio.edge_index_from_G(small_G,nodelist = nodelist)
+    expected = nx.to_numpy_array(nx.Graph(small_G),nodelist = nodelist,dtype = "int")
+    assert np.array_equal(dense_from_edge_index(edge_index,3),expected)
+
+def test_edge_index_no_edges():
+    G = nx.DiGraph()
+    G.add_nodes_from(["L0_0","L0_1"])
+    edge_index = nxio.edge_index_from_G(G,add_self_loops = True)
+    assert np.array_equal(edge_index,[[0,0],[1,1]])
+    assert nxio.edge_index_from_G(G).shape == (0,2)
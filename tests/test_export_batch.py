@@ -0,0 +1,73 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_codecs as nxcodec
+import neuron_nx_io as nxio
+
+
+def export_sleep(G,return_filepaths = True,**kwargs):
+    # the first neuron is slow, the second one dies
+    if G.graph["segment_id"] == 0:
+        time.sleep(1)
+    if G.graph["segment_id"] == 2:
+        os._exit(1)
+    return [f"out_{G.graph['segment_id']}"]
+
+
+def write_sources(tmp_path,small_G,n):
+    filepaths = []
+    for i in range(n):
+        G = small_G.copy()
+        G.graph["segment_id"] = i
+        filepaths.append(str(nxcodec.dump_pickle(G,tmp_path / f"g_{i}")))
+    return filepaths
+
+def test_results_recorded_as_they_finish(tmp_path,small_G):
+    sources = write_sources(tmp_path,small_G,2)
+    df = nxio.export_GNN_info_batch(
+        sources,
+        export_func = export_sleep,
+        manifest_filepath = tmp_path / "manifest.jsonl",
+        n_workers = 2,
+    )
+    assert list(df["source"]) == [sources[1],sources[0]]
+    assert set(df["status"]) == {"success"}
+
+def test_worker_death_recorded_as_failed(tmp_path,small_G):
+    sources = write_sources(tmp_path,small_G,3)
+    df = nxio.export_GNN_info_batch(
+        sources,
+        export_func = export_sleep,
+        manifest_filepath = tmp_path / "manifest.jsonl",
+        n_workers = 2,
+    )
+    assert set(df["source"]) == set(sources)
+    failed = df[df["status"] == "failed"]
+    assert sources[2] in set(failed["source"])
+    assert all("BrokenProcessPool" in e for e in failed["error"])
+
+def export_ids(G,return_filepaths = True,**kwargs):
+    if G.graph["segment_id"] == 3:
+        raise Exception("no limbs")
+    return [f"out_{G.graph['segment_id']}_{i}" for i in range(2)]
+
+def batch_df(tmp_path,sources,chunksize,name):
+    df = nxio.export_GNN_info_batch(
+        sources,
+        export_func = export_ids,
+        manifest_filepath = tmp_path / f"{name}.jsonl",
+        n_workers = 2,
+        chunksize = chunksize,
+    )
+    df = df.sort_values("name").reset_index(drop=True)
+    return df[["name","source","status","n_outputs","outputs","error"]]
+
+def test_chunksize_same_records(tmp_path,small_G):
+    sources = write_sources(tmp_path,small_G,5)
+    df_1 = batch_df(tmp_path,sources,1,"chunk_1")
+    df_2 = batch_df(tmp_path,sources,2,"chunk_2")
+    assert list(df_2["status"]) == ["success"]*3 + ["failed","success"]
+    assert df_1.astype(str).equals(df_2.astype(str))
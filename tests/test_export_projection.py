@@ -0,0 +1,104 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_feature_processing as nxf
+import neuron_nx_io as nxio
+import neuron_nx_utils as nxu
+
+
+def filtered_limb_infos(G,features,edge_index):
+    # the export before feature_projection: filter the features on a copy
+    # of the graph and read every limb graph back into a matrix
+    G_with_feats = nxf.filter_G_features(G,features = features)
+    infos = []
+    for G_limb in nxu.limb_graphs_from_soma_connected_nodes(G_with_feats):
+        G_limb = nxu.limb_branch_subgraph(nx.Graph(G_limb))
+        infos.append(nxio.adjacency_feature_info(G_limb,edge_index = edge_index))
+    return infos
+
+@pytest.mark.parametrize("edge_index",[False,True])
+def test_export_matches_filter_G_features(sample_G,edge_index):
+    features = nxf.features_to_output_for_gnn
+    infos = nxio.export_GNN_info_dict(
+        sample_G,
+        features,
+        remove_starter_branches = False,
+        distance_threshold = None,
+        edge_index = edge_index,
+    )
+    expected = filtered_limb_infos(sample_G,features,edge_index)
+
+    assert len(infos) == len(expected) > 0
+    for info,exp in zip(infos,expected):
+        assert list(info["nodelist"]) == list(exp["nodelist"])
+        assert info["features"] == list(exp["features"])
+        assert np.array_equal(info["feature_matrix"],exp["feature_matrix"],equal_nan=True)
+        if edge_index:
+            assert np.array_equal(info["edge_index"],exp["edge_index"])
+        else:
+            assert np.array_equal(info["adjacency"],exp["adjacency"])
+
+# export_GNN_info_dict(sample_G,features_to_output_for_gnn,remove_starter_branches = False)
+# before feature_projection: per limb the number of nodes, the number of
+# adjacency entries, the feature column sums and the row of its first branch
+golden_features = [
+    "n_spines","n_synapses_post","n_synapses_pre","skeletal_length",
+    "width_upstream","width_downstream",
+    "skeleton_vector_downstream_phi","skeleton_vector_downstream_theta",
+    "skeleton_vector_upstream_phi","skeleton_vector_upstream_theta",
+    "width_no_spine"]
+golden_limbs = [
+    (42,82,"L0_0",
+     [874.0, 1921.0, 5.0, 1836379.1665346504, 17864.740919230575, 18409.91084144284, -52.689581853252825, 56.35482458279591, -57.28723659218509, 56.41332777136653, 16046.051906297067],
+     [15.0, 39.0, 0.0, 43365.41692145412, 269.8656618327621, 360.0080456831056, 3.1257662471248935, 2.0273749665437935, -2.647838212840804, 1.9594448518858578, 298.98696630444834]),
+    (25,48,"L1_0",
+     [529.0, 1200.0, 2.0, 1100005.0486575458, 10011.35461517671, 10387.984041848693, -12.991608179395723, 56.37981014144934, -28.949805836822232, 55.60159960619645, 9588.353148272994],
+     [17.0, 60.0, 0.0, 71854.12704602597, 400.11913120668913, 235.66123238092268, -2.4418042492287055, 1.7449795224586189, -2.4210275863785915, 1.9512514583958382, 311.48035008008736]),
+    (7,12,"L2_0",
+     [179.0, 367.0, 2.0, 348094.9187923876, 2214.7259547763306, 2368.4424004499397, 6.948897759522259, 13.634048824552671, 4.954036383115975, 12.830697069229247, 2239.872040105728],
+     [0.0, 11.0, 0.0, 7313.441496729213, 495.1696553314557, 552.3318902144638, 1.0497617043085947, 1.7595934783362375, 1.0367850905977005, 2.047468405878311, 476.33638146122377]),
+    (17,32,"L3_0",
+     [319.0, 678.0, 2.0, 595683.9863312261, 7039.644433307744, 7162.770416200224, 18.43486808246508, 20.78416359450084, 19.79690323778622, 18.480727128341822, 6384.787557930657],
+     [44.0, 76.0, 0.0, 64287.02564674782, 288.611270958529, 269.8960701389141, -1.8358353273512416, 0.7736373848962463, -2.8352182048955195, 0.8566555697045295, 289.6449120111665]),
+    (11,20,"L4_0",
+     [293.0, 574.0, 1.0, 532126.6765509755, 4281.308177309901, 4204.433821813536, 5.398636234053218, 18.93135236317142, 16.472659385485724, 21.3926678356746, 4168.929107654882],
+     [52.0, 106.0, 1.0, 82354.34240928954, 383.3369410846422, 283.744520540015, -1.9117211951177833, 0.84291880471656, 3.1055569140536954, 0.8890400539177328, 297.27983803917834]),
+    (51,100,"L5_0",
+     [0.0, 17.0, 11.0, 978642.5406180263, 12493.021526124732, 12107.039791469615, 35.553847091415726, 80.14250771860779, 41.34014169216639, 79.98112526217311, 11644.390207972549],
+     [0.0, 1.0, 2.0, 214036.9889244796, 241.92017488290054, 197.27323255081203, 2.874917467015342, 1.3903873833375542, 2.7913454139289016, 2.0824420132101586, 200.27322777070793]),
+    (3,4,"L6_0",
+     [66.0, 145.0, 2.0, 139778.35426689818, 927.1204274524216, 842.6437215540228, -0.8537575069987317, 4.37416499055583, -0.4858997880311492, 4.599591572732621, 959.498870272979],
+     [1.0, 6.0, 0.0, 11188.846313323626, 473.97153400386344, 382.08028009880155, -0.09232638309768468, 1.5901442528298173, -0.18961406391579086, 1.1717988993811148, 375.4732357928699]),
+    (7,12,"L7_0",
+     [199.0, 394.0, 0.0, 340219.1220285625, 2283.454763284767, 2549.0656335975536, 2.0104063599965984, 12.563109601345072, 1.5746072193891447, 13.911664932078668, 2450.6791782855344],
+     [0.0, 7.0, 0.0, 6745.653582240935, 557.2046612108381, 535.8647237855638, 0.3352731940424229, 2.0292372175634137, 0.3352731940424229, 2.0292372175634137, 546.0240846431359]),
+]
+
+def test_export_golden_values(sample_G):
+    with pytest.warns(UserWarning):
+        infos = nxio.export_GNN_info_dict(
+            sample_G,
+            nxf.features_to_output_for_gnn,
+            remove_starter_branches = False,
+            distance_threshold = None,
+        )
+    assert len(infos) == len(golden_limbs)
+    for info,(n_nodes,n_adj,first_node,col_sums,first_row) in zip(infos,golden_limbs):
+        nodelist = list(info["nodelist"])
+        assert info["features"] == golden_features
+        assert info["adjacency"].dtype == np.dtype("int")
+        assert info["feature_matrix"].dtype == np.dtype("float")
+        assert info["adjacency"].shape == (n_nodes,n_nodes)
+        assert info["adjacency"].sum() == n_adj
+        assert np.array_equal(info["adjacency"],info["adjacency"].T)
+        for i,j in zip(*np.nonzero(info["adjacency"])):
+            assert sample_G.has_edge(nodelist[i],nodelist[j]) or sample_G.has_edge(nodelist[j],nodelist[i])
+        assert info["feature_matrix"].sum(axis=0) == pytest.approx(col_sums,rel = 1e-9)
+        assert info["feature_matrix"][nodelist.index(first_node)] == pytest.approx(first_row,rel = 1e-12)
+
+def test_output_feature_order_skips_unresolved(small_G):
+    with pytest.warns(UserWarning):
+        features = nxf.output_feature_order(small_G,["axon_label","not_a_feature","skeletal_length"])
+    assert features == ["skeletal_length","axon_label"]
@@ -0,0 +1,141 @@
+import concurrent.futures
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_codecs as nxcodec
+import neuron_nx_feature_cache as nxfcache
+import neuron_nx_feature_processing as nxf
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+
+
+n_calls = dict(slow = 0)
+
+def slow_feature(node_dict):
+    n_calls["slow"] += 1
+    return float(np.sum([s["volume"] for s in node_dict["synapse_data"]]))
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(nxf,"feature_registry",dict(nxf.feature_registry))
+    nxf.register_feature("t_slow",inputs = ["synapse_data"],func = slow_feature,cache = True)
+    return nxf.feature_registry
+
+def key(G,f = "t_slow"):
+    return nxfcache.feature_key(G,f,nxu.limb_branch_nodes(G))
+
+def keys_in_process(G):
+    return [key(G,f) for f in ["skeleton_vector_upstream_theta","width_no_spine","merge_clean"]]
+
+
+def test_key_stable(small_G,registry,tmp_path):
+    k = key(small_G)
+    assert key(nxg.copy_G(small_G)) == k
+    assert key(nxg.to_neuron_graph(small_G)) == k
+    G_loaded = nxcodec.load_pickle(nxcodec.dump_pickle(small_G,tmp_path / "g"))
+    assert key(G_loaded) == k
+
+    small_G.nodes["L0_1"]["skeletal_length"] = 100.0
+    assert key(small_G) == k
+
+def test_key_changes_with_inputs_and_version(small_G,registry):
+    k = key(small_G)
+    G = nxg.copy_G(small_G)
+    G.nodes["L0_1"]["synapse_data"] = [dict(syn_id = 0,volume = 2.0,upstream_dist = 1.0)]
+    assert key(G) != k
+
+    registry["t_slow"] = dict(registry["t_slow"],version = 1)
+    assert key(small_G) != k
+
+def test_key_same_in_other_process(small_G):
+    G = nxg.copy_G(small_G)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers = 1,
+        mp_context = multiprocessing.get_context("spawn")) as executor:
+        assert executor.submit(keys_in_process,G).result() == keys_in_process(G)
+
+
+def test_cached_feature_not_recomputed(small_G,registry,tmp_path):
+    n_nodes = len(nxu.limb_branch_nodes(small_G))
+    features = ["t_slow","axon_label"]
+    n_calls["slow"] = 0
+    G_1 = nxf.add_any_missing_node_features(small_G,features,feature_cache = tmp_path)
+    assert n_calls["slow"] == n_nodes
+    # only the feature registered with cache = True is stored
+    assert len(nxfcache.FeatureCache(tmp_path)) == 1
+
+    G_2 = nxf.add_any_missing_node_features(small_G,features,feature_cache = tmp_path)
+    assert n_calls["slow"] == n_nodes
+    for n in nxu.limb_branch_nodes(small_G):
+        assert G_2.nodes[n]["t_slow"] == G_1.nodes[n]["t_slow"]
+        assert G_2.nodes[n]["axon_label"] == G_1.nodes[n]["axon_label"]
+
+def test_threshold_sweep_reads_features_from_cache(sample_G,tmp_path,monkeypatch):
+    import neuron_nx_io as nxio
+    n_polar = []
+    polar = nxf.nu.polar_3D_from_cartesian
+    monkeypatch.setattr(nxf.nu,"polar_3D_from_cartesian",
+                        lambda *args: n_polar.append(1) or polar(*args))
+
+    def export(distance_threshold,feature_cache):
+        return nxio.export_GNN_info_dict(
+            sample_G,
+            nxf.features_to_output_for_gnn,
+            remove_starter_branches = False,
+            distance_threshold = distance_threshold,
+            feature_cache = feature_cache,
+        )
+
+    export(100_000,tmp_path)
+    assert len(n_polar) > 0
+    n_polar.clear()
+    infos = export(50_000,tmp_path)
+    assert len(n_polar) == 0
+
+    expected = export(50_000,None)
+    assert len(infos) == len(expected)
+    for info,exp in zip(infos,expected):
+        assert list(info["nodelist"]) == list(exp["nodelist"])
+        assert info["features"] == exp["features"]
+        assert np.array_equal(info["feature_matrix"],exp["feature_matrix"],equal_nan=True)
+
+
+def put(cache,i,t):
+    filepath = cache.put(f"{i:02d}" + "0"*38,list(range(100)))
+    os.utime(filepath,(t,t))
+    return filepath
+
+def test_eviction_least_recently_used(tmp_path):
+    cache = nxfcache.FeatureCache(tmp_path,max_bytes = None)
+    filepaths = [put(cache,i,1000 + i) for i in range(5)]
+    size = filepaths[0].stat().st_size
+
+    # reading the oldest entry makes it the most recently used
+    assert cache.get(filepaths[0].stem) == list(range(100))
+    assert cache.evict(max_bytes = 3*size) == 2
+    assert [f.exists() for f in filepaths] == [True,False,False,True,True]
+    assert cache.nbytes <= 3*size
+
+def test_put_keeps_cache_under_max_bytes(tmp_path):
+    size = len(nxcodec.dumps_pickle(list(range(100)),codec = nxfcache.codec_default))
+    cache = nxfcache.FeatureCache(tmp_path,max_bytes = 3*size)
+    for i in range(10):
+        put(cache,i,1000 + i)
+        assert cache.nbytes <= 3*size
+    assert len(cache) == 3
+
+def test_folder_scanned_once(tmp_path,monkeypatch):
+    put(nxfcache.FeatureCache(tmp_path),0,1000)
+    nxfcache._folder_nbytes.clear()
+
+    n_scans = []
+    entries = nxfcache.FeatureCache._entries
+    monkeypatch.setattr(nxfcache.FeatureCache,"_entries",
+                        lambda self: n_scans.append(1) or entries(self))
+    for i in range(1,5):
+        put(nxfcache.feature_cache(str(tmp_path)),i,1000 + i)
+    assert len(n_scans) == 1
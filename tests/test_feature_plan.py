@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_feature_processing as nxf
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # features registered by a test are dropped after it
+    monkeypatch.setattr(nxf,"feature_registry",dict(nxf.feature_registry))
+    nxf.register_feature(
+        "t_a",
+        inputs = ["skeletal_length"],
+        func = lambda d: 2*d["skeletal_length"])
+    nxf.register_feature(
+        "t_b",
+        inputs = ["t_a"],
+        func = lambda d: d["t_a"] + 1)
+    nxf.register_feature(
+        "t_c",
+        inputs = ["t_b","n_spines"],
+        func = lambda d: d["t_b"]*d["n_spines"])
+    nxf.register_feature("t_x",inputs = ["t_y"],func = lambda d: d["t_y"])
+    nxf.register_feature("t_y",inputs = ["t_x"],func = lambda d: d["t_x"])
+    nxf.register_feature("t_m",inputs = ["not_on_graph"],func = lambda d: d["not_on_graph"])
+    nxf.register_feature(
+        "t_m_default",
+        inputs = ["not_on_graph"],
+        default_value = -1,
+        func = lambda d: d["not_on_graph"])
+    return nxf.feature_registry
+
+def test_batches_in_dependency_order(small_G,registry):
+    plan = nxf.feature_plan(small_G,["t_c","skeletal_length","t_a"])
+    assert plan["present"] == ["skeletal_length"]
+    assert plan["batches"] == [["t_a"],["t_b"],["t_c"]]
+    assert plan["unresolved"] == dict()
+
+def test_features_on_graph_are_not_planned(small_G,registry):
+    for n in small_G:
+        small_G.nodes[n]["t_a"] = 0.0
+    plan = nxf.feature_plan(small_G,["t_b"])
+    assert plan["batches"] == [["t_b"]]
+
+def test_cycle_unresolved(small_G,registry):
+    plan = nxf.feature_plan(small_G,["t_x","t_a"])
+    assert plan["batches"] == [["t_a"]]
+    assert set(plan["unresolved"]) == {"t_x","t_y"}
+    assert "circular" in plan["unresolved"]["t_x"]
+
+def test_unknown_name_unresolved(small_G,registry):
+    plan = nxf.feature_plan(small_G,["not_a_feature"])
+    assert plan["batches"] == []
+    assert "not_a_feature" in plan["unresolved"]
+
+def test_missing_inputs(small_G,registry):
+    plan = nxf.feature_plan(small_G,["t_m","t_m_default"])
+    assert plan["unresolved"] == {"t_m":"missing inputs ['not_on_graph']"}
+    assert plan["batches"] == [["t_m_default"]]
+
+def test_add_features_in_order(small_G,registry):
+    G = nxf.add_any_missing_node_features(small_G,["t_c","t_m_default"])
+    for n in ["L0_0","L0_1","L1_1"]:
+        d = small_G.nodes[n]
+        assert G.nodes[n]["t_c"] == (2*d["skeletal_length"] + 1)*d["n_spines"]
+        assert G.nodes[n]["t_m_default"] == -1
+    assert "t_c" not in small_G.nodes["L0_0"]
+
+def test_missing_features_added_in_sorted_order(small_G):
+    # same node attribute (and exported column) order as np.setdiff1d gave
+    features = ["skeletal_length",
+                "skeleton_vector_upstream_theta","skeleton_vector_upstream_phi",
+                "skeleton_vector_downstream_theta","skeleton_vector_downstream_phi"]
+    G = nxf.add_any_missing_node_features(small_G,features)
+    added = [k for k in G.nodes["L0_0"] if k not in small_G.nodes["L0_0"]]
+    assert added == sorted(features[1:])
+    assert nxf.output_feature_order(small_G,features) == ["skeletal_length"] + sorted(features[1:])
+
+def test_unresolved_warn_or_raise(small_G,registry):
+    with pytest.warns(UserWarning,match="not_a_feature"):
+        G = nxf.add_any_missing_node_features(small_G,["t_a","not_a_feature"])
+    assert "t_a" in G.nodes["L0_0"]
+    with pytest.raises(Exception,match="t_m"):
+        nxf.add_any_missing_node_features(small_G,["t_m"],raise_on_unresolved = True)
+
+def test_polar_features_per_row(small_G):
+    import numpy_utils as nu
+    nodes = ["L0_0","L0_1","L0_2"]
+    table = nxf.node_attribute_table(small_G,["skeleton_vector_upstream"],nodes)
+    polar = nxf._polar_columns(table,"skeleton_vector_upstream")
+    for i,n in enumerate(nodes):
+        expected = nu.polar_3D_from_cartesian(*small_G.nodes[n]["skeleton_vector_upstream"])
+        assert np.allclose([p[i] for p in polar],expected)
@@ -0,0 +1,57 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_io as nxio
+import neuron_nx_utils as nxu
+
+features = ["skeletal_length","n_spines","width_upstream"]
+
+
+def export(G,**kwargs):
+    return nxio.export_GNN_info_dict(
+        G,
+        features,
+        remove_starter_branches = False,
+        distance_threshold = None,
+        **kwargs
+    )
+
+def same_rebuilt_graph(G1,G2):
+    return (list(G1.nodes()) == list(G2.nodes())
+            and set(map(frozenset,G1.edges())) == set(map(frozenset,G2.edges()))
+            and all(G1.nodes[n] == G2.nodes[n] for n in G1.nodes()))
+
+@pytest.mark.parametrize("edge_index",[False,True])
+def test_round_trip(sample_G,edge_index):
+    infos = export(sample_G,edge_index = edge_index)
+    limb_nodes = set(nxu.limb_branch_nodes(sample_G))
+    rebuilt_nodes = set()
+    for info in infos:
+        G = nxio.G_from_adj_feature_dict(info)
+        nodes = list(G.nodes())
+        assert nodes == list(info["nodelist"])
+        rebuilt_nodes.update(nodes)
+
+        expected_edges = {frozenset(e) for e in sample_G.subgraph(nodes).edges()}
+        assert {frozenset(e) for e in G.edges()} == expected_edges
+        for n in nodes:
+            assert set(G.nodes[n]) == set(features)
+            for f in features:
+                assert G.nodes[n][f] == pytest.approx(sample_G.nodes[n][f])
+    assert rebuilt_nodes == limb_nodes
+
+@pytest.mark.parametrize("n_workers",[1,2])
+def test_batch_matches_single(sample_G,tmp_path,n_workers):
+    filepaths = export(
+        sample_G,
+        return_filepaths = True,
+        folder = tmp_path,
+        description = "round_trip")
+    assert len(filepaths) > 1
+
+    Gs = nxio.G_from_adj_feature_dict_batch(filepaths,n_workers = n_workers,chunksize = 2)
+    assert len(Gs) == len(filepaths)
+    for G,filepath in zip(Gs,filepaths):
+        assert same_rebuilt_graph(G,nxio.G_from_adj_feature_dict(filepath = filepath))
@@ -0,0 +1,64 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_array as nxa
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+from conftest import same_graph
+
+
+def old_limb_graph(G,limb_idx,branches_idx = None):
+    # the name parsing copy limb_graph replaced
+    nodes = [k for k in G.nodes() if "S" not in k
+             and nxu.limb_from_node_name(k) == limb_idx]
+    if branches_idx is not None:
+        nodes = [k for k in nodes if nxu.branch_from_node_name(k) in branches_idx]
+    return G.subgraph(nodes).copy()
+
+@pytest.mark.parametrize("graph_type",[nx.DiGraph,nxg.to_neuron_graph])
+def test_limb_graph_view_matches_copy(sample_G,graph_type):
+    G = graph_type(sample_G)
+    limb_idxs = nxu.all_limb_idxs_in_G(G)
+    assert list(limb_idxs) == sorted({nxu.limb_from_node_name(k) for k in sample_G if "S" not in k})
+
+    for limb_idx in limb_idxs:
+        expected = old_limb_graph(sample_G,limb_idx)
+        view = nxu.limb_graph(G,limb_idx)
+        assert same_graph(view,expected)
+        assert same_graph(nxu.limb_graph(G,f"L{limb_idx}",as_view = False),expected)
+
+        branches = [0,2,5,7]
+        assert same_graph(
+            nxu.limb_graph(G,limb_idx,branches_idx = branches),
+            old_limb_graph(sample_G,limb_idx,branches))
+
+    for view,limb_idx in zip(*nxu.all_limb_graphs(G,return_idxs = True)):
+        assert same_graph(view,old_limb_graph(sample_G,limb_idx))
+
+def test_limb_graph_view_is_read_only(sample_G):
+    G = nxg.to_neuron_graph(sample_G)
+    view = nxu.limb_graph(G,0)
+    with pytest.raises(nx.NetworkXError):
+        view.add_node("L0_1000")
+    with pytest.raises(nx.NetworkXError):
+        view.remove_node("L0_0")
+
+    G_copy = nxu.limb_graph(G,0,as_view = False)
+    G_copy.remove_node("L0_0")
+    assert "L0_0" in G and "L0_0" in view
+
+def test_limb_index_columns(sample_G):
+    for G in [sample_G,nxg.to_neuron_graph(sample_G),nxa.from_G(sample_G)]:
+        index = nxu.limb_index(G)
+        names = [k for k in sample_G.nodes() if "S" not in k]
+        assert list(index["nodes"]) == names
+        assert list(index["limb"]) == [nxu.limb_from_node_name(k) for k in names]
+        assert list(index["branch"]) == [nxu.branch_from_node_name(k) for k in names]
+        for limb_idx,positions in index["limb_positions"].items():
+            assert list(index["nodes"][positions]) == [
+                k for k in names if nxu.limb_from_node_name(k) == limb_idx]
+
+def test_missing_limb_is_empty(sample_G):
+    assert len(nxu.limb_graph(sample_G,100)) == 0
@@ -0,0 +1,84 @@
+import copy
+
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_utils as nxu
+
+tolerance = 1e-3
+
+
+def old_node_map(G_source,G_target,tolerance = None):
+    # the O(n^2) comparison of every pair of nodes on the same limb
+    def match(d1,d2):
+        if tolerance is None:
+            return nxu.node_match_by_dict(d1,d2)
+        return all(np.allclose(d1[a],d2[a],rtol = 0,atol = tolerance)
+                   for a in nxu.node_match_attributes_default)
+
+    node_map = dict()
+    for n in nxu.limb_branch_nodes(G_source):
+        matches = [nt for nt in nxu.limb_branch_nodes(G_target)
+                   if nxu.limb_from_node_name(nt) == nxu.limb_from_node_name(n)
+                   and match(G_source.nodes[n],G_target.nodes[nt])]
+        assert len(matches) <= 1
+        node_map[n] = matches[0] if len(matches) > 0 else None
+    return node_map
+
+def renamed(G):
+    # the same neuron with other branch numbers
+    mapping = {n:n if "S" in n else f"L{nxu.limb_from_node_name(n)}_{nxu.branch_from_node_name(n) + 100}"
+               for n in G.nodes()}
+    return nx.relabel_nodes(copy.deepcopy(G),mapping),mapping
+
+def across_cell_boundary(G_source,G_target,n,nt):
+    # endpoints less than the tolerance apart but in neighboring grid cells
+    point = np.array(G_target.nodes[nt]["endpoint_upstream"],dtype=float)
+    boundary = (np.floor(point/tolerance) + 1)*tolerance
+    G_source.nodes[n]["endpoint_upstream"] = boundary - 0.3*tolerance
+    G_target.nodes[nt]["endpoint_upstream"] = boundary + 0.3*tolerance
+    assert (nxu._node_match_cell(G_source.nodes[n],"endpoint_upstream",tolerance)
+            != nxu._node_match_cell(G_target.nodes[nt],"endpoint_upstream",tolerance))
+
+def test_exact_map_matches_pairwise(sample_G):
+    G_target,mapping = renamed(sample_G)
+    G_target.remove_node(mapping["L0_9"])
+    expected = old_node_map(sample_G,G_target)
+    assert nxu.node_map(sample_G,G_target) == expected
+    assert expected["L0_9"] is None
+    assert expected["L0_20"] == mapping["L0_20"]
+
+def test_tolerance_match_in_neighboring_cell(sample_G):
+    G_source = copy.deepcopy(sample_G)
+    G_target,mapping = renamed(sample_G)
+    moved = ["L0_20","L1_0","L3_2"]
+    for n in moved:
+        across_cell_boundary(G_source,G_target,n,mapping[n])
+
+    exact = nxu.node_map(G_source,G_target)
+    assert all(exact[n] is None for n in moved)
+    assert exact == old_node_map(G_source,G_target)
+
+    node_map = nxu.node_map(G_source,G_target,tolerance = tolerance)
+    assert node_map == old_node_map(G_source,G_target,tolerance = tolerance)
+    assert node_map == {n:mapping[n] for n in nxu.limb_branch_nodes(G_source)}
+
+def test_tolerance_no_match_farther_away(sample_G):
+    G_source = copy.deepcopy(sample_G)
+    G_target,mapping = renamed(sample_G)
+    G_source.nodes["L0_20"]["endpoint_upstream"] = (
+        np.array(G_source.nodes["L0_20"]["endpoint_upstream"]) + 2*tolerance)
+    node_map = nxu.node_map(G_source,G_target,tolerance = tolerance)
+    assert node_map["L0_20"] is None
+    assert node_map == old_node_map(G_source,G_target,tolerance = tolerance)
+
+def test_node_match_key():
+    d1 = dict(endpoint_upstream = np.array([1,2,3]),skeleton_vector_upstream = [0.5,0.5])
+    d2 = dict(endpoint_upstream = np.array([1.0,2.0,3.0]),skeleton_vector_upstream = [0.5,0.5])
+    d3 = dict(endpoint_upstream = np.array([1.0,2.0,3.5]),skeleton_vector_upstream = [0.5,0.5])
+    assert nxu.node_match_key(d1) == nxu.node_match_key(d2)
+    assert nxu.node_match_by_dict(d1,d2)
+    assert nxu.node_match_key(d1) != nxu.node_match_key(d3)
+    assert not nxu.node_match_by_dict(d1,d3)
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_utils as nxu
+from conftest import same_graph, same_value
+
+
+@pytest.mark.parametrize("nodes",[
+    ["L0_25","L0_22","L0_20"],         # chain of adjacent nodes
+    ["L0_20","L0_25","L0_22"],         # same chain, not in tree order
+    ["L0_19","L0_29","L0_20","L0_6"],  # a node with its parent and child
+])
+def test_batch_same_as_sequential(sample_G,nodes):
+    G_batch = nxu.remove_node(sample_G,nodes,batch = True)
+    G_seq = nxu.remove_node(sample_G,nodes,batch = False)
+
+    assert not any(n in G_batch for n in nodes)
+    assert set(G_batch.edges()) == set(G_seq.edges())
+    for n in G_seq.nodes():
+        for k in ["skeleton_data","width_data","endpoint_upstream"]:
+            assert same_value(G_batch.nodes[n].get(k),G_seq.nodes[n].get(k)),(n,k)
+    assert same_graph(G_batch,G_seq)
+
+def test_batch_reparents_children(sample_G):
+    G = nxu.remove_node(sample_G,["L0_25","L0_22"],batch = True)
+    assert set(G.successors("L0_31")) == {"L0_32","L0_8","L0_20","L0_26","L0_27"}
+    assert same_value(G.nodes["L0_20"]["endpoint_upstream"],
+                      sample_G.nodes["L0_25"]["endpoint_upstream"])
+    # L0_22 already carried the endpoint of L0_25 when it was removed
+    assert same_value(G.nodes["L0_20"]["skeleton_data"][0],
+                      sample_G.nodes["L0_25"]["endpoint_upstream"])
+    assert len(G.nodes["L0_20"]["skeleton_data"]) == len(sample_G.nodes["L0_20"]["skeleton_data"]) + 1
+    assert len(G.nodes["L0_20"]["width_data"]) == len(sample_G.nodes["L0_20"]["width_data"]) + 1
+    assert "L0_25" in sample_G
@@ -0,0 +1,59 @@
+import copy
+
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_array as nxa
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+
+
+def test_index_matches_path_sums(small_G):
+    soma_dist = nxu.soma_distance_index(small_G)
+    length = {n:small_G.nodes[n].get("skeletal_length") for n in small_G}
+    assert soma_dist["upstream"]["L0_1"] == pytest.approx(length["L0_0"])
+    assert soma_dist["downstream"]["L0_1"] == pytest.approx(length["L0_0"] + length["L0_1"])
+    assert soma_dist["upstream"]["L1_0"] == 0
+
+def test_missing_length_raises(small_G):
+    del small_G.nodes["L0_0"]["skeletal_length"]
+    with pytest.raises(KeyError):
+        nxu.soma_distance_index(small_G)
+
+def path_nodes(G):
+    return [n for n in G.nodes() if "L" in n]
+
+def soma_distances_by_path(G):
+    # the per node shortest path the index replaced
+    return {n:float(np.sum([G.nodes[k]["skeletal_length"]
+                            for k in nx.shortest_path(G,"S0",n)[1:-1]]))
+            for n in path_nodes(G)}
+
+@pytest.mark.parametrize("graph_type",[nx.DiGraph,nxg.to_neuron_graph,nxa.from_G])
+def test_soma_distance_index_matches_paths(sample_G,graph_type):
+    expected = soma_distances_by_path(sample_G)
+    upstream = nxu.soma_distance_index(graph_type(sample_G))["upstream"]
+    for n,d in expected.items():
+        assert upstream[n] == pytest.approx(d,rel = 1e-12)
+
+def test_data_obj_soma_distances_match_paths(sample_G):
+    data_types = ("synapse_data","spine_data","width_data")
+    G = copy.deepcopy(sample_G)
+    nxu.calculate_soma_distance_to_data_objs(G,data_to_update = data_types)
+
+    path_dist = soma_distances_by_path(sample_G)
+    n_objs = 0
+    for n,d in path_dist.items():
+        for dtype in data_types:
+            for obj in G.nodes[n].get(dtype) or []:
+                assert obj["soma_distance"] == pytest.approx(obj["upstream_dist"] + d,rel = 1e-12)
+                n_objs += 1
+    assert n_objs > 0
+
+def test_data_obj_soma_distances_only_data_to_update(sample_G):
+    G = copy.deepcopy(sample_G)
+    nxu.calculate_soma_distance_to_data_objs(G,data_to_update = "synapse_data")
+    assert all("soma_distance" in obj for n in path_nodes(G) for obj in G.nodes[n]["synapse_data"] or [])
+    assert not any("soma_distance" in obj for n in path_nodes(G) for obj in G.nodes[n]["width_data"] or [])
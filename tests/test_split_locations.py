@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+from pykdtree.kdtree import KDTree
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+
+
+def old_closest_nodes(G_limb,coordinate):
+    # one KDTree per node skeleton, queried for every coordinate
+    names = np.array(nxu.limb_branch_nodes(G_limb))
+    dist = np.array([np.mean(KDTree(G_limb.nodes[n]["skeleton_data"]).query(
+        np.asarray(coordinate).reshape(-1,3))[0]) for n in names])
+    min_dist = np.min(dist)
+    return min_dist,names[dist == min_dist]
+
+def split_coordinates(G_limb,n_splits = 30,seed = 0):
+    # skeleton points (shared endpoints give ties) and points near the skeleton
+    rng = np.random.default_rng(seed)
+    points = np.vstack([G_limb.nodes[n]["skeleton_data"] for n in G_limb.nodes()])
+    picked = points[rng.choice(len(points),size = n_splits)]
+    noisy = picked + rng.normal(scale = 500,size = picked.shape)
+    return np.vstack([picked[:n_splits//2],noisy[n_splits//2:]])
+
+@pytest.mark.parametrize("n_neighbors",[1,8])
+def test_batched_query_matches_per_node_trees(sample_G,n_neighbors):
+    G = nxg.to_neuron_graph(sample_G)
+    n_ties = 0
+    for limb_idx in nxu.all_limb_idxs_in_G(G):
+        G_limb = nxu.limb_graph(G,limb_idx)
+        coordinates = split_coordinates(G_limb,seed = int(limb_idx))
+        min_dist,min_nodes = nxu.closest_nodes_to_coordinates(
+            G_limb,coordinates,n_neighbors = n_neighbors)
+        for c,d,nodes in zip(coordinates,min_dist,min_nodes):
+            expected_dist,expected_nodes = old_closest_nodes(G_limb,c)
+            assert d == expected_dist
+            assert list(nodes) == list(expected_nodes)
+            n_ties += len(nodes) > 1
+    assert n_ties > 0
+
+def test_split_location_node_map_df(sample_G):
+    G = nxg.to_neuron_graph(sample_G)
+    rng = np.random.default_rng(1)
+    split_locations = dict()
+    for filter_name,limb_idxs in [("axon_on_dendrite",[0,3]),("high_degree_branching",[5])]:
+        split_locations[filter_name] = {
+            f"L{k}":np.array([G.nodes[n]["mesh_center"] + rng.normal(scale = 100,size = 3)
+                             for n in rng.choice(nxu.limb_branch_nodes(nxu.limb_graph(G,k)),size = 4,replace = False)])
+            for k in limb_idxs}
+
+    split_df = nxu.split_location_node_map_df(
+        G,split_locations,
+        error_if_no_one_match = False,
+        error_on_non_unique_node_names = False,
+        distance_max = np.inf)
+    assert len(split_df) == 12
+    for _,row in split_df.iterrows():
+        G_limb = nxu.limb_graph(G,row["limb_name"])
+        expected_dist,expected_nodes = old_closest_nodes(G_limb,row["coord"])
+        assert row["min_distance"] == expected_dist
+        assert list(row["node"]) == list(expected_nodes)
+
+def test_split_too_far_raises(sample_G):
+    G_limb = nxu.limb_graph(sample_G,0)
+    far = np.array([[0.,0.,0.]])
+    with pytest.raises(Exception,match = "distance_max"):
+        nxu.split_location_node_map_df(sample_G,dict(axon_on_dendrite = dict(L0 = far)))
+    min_dist,_ = nxu.closest_nodes_to_coordinates(G_limb,far)
+    assert min_dist[0] == old_closest_nodes(G_limb,far[0])[0]
@@ -0,0 +1,106 @@
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_io as nxio
+
+
+class CountedItems:
+    def __init__(self,n):
+        self.n = n
+        self.n_pulled = 0
+
+    def __iter__(self):
+        for i in range(self.n):
+            self.n_pulled += 1
+            yield i
+
+@pytest.mark.parametrize("n_workers,max_pending,chunksize",[
+    (2,None,1),(2,1,1),(3,5,1),(2,None,4),(3,2,7)])
+def test_pending_groups_bounded(n_workers,max_pending,chunksize):
+    window = (2*n_workers if max_pending is None else max_pending)*chunksize
+    items = CountedItems(30)
+    results = []
+    peak = 0
+    for r in nxio._imap_bounded(
+        abs,items,n_workers = n_workers,max_pending = max_pending,chunksize = chunksize):
+        peak = max(peak,items.n_pulled - len(results))
+        results.append(r)
+    assert results == list(range(30))
+    assert peak <= window
+
+def test_early_stop_stops_reading():
+    items = CountedItems(1000)
+    gen = nxio._imap_bounded(abs,items,n_workers = 2,max_pending = 4)
+    assert [next(gen) for _ in range(3)] == [0,1,2]
+    gen.close()
+    assert items.n_pulled <= 3 + 4
+
+
+import copy
+import numpy as np
+
+def limb_graph_data():
+    """
+    Three limbs (3, 1 and 2 nodes) as exported by export_GNN_info_dict
+    """
+    def limb(names,adjacency,feature_matrix):
+        return dict(segment_id = 1,split_index = 0,data = dict(
+            nodelist = np.array(names),
+            features = ["skeletal_length","width"],
+            adjacency = np.array(adjacency,dtype="int"),
+            feature_matrix = np.array(feature_matrix,dtype="float"),
+        ))
+    return [
+        limb(["L0_0","L0_1","L0_2"],[[0,1,1],[0,0,0],[0,0,0]],[[1.,2.],[3.,np.nan],[5.,6.]]),
+        limb(["L1_0"],[[0]],[[7.,8.]]),
+        limb(["L2_0","L2_1"],[[0,1],[0,0]],[[9.,10.],[11.,12.]]),
+    ]
+
+def same_array(a,b):
+    return a.dtype == b.dtype and np.array_equal(a,b)
+
+def test_combine_limb_graph_data_values():
+    graph_data = limb_graph_data()
+    graph_data_before = copy.deepcopy(graph_data)
+    combined,clust_matrix = nxio.combine_limb_graph_data(
+        graph_data,
+        limb_idx = np.array([0,1,2]),
+        limb_attributes_to_add = dict(
+            soma_start_angle_max = np.array([10.,20.,30.]),
+            n_syn_soma = np.array([1,2,3])),
+    )
+    data = combined["data"]
+
+    adjacency = np.zeros((6,6),dtype="int")
+    adjacency[0,1] = adjacency[0,2] = adjacency[4,5] = 1
+    assert same_array(data["adjacency"],adjacency)
+
+    assert same_array(data["feature_matrix"],np.array([
+        [1.,2.,10.,1.],
+        [3.,0.,10.,1.],
+        [5.,6.,10.,1.],
+        [7.,8.,20.,2.],
+        [9.,10.,30.,3.],
+        [11.,12.,30.,3.],
+    ]))
+    assert same_array(clust_matrix,np.array([0,0,0,1,2,2],dtype="int"))
+    assert list(data["nodelist"]) == ["L0_0","L0_1","L0_2","L1_0","L2_0","L2_1"]
+    assert data["features"] == ["skeletal_length","width","soma_start_angle_max","n_syn_soma"]
+
+    # the limb graph data is left unchanged
+    for g,g_before in zip(graph_data,graph_data_before):
+        assert g["data"]["features"] == g_before["data"]["features"]
+        assert np.array_equal(g["data"]["feature_matrix"],g_before["data"]["feature_matrix"],equal_nan = True)
+
+def test_combine_limb_graph_data_cluster_matrix():
+    _,clust_matrix = nxio.combine_limb_graph_data(
+        limb_graph_data(),
+        limb_idx = np.array([0,1,2]),
+        flat_cluster_matrix = False,
+        max_limbs = 4,
+        max_nodes = 8,
+    )
+    # 1/n_nodes is truncated to an int (only a 1 node limb is marked)
+    expected = np.zeros((4,8),dtype="int")
+    expected[1,3] = 1
+    assert same_array(clust_matrix,expected)
@@ -0,0 +1,60 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx_utils")
+import neuron_nx_array as nxa
+import neuron_nx_graph as nxg
+import neuron_nx_utils as nxu
+
+
+# plain DiGraph, NeuronDiGraph (derived indices) and array graph
+graph_types = [nx.DiGraph,nxg.to_neuron_graph,nxa.from_G]
+
+def downstream_counts(G):
+    # the per node search the index replaced
+    return {n:len(nx.descendants(G,n)) for n in G.nodes()}
+
+@pytest.mark.parametrize("graph_type",graph_types)
+def test_most_upstream_nodes(sample_G,graph_type):
+    expected = downstream_counts(sample_G)
+    G = graph_type(sample_G)
+
+    nodes,counts = nxu.most_upstream_nodes(G)
+    assert sorted(nodes) == sorted(expected)
+    assert {n:c for n,c in zip(nodes,counts)} == expected
+    assert np.all(np.diff(counts) <= 0)
+    assert nxu.most_upstream_node(G) == "S0"
+
+    subset = ["L1_10","L1_2","L1_8","L0_20"]
+    nodes,counts = nxu.most_upstream_nodes(G,nodes = subset)
+    assert list(counts) == sorted([expected[n] for n in subset],reverse = True)
+    assert nodes[0] == max(subset,key = lambda n:expected[n])
+
+@pytest.mark.parametrize("graph_type",graph_types[1:])
+def test_subtree_sizes(sample_G,graph_type):
+    G = graph_type(sample_G)
+    sizes = nxa.subtree_sizes(G)
+    assert sizes["size"] == {n:c + 1 for n,c in downstream_counts(sample_G).items()}
+    assert sizes["parent"] == {n:next(iter(sample_G.pred[n]),None) for n in sample_G.nodes()}
+
+def node_groups(G):
+    rng = np.random.default_rng(0)
+    names = list(G.nodes())
+    groups = [list(rng.choice(names,size = 30,replace = False)) for _ in range(5)]
+    groups.append(["L0_22","S0","L0_31","L0_25"])  # a chain, not in tree order
+    groups.append(["L0_20","L0_9","L0_20","L1_0"])  # a node twice
+    return groups
+
+def test_has_upstream_in_nodes(sample_G):
+    index = nxa.tree_index(nxg.to_neuron_graph(sample_G))
+    for nodes in node_groups(sample_G):
+        expected = [any(m != n and m in nx.ancestors(sample_G,n) for m in nodes) for n in nodes]
+        assert list(index.has_upstream_in_nodes(nodes)) == expected
+        expected_parent = [next(iter(sample_G.pred[n]),None) in nodes for n in nodes]
+        assert list(index.has_upstream_in_nodes(nodes,parent_only = True)) == expected_parent
+
+def test_is_ancestor(sample_G):
+    index = nxa.tree_index(sample_G)
+    for a,b in [("S0","L0_9"),("L0_25","L0_9"),("L0_9","L0_25"),("L0_9","L0_9"),("L1_0","L0_9")]:
+        assert index.is_ancestor(a,b) == (a == b or a in nx.ancestors(sample_G,b))